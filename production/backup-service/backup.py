@@ -4,31 +4,50 @@ Production Backup Service for LiteLLM + Langfuse Stack
 Handles PostgreSQL, ClickHouse, and configuration backups to MinIO/S3
 """
 
+import io
 import os
+import re
 import sys
 import json
+import glob
+import base64
+import hashlib
+import shutil
+import tempfile
 import subprocess
 import logging
+import importlib.util
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Event, Thread, Lock
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import schedule
 import time
 
-# Optional imports
-try:
-    from minio import Minio
-    from minio.error import S3Error
-    MINIO_AVAILABLE = True
-except ImportError:
-    MINIO_AVAILABLE = False
+import profiling
+import tracing
 
-try:
-    import clickhouse_connect
-    CLICKHOUSE_AVAILABLE = True
-except ImportError:
-    CLICKHOUSE_AVAILABLE = False
+# Optional drivers: only checked for here and imported on first use, so the
+# health server is up before they load
+MINIO_AVAILABLE = importlib.util.find_spec("minio") is not None
+CLICKHOUSE_AVAILABLE = importlib.util.find_spec("clickhouse_connect") is not None
+
+# Backup I/O presets: read/upload rates in MB/s (0 = unlimited), ClickHouse
+# export query settings (0 = server default)
+IO_PRESETS = {
+    "full": {"read_rate_mb": 0, "upload_rate_mb": 0, "max_threads": 0, "priority": 0},
+    "low-impact": {"read_rate_mb": 20, "upload_rate_mb": 20, "max_threads": 1, "priority": 10},
+    "adaptive": {"read_rate_mb": 50, "upload_rate_mb": 50, "max_threads": 2, "priority": 10},
+}
+IO_MODE = os.getenv("BACKUP_IO_MODE", "full")  # full, low-impact, adaptive
+IO_PRESET = IO_PRESETS.get(IO_MODE, IO_PRESETS["full"])
 
 # Configuration from environment
 CONFIG = {
@@ -42,6 +61,30 @@ CONFIG = {
     "clickhouse_password": os.getenv("CLICKHOUSE_PASSWORD", ""),
     "clickhouse_db": os.getenv("CLICKHOUSE_DB", "default"),
     
+    # ClickHouse maintenance (retention by partition drop, merges in quiet hours)
+    "clickhouse_maintenance_enabled": os.getenv("CLICKHOUSE_MAINTENANCE_ENABLED", "false").lower() == "true",
+    "clickhouse_tables": [
+        t.strip() for t in os.getenv("CLICKHOUSE_MAINTENANCE_TABLES", "traces,observations,scores").split(",") if t.strip()
+    ],
+    "clickhouse_retention_days": int(os.getenv("CLICKHOUSE_RETENTION_DAYS", "0")),  # 0 keeps everything
+    "clickhouse_retention": {  # Per-table overrides, e.g. "traces=90,scores=365"
+        name.strip(): int(days) for name, days in (
+            item.split("=") for item in os.getenv("CLICKHOUSE_RETENTION", "").split(",") if "=" in item
+        )
+    },
+    "clickhouse_quiet_hours": tuple(
+        int(h) for h in os.getenv("CLICKHOUSE_QUIET_HOURS", "1-5").split("-")
+    ),  # UTC hours [start, end) in which merges may start
+    "clickhouse_optimize_min_parts": int(os.getenv("CLICKHOUSE_OPTIMIZE_MIN_PARTS", "10")),
+    "clickhouse_parts_alert": int(os.getenv("CLICKHOUSE_PARTS_ALERT", "100")),  # Inserts are delayed at 150
+    "clickhouse_probe_days": int(os.getenv("CLICKHOUSE_PROBE_DAYS", "1")),
+    
+    # Redis (LiteLLM response cache, Langfuse ingestion queue)
+    "redis_host": os.getenv("REDIS_HOST", ""),
+    "redis_port": int(os.getenv("REDIS_PORT", "6379")),
+    "redis_password": os.getenv("REDIS_PASSWORD", ""),
+    "redis_backup_enabled": os.getenv("REDIS_BACKUP_ENABLED", "true").lower() == "true",
+    
     # MinIO/S3
     "minio_endpoint": os.getenv("MINIO_ENDPOINT", "minio:9000").replace("http://", "").replace("https://", ""),
     "minio_access_key": os.getenv("MINIO_ACCESS_KEY", os.getenv("MINIO_ROOT_USER", "minioadmin")),
@@ -49,11 +92,79 @@ CONFIG = {
     "minio_secure": os.getenv("MINIO_SECURE", "false").lower() == "true",
     "backup_bucket": os.getenv("BACKUP_BUCKET", "backups"),
     
+    # Upload engine
+    "work_dir": os.getenv("BACKUP_WORK_DIR", "/tmp"),  # Must be a volume for uploads to resume across redeploys
+    "upload_part_size_mb": max(5, int(os.getenv("UPLOAD_PART_SIZE_MB", "32"))),  # S3 minimum part size is 5 MiB
+    "upload_parallelism": max(1, int(os.getenv("UPLOAD_PARALLELISM", "4"))),
+    
+    # I/O throttling (protects production latency during the backup window)
+    "io_mode": IO_MODE,
+    "read_rate_mb": float(os.getenv("BACKUP_READ_RATE_MB", IO_PRESET["read_rate_mb"])),
+    "upload_rate_mb": float(os.getenv("BACKUP_UPLOAD_RATE_MB", IO_PRESET["upload_rate_mb"])),
+    "clickhouse_max_threads": int(os.getenv("CLICKHOUSE_BACKUP_MAX_THREADS", IO_PRESET["max_threads"])),
+    "clickhouse_priority": int(os.getenv("CLICKHOUSE_BACKUP_PRIORITY", IO_PRESET["priority"])),
+    "health_monitor_url": os.getenv("HEALTH_MONITOR_URL", "http://health-monitor.railway.internal:8080"),
+    "adaptive_latency_ms": float(os.getenv("ADAPTIVE_LATENCY_MS", "250")),
+    "adaptive_poll_seconds": int(os.getenv("ADAPTIVE_POLL_SECONDS", "15")),
+    
+    # Run concurrency
+    "backup_max_concurrency": max(1, int(os.getenv("BACKUP_MAX_CONCURRENCY", "2"))),
+    "backup_memory_budget_mb": int(os.getenv("BACKUP_MEMORY_BUDGET_MB", "512")),
+    
+    # Metrics
+    "metrics_history_runs": int(os.getenv("METRICS_HISTORY_RUNS", "20")),
+    
     # Backup settings
     "retention_days": int(os.getenv("BACKUP_RETENTION_DAYS", "7")),
     "backup_schedule": os.getenv("BACKUP_SCHEDULE", "daily"),  # hourly, daily, weekly
     "backup_hour": int(os.getenv("BACKUP_HOUR", "3")),  # Hour of day for daily backups (UTC)
     
+    # Restore verification
+    "verify_schedule": os.getenv("VERIFY_SCHEDULE", "off"),  # off, daily, weekly
+    "verify_hour": int(os.getenv("VERIFY_HOUR", "5")),  # Hour of day for verification runs (UTC)
+    "verify_mode": os.getenv("VERIFY_MODE", "scratch"),  # scratch (restore into databases) or local (stand-in)
+    "verify_database_url": os.getenv("VERIFY_DATABASE_URL", ""),  # Defaults to a scratch DB on the DATABASE_URL server
+    "verify_postgres_db": os.getenv("VERIFY_POSTGRES_DB", "backup_verify"),
+    "verify_clickhouse_db": os.getenv("VERIFY_CLICKHOUSE_DB", "backup_verify"),
+    "verify_key_tables": [
+        t.strip() for t in os.getenv(
+            "VERIFY_KEY_TABLES",
+            "LiteLLM_VerificationToken,LiteLLM_SpendLogs,traces,observations,scores"
+        ).split(",") if t.strip()
+    ],
+    "verify_max_rto_seconds": int(os.getenv("VERIFY_MAX_RTO_SECONDS", "0")),  # 0 disables the RTO alert
+    
+    # WAL archiving (point-in-time recovery)
+    "wal_archive_enabled": os.getenv("WAL_ARCHIVE_ENABLED", "false").lower() == "true",
+    "wal_slot_name": os.getenv("WAL_SLOT_NAME", "backup_service"),
+    "wal_upload_parallelism": max(1, int(os.getenv("WAL_UPLOAD_PARALLELISM", "4"))),
+    "wal_partial_upload_seconds": int(os.getenv("WAL_PARTIAL_UPLOAD_SECONDS", "10")),  # Upper bound on RPO
+    "basebackup_schedule": os.getenv("BASEBACKUP_SCHEDULE", "daily"),  # daily, weekly
+    
+    # Spend-log archival (old LiteLLM_SpendLogs rows move to Parquet in MinIO)
+    "spend_archive_enabled": os.getenv("SPEND_ARCHIVE_ENABLED", "false").lower() == "true",
+    "spend_archive_days": int(os.getenv("SPEND_ARCHIVE_DAYS", "90")),  # Rows kept in Postgres
+    "spend_archive_hour": int(os.getenv("SPEND_ARCHIVE_HOUR", "4")),  # Hour of day for archival runs (UTC)
+    "spend_archive_bucket": os.getenv("SPEND_ARCHIVE_BUCKET", "spend-archive"),  # Not the backup bucket: that one is pruned by retention
+    "spend_archive_prefix": os.getenv("SPEND_ARCHIVE_PREFIX", "spend-logs"),
+    "spend_archive_table": os.getenv("SPEND_ARCHIVE_TABLE", "LiteLLM_SpendLogs"),
+    "spend_archive_fetch_rows": int(os.getenv("SPEND_ARCHIVE_FETCH_ROWS", "50000")),  # Rows per cursor fetch and Parquet row group
+    "spend_archive_delete_batch": int(os.getenv("SPEND_ARCHIVE_DELETE_BATCH", "5000")),
+    "spend_archive_delete_pause_ms": int(os.getenv("SPEND_ARCHIVE_DELETE_PAUSE_MS", "100")),
+    
+    # Langfuse event bucket sync (incremental mirror of raw ingestion events)
+    "bucket_sync_enabled": os.getenv("BUCKET_SYNC_ENABLED", "false").lower() == "true",
+    "bucket_sync_source_bucket": os.getenv("BUCKET_SYNC_SOURCE_BUCKET", os.getenv("LANGFUSE_S3_EVENT_UPLOAD_BUCKET", "langfuse")),
+    "bucket_sync_source_prefix": os.getenv("BUCKET_SYNC_SOURCE_PREFIX", ""),
+    "bucket_sync_source_endpoint": os.getenv("BUCKET_SYNC_SOURCE_ENDPOINT", "").replace("http://", "").replace("https://", ""),  # Empty: the backup MinIO (server-side copies)
+    "bucket_sync_source_access_key": os.getenv("BUCKET_SYNC_SOURCE_ACCESS_KEY", os.getenv("MINIO_ACCESS_KEY", os.getenv("MINIO_ROOT_USER", "minioadmin"))),
+    "bucket_sync_source_secret_key": os.getenv("BUCKET_SYNC_SOURCE_SECRET_KEY", os.getenv("MINIO_SECRET_KEY", os.getenv("MINIO_ROOT_PASSWORD", ""))),
+    "bucket_sync_source_secure": os.getenv("BUCKET_SYNC_SOURCE_SECURE", "false").lower() == "true",
+    "bucket_sync_bucket": os.getenv("BUCKET_SYNC_BUCKET", "langfuse-events-backup"),  # Not the backup bucket: that one is pruned by retention
+    "bucket_sync_workers": max(1, int(os.getenv("BUCKET_SYNC_WORKERS", "16"))),
+    "bucket_sync_checkpoint_seconds": max(60, int(os.getenv("BUCKET_SYNC_CHECKPOINT_SECONDS", "300"))),
+    "bucket_sync_full_every": max(1, int(os.getenv("BUCKET_SYNC_FULL_EVERY", "30"))),  # Snapshots per full listing
+    
     # Alerting
     "alert_webhook_url": os.getenv("ALERT_WEBHOOK_URL", ""),
     "alert_on_success": os.getenv("ALERT_ON_SUCCESS", "false").lower() == "true",
@@ -71,12 +182,345 @@ backup_state = {
     "last_backup": None,
     "last_status": "pending",
     "last_error": None,
+    "last_backup_id": None,
     "postgres_backups": 0,
     "clickhouse_backups": 0,
+    "redis_backups": 0,
     "total_size_bytes": 0,
+    "throttle_factor": 1.0,
+}
+
+# Global state for WAL archiving
+wal_state = {
+    "enabled": CONFIG["wal_archive_enabled"],
+    "streaming": False,
+    "last_segment": None,
+    "last_upload": None,
+    "segments_uploaded": 0,
+    "pending_segments": 0,
+    "compressed_bytes": 0,
+    "receiver_restarts": 0,
+    "last_base_backup": None,
+    "last_error": None,
+}
+
+# Global state for spend-log archival
+archive_state = {
+    "enabled": CONFIG["spend_archive_enabled"],
+    "last_run": None,
+    "last_status": "pending",
+    "last_error": None,
+    "rows_archived": 0,
+    "bytes_archived": 0,
+}
+
+# Global state for the Langfuse event bucket sync
+bucket_sync_state = {
+    "enabled": CONFIG["bucket_sync_enabled"],
+    "last_run": None,
+    "last_status": "pending",
+    "last_error": None,
+    "last_snapshot": None,
+    "objects": 0,
+    "last_copied": 0,
+    "last_bytes": 0,
+    "last_objects_per_second": None,
+    "last_mib_per_second": None,
+}
+
+# Global state for ClickHouse maintenance
+clickhouse_state = {
+    "enabled": CONFIG["clickhouse_maintenance_enabled"],
+    "last_run": None,
+    "last_status": "pending",
+    "last_error": None,
+    "last_part_check": None,
+    "tables": {},
+    "runs": [],
+}
+
+# Global state for restore verification
+verify_state = {
+    "last_verified": None,
+    "last_status": "pending",
+    "last_error": None,
+    "backup_id": None,
+    "mode": CONFIG["verify_mode"],
+    "rto_seconds": None,
+    "rto_history": [],
+    "results": [],
 }
 
 
+class RateLimiter:
+    """Byte-rate limiter shared between threads; a rate of 0 means unlimited"""
+    
+    def __init__(self, rate_mb: float):
+        self.max_rate = rate_mb * 1024 * 1024
+        self.rate = self.max_rate
+        self._next_free = time.monotonic()
+        self._lock = Lock()
+    
+    @property
+    def active(self) -> bool:
+        return self.max_rate > 0
+    
+    def scale(self, factor: float):
+        """Run at a fraction of the configured rate (used by adaptive mode)"""
+        self.rate = self.max_rate * factor
+    
+    def acquire(self, nbytes: int) -> float:
+        """Block until nbytes may be transferred; returns the seconds waited"""
+        if self.rate <= 0 or nbytes <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_free, now)
+            self._next_free = start + nbytes / self.rate
+        if start > now:
+            time.sleep(start - now)
+        return max(start - now, 0.0)
+
+
+class ThrottledReader(io.RawIOBase):
+    """Wrap a binary stream so reads are paced by a RateLimiter"""
+    
+    def __init__(self, raw, limiter: RateLimiter):
+        self._raw = raw
+        self._limiter = limiter
+        self.waited = 0.0
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, b) -> int:
+        n = self._raw.readinto(b)
+        self.waited += self._limiter.acquire(n or 0)
+        return n
+
+
+class MeteredStream(io.RawIOBase):
+    """Wrap a raw stream to count bytes and the time spent blocked on it"""
+    
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes = 0
+        self.seconds = 0.0
+    
+    def readable(self):
+        return self._raw.readable()
+    
+    def writable(self):
+        return self._raw.writable()
+    
+    def readinto(self, b) -> int:
+        started = time.perf_counter()
+        n = self._raw.readinto(b)
+        self.seconds += time.perf_counter() - started
+        self.bytes += n or 0
+        return n
+    
+    def write(self, b) -> int:
+        started = time.perf_counter()
+        n = self._raw.write(b)
+        self.seconds += time.perf_counter() - started
+        self.bytes += n or 0
+        return n
+
+
+# Upper bounds (seconds) for stage duration histograms
+STAGE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+
+class BackupMetrics:
+    """Per-stage timings and byte counts for backup runs, with a short run history"""
+    
+    def __init__(self, history_size: int):
+        self._lock = Lock()
+        self.current = None
+        self.history = deque(maxlen=history_size)
+        self._durations = {}  # (database, stage) -> [bucket counts..., +Inf count, sum]
+        self._bytes = defaultdict(int)  # (database, stage, direction) -> bytes
+        self._runs = defaultdict(int)  # status -> count
+    
+    def start_run(self, backup_id: str):
+        with self._lock:
+            self.current = {
+                "backup_id": backup_id,
+                "started_at": datetime.utcnow().isoformat(),
+                "finished_at": None,
+                "seconds": None,
+                "status": "running",
+                "stages": [],
+            }
+    
+    def finish_run(self, status: str):
+        with self._lock:
+            run, self.current = self.current, None
+            if run is None:
+                return
+            run["finished_at"] = datetime.utcnow().isoformat()
+            run["seconds"] = round(
+                (datetime.fromisoformat(run["finished_at"]) - datetime.fromisoformat(run["started_at"])).total_seconds(), 3
+            )
+            run["status"] = status
+            self.history.append(run)
+            self._runs[status] += 1
+    
+    @contextmanager
+    def stage(self, database: str, stage: str, table: str = ""):
+        """
+        Time one stage. The yielded record can be given bytes_in/bytes_out;
+        its seconds can be overridden when a pipeline stage is measured directly.
+        """
+        record = {"database": database, "table": table, "stage": stage,
+                  "bytes_in": 0, "bytes_out": 0, "seconds": None, "status": "success"}
+        started = time.perf_counter()
+        with tracing.span(f"{database}.{stage}", **{"backup.database": database, "backup.table": table,
+                                                     "backup.stage": stage}) as span:
+            try:
+                yield record
+            except Exception:
+                record["status"] = "error"
+                raise
+            finally:
+                if record["seconds"] is None:
+                    record["seconds"] = time.perf_counter() - started
+                record["seconds"] = round(record["seconds"], 3)
+                elapsed = max(record["seconds"], 0.001)
+                record["mib_per_second"] = round(max(record["bytes_in"], record["bytes_out"]) / elapsed / 1024 / 1024, 2)
+                self._record(record)
+                tracing.set_attributes(span, **{
+                    "backup.bytes_in": record["bytes_in"],
+                    "backup.bytes_out": record["bytes_out"],
+                    "backup.seconds": record["seconds"],
+                    "backup.mib_per_second": record["mib_per_second"],
+                    "backup.status": record["status"],
+                })
+    
+    def _record(self, record: dict):
+        with self._lock:
+            if self.current is not None:
+                self.current["stages"].append(record)
+            if record["table"]:
+                return  # Per-table detail stays in the run history
+            key = (record["database"], record["stage"])
+            buckets = self._durations.setdefault(key, [0] * (len(STAGE_BUCKETS) + 2))
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if record["seconds"] <= bound:
+                    buckets[i] += 1
+            buckets[-2] += 1
+            buckets[-1] += record["seconds"]
+            self._bytes[(record["database"], record["stage"], "in")] += record["bytes_in"]
+            self._bytes[(record["database"], record["stage"], "out")] += record["bytes_out"]
+    
+    def runs(self) -> list:
+        with self._lock:
+            runs = list(self.history)
+            if self.current is not None:
+                runs.append(self.current)
+            return runs
+    
+    def render(self) -> str:
+        """Prometheus text exposition"""
+        with self._lock:
+            lines = [
+                "# HELP backup_stage_duration_seconds Duration of backup stages",
+                "# TYPE backup_stage_duration_seconds histogram",
+            ]
+            for (database, stage), buckets in sorted(self._durations.items()):
+                labels = f'database="{database}",stage="{stage}"'
+                for bound, count in zip(STAGE_BUCKETS, buckets):
+                    lines.append(f'backup_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'backup_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {buckets[-2]}')
+                lines.append(f"backup_stage_duration_seconds_sum{{{labels}}} {buckets[-1]:.3f}")
+                lines.append(f"backup_stage_duration_seconds_count{{{labels}}} {buckets[-2]}")
+            
+            lines.append("# HELP backup_stage_bytes_total Bytes read (in) and written (out) by backup stages")
+            lines.append("# TYPE backup_stage_bytes_total counter")
+            for (database, stage, direction), value in sorted(self._bytes.items()):
+                lines.append(
+                    f'backup_stage_bytes_total{{database="{database}",stage="{stage}",direction="{direction}"}} {value}'
+                )
+            
+            lines.append("# HELP backup_runs_total Completed backup runs by status")
+            lines.append("# TYPE backup_runs_total counter")
+            for status, value in sorted(self._runs.items()):
+                lines.append(f'backup_runs_total{{status="{status}"}} {value}')
+            
+            if self.history:
+                last = self.history[-1]
+                lines.append("# HELP backup_last_run_duration_seconds Duration of the last backup run")
+                lines.append("# TYPE backup_last_run_duration_seconds gauge")
+                lines.append(f"backup_last_run_duration_seconds {last['seconds']}")
+                lines.append("# HELP backup_last_run_table_stage_seconds Per-table stage duration in the last run")
+                lines.append("# TYPE backup_last_run_table_stage_seconds gauge")
+                for record in last["stages"]:
+                    if record["table"]:
+                        lines.append(
+                            f'backup_last_run_table_stage_seconds{{database="{record["database"]}",'
+                            f'table="{record["table"]}",stage="{record["stage"]}"}} {record["seconds"]}'
+                        )
+            return "\n".join(lines) + "\n"
+
+
+metrics = BackupMetrics(CONFIG["metrics_history_runs"])
+
+
+read_limiter = RateLimiter(CONFIG["read_rate_mb"])
+upload_limiter = RateLimiter(CONFIG["upload_rate_mb"])
+
+
+def clickhouse_export_settings() -> dict:
+    """Query settings that keep backup exports from starving live queries"""
+    settings = {}
+    if CONFIG["clickhouse_max_threads"]:
+        settings["max_threads"] = CONFIG["clickhouse_max_threads"]
+    if CONFIG["clickhouse_priority"]:
+        settings["priority"] = CONFIG["clickhouse_priority"]
+    # Bandwidth is left to read_limiter on our side of the stream: a server-side
+    # max_network_bandwidth is fixed per query, so adaptive mode couldn't recover
+    return settings
+
+
+def _adaptive_throttle(stop: Event):
+    """
+    Scale backup I/O with database latency reported by the health monitor:
+    halve the rate while Postgres or ClickHouse look degraded, recover slowly.
+    """
+    import requests
+    
+    factor = 1.0
+    while not stop.wait(CONFIG["adaptive_poll_seconds"]):
+        try:
+            services = requests.get(f"{CONFIG['health_monitor_url']}/health", timeout=5).json()["services"]
+        except Exception as e:
+            logger.debug(f"Health monitor unavailable for adaptive throttling: {e}")
+            continue
+        
+        degraded = [
+            name for name in ("postgres", "clickhouse")
+            if name in services and (
+                services[name]["status"] != "healthy"
+                or (services[name]["response_time_ms"] or 0) > CONFIG["adaptive_latency_ms"]
+            )
+        ]
+        new_factor = max(0.1, factor / 2) if degraded else min(1.0, factor + 0.1)
+        if new_factor != factor:
+            logger.info(
+                f"Adaptive throttle: {factor:.0%} -> {new_factor:.0%}"
+                + (f" ({', '.join(degraded)} degraded)" if degraded else "")
+            )
+        factor = new_factor
+        read_limiter.scale(factor)
+        upload_limiter.scale(factor)
+        backup_state["throttle_factor"] = factor
+    
+    read_limiter.scale(1.0)
+    upload_limiter.scale(1.0)
+    backup_state["throttle_factor"] = 1.0
+
+
 def send_alert(message: str, level: str = "info"):
     """Send alert to webhook (Slack, Discord, etc.)"""
     webhook_url = CONFIG["alert_webhook_url"]
@@ -106,21 +550,44 @@ def send_alert(message: str, level: str = "info"):
         logger.error(f"Failed to send alert: {e}")
 
 
+_minio_client = None
+_minio_client_lock = Lock()
+
+
 def get_minio_client():
-    """Get MinIO client instance"""
+    """Get shared MinIO client instance (one connection pool for all uploads)"""
+    global _minio_client
     if not MINIO_AVAILABLE:
         raise RuntimeError("minio package not installed")
     
-    return Minio(
-        CONFIG["minio_endpoint"],
-        access_key=CONFIG["minio_access_key"],
-        secret_key=CONFIG["minio_secret_key"],
-        secure=CONFIG["minio_secure"]
-    )
+    with _minio_client_lock:
+        if _minio_client is None:
+            import urllib3
+            from minio import Minio
+            
+            http_client = urllib3.PoolManager(
+                maxsize=max(10, CONFIG["upload_parallelism"] * 2, CONFIG["bucket_sync_workers"]),
+                timeout=urllib3.Timeout(connect=10, read=300),
+                retries=urllib3.Retry(
+                    total=5,
+                    backoff_factor=0.2,
+                    status_forcelist=[500, 502, 503, 504]
+                )
+            )
+            _minio_client = Minio(
+                CONFIG["minio_endpoint"],
+                access_key=CONFIG["minio_access_key"],
+                secret_key=CONFIG["minio_secret_key"],
+                secure=CONFIG["minio_secure"],
+                http_client=http_client
+            )
+        return _minio_client
 
 
 def ensure_bucket_exists(client, bucket_name: str):
     """Ensure backup bucket exists"""
+    from minio.error import S3Error
+    
     try:
         if not client.bucket_exists(bucket_name):
             client.make_bucket(bucket_name)
@@ -130,6 +597,56 @@ def ensure_bucket_exists(client, bucket_name: str):
         raise
 
 
+def get_clickhouse_client(database: Optional[str] = None):
+    """Get ClickHouse client instance"""
+    import clickhouse_connect
+    
+    return clickhouse_connect.get_client(
+        host=CONFIG["clickhouse_host"],
+        port=CONFIG["clickhouse_port"],
+        username=CONFIG["clickhouse_user"],
+        password=CONFIG["clickhouse_password"],
+        database=database or CONFIG["clickhouse_db"]
+    )
+
+
+COPY_STATEMENT = re.compile(rb"^COPY (.+?) (?:\(.*\) )?FROM stdin;$")
+
+
+def count_copy_rows(lines, sink=None) -> Dict[str, int]:
+    """
+    Count data rows per table in a plain-format pg_dump stream.
+    
+    Each line is also written to sink when given, so the count can be taken
+    while the dump is being compressed or restored.
+    """
+    counts = {}
+    table = None
+    for line in lines:
+        if sink is not None:
+            sink.write(line)
+        if table is not None:
+            if line == b"\\.\n":
+                table = None
+            else:
+                counts[table] += 1
+        elif line.startswith(b"COPY "):
+            match = COPY_STATEMENT.match(line.rstrip(b"\n"))
+            if match:
+                table = match.group(1).decode()
+                counts.setdefault(table, 0)
+    return counts
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a local file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def backup_postgres():
     """Backup PostgreSQL database using pg_dump"""
     if not CONFIG["postgres_url"]:
@@ -137,20 +654,57 @@ def backup_postgres():
         return None
     
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    backup_file = f"/tmp/postgres_backup_{timestamp}.sql.gz"
+    backup_file = os.path.join(CONFIG["work_dir"], f"postgres_backup_{timestamp}.sql.gz")
     
     try:
-        # Run pg_dump with compression
-        cmd = f'pg_dump "{CONFIG["postgres_url"]}" | gzip > {backup_file}'
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise RuntimeError(f"pg_dump failed: {result.stderr}")
+        # Run pg_dump with compression, counting COPY rows as the dump streams past.
+        # Dump and compress run concurrently, so each stage is timed by how long
+        # the pipeline was blocked waiting on it.
+        with metrics.stage("postgres", "dump") as dump_stage, \
+                metrics.stage("postgres", "compress") as compress_stage, \
+                open(backup_file, "wb") as out, tempfile.TemporaryFile() as dump_errors:
+            dump = subprocess.Popen(
+                ["pg_dump", CONFIG["postgres_url"]],
+                stdout=subprocess.PIPE, stderr=dump_errors, bufsize=0
+            )
+            gzip_proc = subprocess.Popen(["gzip"], stdin=subprocess.PIPE, stdout=out, bufsize=0)
+            dump_reader = MeteredStream(dump.stdout)
+            gzip_writer = MeteredStream(gzip_proc.stdin)
+            source = dump_reader
+            if read_limiter.active:
+                # Reading slowly back-pressures pg_dump, and through it the server
+                source = ThrottledReader(dump_reader, read_limiter)
+            sink = io.BufferedWriter(gzip_writer, 1024 * 1024)
+            row_counts = count_copy_rows(io.BufferedReader(source, 1024 * 1024), sink)
+            sink.flush()
+            gzip_proc.stdin.close()
+            
+            if dump.wait() != 0:
+                dump_errors.seek(0)
+                raise RuntimeError(f"pg_dump failed: {dump_errors.read().decode(errors='replace')}")
+            gzip_started = time.perf_counter()
+            if gzip_proc.wait() != 0:
+                raise RuntimeError("gzip failed")
+            
+            dump_stage["seconds"] = dump_reader.seconds
+            dump_stage["bytes_out"] = dump_reader.bytes
+            if source is not dump_reader:
+                dump_stage["throttled_seconds"] = round(source.waited, 3)
+            compress_stage["seconds"] = gzip_writer.seconds + time.perf_counter() - gzip_started
+            compress_stage["bytes_in"] = gzip_writer.bytes
+            compress_stage["bytes_out"] = os.fstat(out.fileno()).st_size
         
         file_size = os.path.getsize(backup_file)
         logger.info(f"PostgreSQL backup created: {backup_file} ({file_size} bytes)")
         
-        return backup_file
+        return {
+            "database": "postgres",
+            "file": backup_file,
+            "format": "sql.gz",
+            "size": file_size,
+            "sha256": file_sha256(backup_file),
+            "tables": {table: {"rows": rows} for table, rows in row_counts.items()},
+        }
     except Exception as e:
         logger.error(f"PostgreSQL backup failed: {e}")
         raise
@@ -167,43 +721,67 @@ def backup_clickhouse():
         return None
     
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    backup_dir = f"/tmp/clickhouse_backup_{timestamp}"
+    backup_dir = os.path.join(CONFIG["work_dir"], f"clickhouse_backup_{timestamp}")
     backup_file = f"{backup_dir}.tar.gz"
     
     try:
         os.makedirs(backup_dir, exist_ok=True)
         
         # Connect to ClickHouse
-        client = clickhouse_connect.get_client(
-            host=CONFIG["clickhouse_host"],
-            port=CONFIG["clickhouse_port"],
-            username=CONFIG["clickhouse_user"],
-            password=CONFIG["clickhouse_password"],
-            database=CONFIG["clickhouse_db"]
-        )
+        client = get_clickhouse_client()
         
-        # Get list of tables
-        tables = client.query("SHOW TABLES").result_rows
+        # Get list of tables with their schema so a restore can recreate them
+        tables = client.query(
+            "SELECT name, engine, create_table_query FROM system.tables "
+            "WHERE database = currentDatabase() AND NOT is_temporary "
+            "AND NOT startsWith(name, '.inner') ORDER BY name"
+        ).result_rows
         
-        for (table_name,) in tables:
-            # Export each table to TSV
-            table_file = f"{backup_dir}/{table_name}.tsv"
-            result = client.query(f"SELECT * FROM {table_name}")
+        manifest_tables = {}
+        export_started = time.perf_counter()
+        for table_name, engine, create_query in tables:
+            manifest_tables[table_name] = {
+                "engine": engine,
+                "create_query": create_query,
+                "rows": None,
+            }
+            if engine in ("View", "MaterializedView", "LiveView", "Dictionary"):
+                continue
             
-            with open(table_file, 'w') as f:
-                # Write header
-                f.write('\t'.join(result.column_names) + '\n')
-                # Write data
-                for row in result.result_rows:
-                    f.write('\t'.join(str(v) for v in row) + '\n')
+            # Export each table as server-escaped TSV, streamed straight to disk
+            table_file = f"{backup_dir}/{table_name}.tsv"
+            newlines = 0
+            with metrics.stage("clickhouse", "dump", table_name) as table_stage, \
+                    client.raw_stream(f"SELECT * FROM `{table_name}`", fmt="TabSeparatedWithNames",
+                                   settings=clickhouse_export_settings()) as stream, \
+                    open(table_file, 'wb') as f:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+                    read_limiter.acquire(len(chunk))
+                    f.write(chunk)
+                    newlines += chunk.count(b"\n")
+                    table_stage["bytes_out"] += len(chunk)
             
-            logger.info(f"Exported table: {table_name}")
+            # First line is the header
+            manifest_tables[table_name]["rows"] = max(newlines - 1, 0)
+            logger.info(f"Exported table: {table_name} ({newlines - 1} rows)")
+        
+        with metrics.stage("clickhouse", "dump") as dump_stage:
+            # Whole-database total of the per-table exports above
+            dump_stage["seconds"] = time.perf_counter() - export_started
+            dump_stage["bytes_out"] = sum(
+                os.path.getsize(os.path.join(backup_dir, name)) for name in os.listdir(backup_dir)
+            )
         
         # Create tarball
-        subprocess.run(
-            f"tar -czf {backup_file} -C /tmp clickhouse_backup_{timestamp}",
-            shell=True, check=True
-        )
+        with metrics.stage("clickhouse", "compress") as compress_stage:
+            compress_stage["bytes_in"] = sum(
+                os.path.getsize(os.path.join(backup_dir, name)) for name in os.listdir(backup_dir)
+            )
+            subprocess.run(
+                f"tar -czf {backup_file} -C {CONFIG['work_dir']} clickhouse_backup_{timestamp}",
+                shell=True, check=True
+            )
+            compress_stage["bytes_out"] = os.path.getsize(backup_file)
         
         # Cleanup temp dir
         subprocess.run(f"rm -rf {backup_dir}", shell=True)
@@ -211,13 +789,265 @@ def backup_clickhouse():
         file_size = os.path.getsize(backup_file)
         logger.info(f"ClickHouse backup created: {backup_file} ({file_size} bytes)")
         
-        return backup_file
+        return {
+            "database": "clickhouse",
+            "file": backup_file,
+            "format": "tar.gz+TabSeparatedWithNames",
+            "size": file_size,
+            "sha256": file_sha256(backup_file),
+            "source_database": CONFIG["clickhouse_db"],
+            "tables": manifest_tables,
+        }
     except Exception as e:
         logger.error(f"ClickHouse backup failed: {e}")
         raise
 
 
-def upload_to_minio(local_file: str, prefix: str = ""):
+def _redis_cli_args() -> list:
+    return ["redis-cli", "-h", CONFIG["redis_host"], "-p", str(CONFIG["redis_port"])]
+
+
+def _redis_cli_env() -> dict:
+    # Passed through the environment so the password doesn't show up in ps
+    env = dict(os.environ)
+    if CONFIG["redis_password"]:
+        env["REDISCLI_AUTH"] = CONFIG["redis_password"]
+    return env
+
+
+def redis_keyspace() -> Dict[str, dict]:
+    """Key counts per logical database, from INFO keyspace"""
+    output = subprocess.run(
+        _redis_cli_args() + ["INFO", "keyspace"],
+        env=_redis_cli_env(), capture_output=True, check=True, timeout=30
+    ).stdout.decode()
+    keyspace = {}
+    for line in output.splitlines():
+        # db0:keys=1523,expires=1400,avg_ttl=3591054
+        name, _, fields = line.strip().partition(":")
+        if name.startswith("db") and fields:
+            values = dict(field.split("=", 1) for field in fields.split(","))
+            keyspace[name] = {"keys": int(values["keys"]), "expires": int(values.get("expires", 0))}
+    return keyspace
+
+
+def backup_redis():
+    """
+    Backup Redis by streaming an RDB snapshot through replication.
+    
+    `redis-cli --rdb` asks the server for a full resync, the same snapshot a
+    new replica would get, so it works without access to the Redis volume.
+    """
+    if not CONFIG["redis_backup_enabled"] or not CONFIG["redis_host"]:
+        logger.warning("Redis host not configured, skipping backup")
+        return None
+    
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    rdb_file = os.path.join(CONFIG["work_dir"], f"redis_backup_{timestamp}.rdb")
+    backup_file = f"{rdb_file}.gz"
+    
+    try:
+        keyspace = redis_keyspace()
+        
+        with metrics.stage("redis", "dump") as dump_stage:
+            result = subprocess.run(
+                _redis_cli_args() + ["--rdb", rdb_file],
+                env=_redis_cli_env(), capture_output=True
+            )
+            if result.returncode != 0 or not os.path.exists(rdb_file):
+                raise RuntimeError(f"redis-cli --rdb failed: {result.stderr.decode(errors='replace')}")
+            with open(rdb_file, "rb") as f:
+                if f.read(5) != b"REDIS":
+                    raise RuntimeError("redis-cli --rdb did not produce an RDB file")
+            dump_stage["bytes_out"] = os.path.getsize(rdb_file)
+        
+        with metrics.stage("redis", "compress") as compress_stage:
+            compress_stage["bytes_in"] = os.path.getsize(rdb_file)
+            subprocess.run(["gzip", "-f", rdb_file], check=True)
+            compress_stage["bytes_out"] = os.path.getsize(backup_file)
+        
+        file_size = os.path.getsize(backup_file)
+        logger.info(f"Redis backup created: {backup_file} ({file_size} bytes)")
+        
+        return {
+            "database": "redis",
+            "file": backup_file,
+            "format": "rdb.gz",
+            "size": file_size,
+            "sha256": file_sha256(backup_file),
+            "rdb_size": compress_stage["bytes_in"],
+            # Key counts are taken just before the snapshot and drift with TTLs,
+            # so they're informational rather than compared on restore
+            "tables": keyspace,
+        }
+    except Exception as e:
+        logger.error(f"Redis backup failed: {e}")
+        if os.path.exists(rdb_file):
+            os.remove(rdb_file)
+        raise
+
+
+def _upload_state_path(bucket: str, object_name: str) -> str:
+    """Location of the persisted progress file for a multipart upload"""
+    key = hashlib.sha1(f"{bucket}/{object_name}".encode()).hexdigest()
+    return os.path.join(CONFIG["work_dir"], "uploads", f"{key}.json")
+
+
+def _load_upload_state(path: str) -> Optional[dict]:
+    """Load persisted multipart upload progress, if any"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable upload state {path}: {e}")
+        return None
+
+
+def _save_upload_state(path: str, state: dict):
+    """Persist multipart upload progress atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _part_size_for(file_size: int) -> int:
+    """Pick a part size that respects the configured size and the 10,000 part limit"""
+    part_size = CONFIG["upload_part_size_mb"] * 1024 * 1024
+    while file_size > part_size * 10000:
+        part_size *= 2
+    return part_size
+
+
+def _list_uploaded_parts(client, bucket: str, object_name: str, upload_id: str) -> dict:
+    """Return {part_number: etag} for parts the server already holds"""
+    parts = {}
+    marker = None
+    while True:
+        result = client._list_parts(bucket, object_name, upload_id, part_number_marker=marker)
+        for part in result.parts:
+            parts[part.part_number] = part.etag.strip('"')
+        if not result.is_truncated:
+            return parts
+        marker = result.next_part_number_marker
+
+
+def _local_part_sha256(local_file: str, part_number: int, part_size: int) -> str:
+    with open(local_file, "rb") as f:
+        f.seek((part_number - 1) * part_size)
+        return hashlib.sha256(f.read(part_size)).hexdigest()
+
+
+def multipart_upload(client, bucket: str, object_name: str, local_file: str, prefix: str = "",
+                     manifest_context: Optional[dict] = None):
+    """
+    Upload a file as parallel, checksummed parts.
+    
+    Progress is persisted under BACKUP_WORK_DIR after every part, so a restarted
+    service continues an interrupted upload instead of sending the file again.
+    manifest_context (backup id and artifact entry) is persisted with it, so
+    the resumed artifact can be added to its run's manifest.
+    """
+    from minio.datatypes import Part
+    from minio.error import S3Error
+    
+    file_size = os.path.getsize(local_file)
+    part_size = _part_size_for(file_size)
+    part_count = max(1, -(-file_size // part_size))
+    state_path = _upload_state_path(bucket, object_name)
+    
+    state = _load_upload_state(state_path)
+    if state and (state["local_file"] != local_file
+                  or state["size"] != file_size
+                  or state["part_size"] != part_size):
+        logger.warning(f"Discarding stale upload state for {object_name}")
+        try:
+            client._abort_multipart_upload(bucket, object_name, state["upload_id"])
+        except S3Error:
+            pass
+        state = None
+    
+    if state:
+        try:
+            uploaded = _list_uploaded_parts(client, bucket, object_name, state["upload_id"])
+            # Only trust parts the server holds with the ETag we recorded, and
+            # whose local bytes still hash to what was sent
+            state["parts"] = {
+                number: part for number, part in state["parts"].items()
+                if uploaded.get(int(number)) == part["etag"]
+                and _local_part_sha256(local_file, int(number), part_size) == part["sha256"]
+            }
+            logger.info(
+                f"Resuming upload of {object_name}: "
+                f"{len(state['parts'])}/{part_count} parts already uploaded"
+            )
+        except S3Error as e:
+            if e.code != "NoSuchUpload":
+                raise
+            logger.warning(f"Previous upload of {object_name} expired, starting again")
+            state = None
+    
+    if not state:
+        upload_id = client._create_multipart_upload(
+            bucket, object_name, {"Content-Type": "application/octet-stream"}
+        )
+        state = {
+            "bucket": bucket,
+            "object_name": object_name,
+            "prefix": prefix,
+            "local_file": local_file,
+            "size": file_size,
+            "part_size": part_size,
+            "upload_id": upload_id,
+            "manifest": manifest_context,
+            "parts": {},
+        }
+        _save_upload_state(state_path, state)
+    
+    state_lock = Lock()
+    
+    def upload_part(part_number: int):
+        with open(local_file, "rb") as f:
+            f.seek((part_number - 1) * part_size)
+            data = f.read(part_size)
+        
+        upload_limiter.acquire(len(data))
+        md5 = hashlib.md5(data)
+        headers = {"Content-MD5": base64.b64encode(md5.digest()).decode()}
+        etag = client._upload_part(
+            bucket, object_name, data, headers, state["upload_id"], part_number
+        ).strip('"')
+        
+        # The server rejects a body that doesn't match Content-MD5; the ETag
+        # check also catches proxies that rewrite the request.
+        if len(etag) == 32 and etag != md5.hexdigest():
+            raise RuntimeError(f"Checksum mismatch on part {part_number} of {object_name}")
+        
+        with state_lock:
+            state["parts"][str(part_number)] = {
+                "etag": etag,
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+            _save_upload_state(state_path, state)
+    
+    pending = [n for n in range(1, part_count + 1) if str(n) not in state["parts"]]
+    with ThreadPoolExecutor(max_workers=CONFIG["upload_parallelism"]) as pool:
+        for future in as_completed([pool.submit(upload_part, n) for n in pending]):
+            future.result()
+    
+    parts = [Part(n, state["parts"][str(n)]["etag"]) for n in range(1, part_count + 1)]
+    client._complete_multipart_upload(bucket, object_name, state["upload_id"], parts)
+    os.remove(state_path)
+
+
+def upload_to_minio(local_file: str, prefix: str = "", database: Optional[str] = None,
+                    manifest_context: Optional[dict] = None):
     """Upload backup file to MinIO/S3"""
     if not MINIO_AVAILABLE:
         logger.warning("MinIO not available, backup saved locally only")
@@ -230,21 +1060,109 @@ def upload_to_minio(local_file: str, prefix: str = ""):
         
         filename = os.path.basename(local_file)
         object_name = f"{prefix}/{filename}" if prefix else filename
+        file_size = os.path.getsize(local_file)
         
-        client.fput_object(bucket, object_name, local_file)
-        logger.info(f"Uploaded to MinIO: {bucket}/{object_name}")
+        start_time = time.time()
+        with metrics.stage(database or prefix or "other", "upload") as upload_stage:
+            if file_size <= CONFIG["upload_part_size_mb"] * 1024 * 1024 and upload_limiter.active:
+                with open(local_file, "rb") as f:
+                    client.put_object(bucket, object_name, ThrottledReader(f, upload_limiter), file_size)
+            elif file_size <= CONFIG["upload_part_size_mb"] * 1024 * 1024:
+                client.fput_object(bucket, object_name, local_file)
+            else:
+                multipart_upload(client, bucket, object_name, local_file, prefix, manifest_context)
+            upload_stage["bytes_in"] = upload_stage["bytes_out"] = file_size
+        elapsed = max(time.time() - start_time, 0.001)
+        logger.info(
+            f"Uploaded to MinIO: {bucket}/{object_name} "
+            f"({file_size} bytes, {file_size / elapsed / 1024 / 1024:.1f} MiB/s)"
+        )
         
         # Update stats
-        backup_state["total_size_bytes"] += os.path.getsize(local_file)
+        backup_state["total_size_bytes"] += file_size
         
         # Cleanup local file
         os.remove(local_file)
         
+        return object_name
     except Exception as e:
         logger.error(f"Upload to MinIO failed: {e}")
         raise
 
 
+def resume_pending_uploads():
+    """Finish multipart uploads interrupted by a previous run of the service"""
+    if not MINIO_AVAILABLE:
+        return
+    
+    for state_path in glob.glob(os.path.join(CONFIG["work_dir"], "uploads", "*.json")):
+        state = _load_upload_state(state_path)
+        if not state:
+            continue
+        
+        if not os.path.exists(state["local_file"]):
+            logger.warning(f"Local file for {state['object_name']} is gone, abandoning upload")
+            try:
+                get_minio_client()._abort_multipart_upload(
+                    state["bucket"], state["object_name"], state["upload_id"]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to abort upload of {state['object_name']}: {e}")
+            os.remove(state_path)
+            continue
+        
+        context = state.get("manifest")
+        try:
+            object_name = upload_to_minio(
+                state["local_file"], state["prefix"], context["artifact"]["database"] if context else None, context
+            )
+            if context:
+                _record_resumed_artifact(context, object_name)
+        except Exception as e:
+            logger.error(f"Failed to resume upload of {state['object_name']}: {e}")
+    
+    # Dumps of runs interrupted before their upload started can't be resumed
+    referenced = {s["local_file"] for s in filter(None, map(
+        _load_upload_state, glob.glob(os.path.join(CONFIG["work_dir"], "uploads", "*.json"))
+    ))}
+    for database in ("postgres", "clickhouse", "redis"):
+        for path in glob.glob(os.path.join(CONFIG["work_dir"], f"{database}_backup_*")):
+            if path in referenced:
+                continue
+            logger.info(f"Removing leftover {path}")
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+
+def _record_resumed_artifact(context: dict, object_name: str):
+    """Add an artifact whose upload finished after a restart to its run's manifest"""
+    from minio.error import S3Error
+    
+    client = get_minio_client()
+    artifact = dict(context["artifact"], object_name=object_name)
+    database = artifact["database"]
+    try:
+        response = client.get_object(CONFIG["backup_bucket"], f"manifests/backup_{context['backup_id']}.json")
+        try:
+            manifest = json.loads(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+    except S3Error as e:
+        if e.code != "NoSuchKey":
+            raise
+        # The run died before writing its manifest
+        manifest = {"backup_id": context["backup_id"], "created_at": context["created_at"], "artifacts": []}
+    
+    manifest["artifacts"] = [a for a in manifest["artifacts"] if a["database"] != database] + [artifact]
+    manifest["errors"] = [e for e in manifest.get("errors", []) if not e.startswith(f"{database}_upload:")]
+    manifest["resumed"] = sorted(set(manifest.get("resumed", [])) | {database})
+    write_manifest(manifest)
+    backup_state[f"{database}_backups"] += 1
+    if (backup_state["last_backup_id"] or "") < manifest["backup_id"]:
+        backup_state["last_backup_id"] = manifest["backup_id"]
+    logger.info(f"Added resumed {database} artifact to backup {manifest['backup_id']}")
+
+
 def cleanup_old_backups():
     """Remove backups older than retention period"""
     if not MINIO_AVAILABLE:
@@ -260,12 +1178,24 @@ def cleanup_old_backups():
         cutoff_date = datetime.utcnow() - timedelta(days=CONFIG["retention_days"])
         deleted_count = 0
         
-        objects = client.list_objects(bucket, recursive=True)
-        for obj in objects:
-            if obj.last_modified.replace(tzinfo=None) < cutoff_date:
-                client.remove_object(bucket, obj.object_name)
-                logger.info(f"Deleted old backup: {obj.object_name}")
-                deleted_count += 1
+        with metrics.stage("all", "cleanup") as cleanup_stage:
+            objects = client.list_objects(bucket, recursive=True)
+            for obj in objects:
+                # WAL is only useful with the base backup it replays onto; pruned as a chain below
+                if obj.object_name.startswith(("wal/", "basebackups/")):
+                    continue
+                if obj.last_modified.replace(tzinfo=None) < cutoff_date:
+                    client.remove_object(bucket, obj.object_name)
+                    logger.info(f"Deleted old backup: {obj.object_name}")
+                    deleted_count += 1
+                    cleanup_stage["bytes_in"] += obj.size or 0
+            
+            from wal_archive import prune_archive
+            pruned = prune_archive(client, cutoff_date)
+            if pruned:
+                logger.info(f"Pruned {len(pruned)} base backup and WAL objects older than the retained chain")
+            deleted_count += len(pruned)
+            cleanup_stage["bytes_in"] += sum(obj.size or 0 for obj in pruned)
         
         if deleted_count > 0:
             logger.info(f"Cleaned up {deleted_count} old backups")
@@ -274,36 +1204,186 @@ def cleanup_old_backups():
         logger.error(f"Cleanup failed: {e}")
 
 
-def run_backup():
-    """Execute full backup routine"""
-    logger.info("Starting backup routine...")
-    backup_state["last_backup"] = datetime.utcnow().isoformat()
+def write_manifest(manifest: dict):
+    """Upload the manifest describing one backup run"""
+    client = get_minio_client()
+    bucket = CONFIG["backup_bucket"]
+    body = json.dumps(manifest, indent=2).encode()
+    object_name = f"manifests/backup_{manifest['backup_id']}.json"
+    client.put_object(
+        bucket, object_name, io.BytesIO(body), len(body),
+        content_type="application/json"
+    )
+    logger.info(f"Wrote backup manifest: {bucket}/{object_name}")
+
+
+@dataclass
+class Stage:
+    """One node of the backup DAG"""
+    name: str
+    label: str  # Used in alert messages
+    func: Callable[[], None]
+    deps: Tuple[str, ...] = ()
+    memory_mb: int = 0  # Estimated peak memory, admitted against the run's budget
+    always_run: bool = False  # Run even if a dependency failed
+
+
+def run_stages(stages: List[Stage], max_concurrency: int, memory_budget_mb: int,
+               results: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Optional[str]]:
+    """
+    Run stages in dependency order, overlapping independent ones.
     
-    errors = []
+    Returns {stage name: None on success, otherwise the error}. A stage whose
+    dependency failed is skipped unless it is marked always_run. A stage that
+    alone exceeds the memory budget still runs, but only when nothing else is.
+    """
+    results = {} if results is None else results
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    memory_in_use = 0
     
-    # PostgreSQL backup
-    try:
-        pg_backup = backup_postgres()
-        if pg_backup:
-            upload_to_minio(pg_backup, "postgres")
-            backup_state["postgres_backups"] += 1
-    except Exception as e:
-        errors.append(f"PostgreSQL: {e}")
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        while pending or running:
+            for stage in list(pending.values()):
+                failed = [d for d in stage.deps if results.get(d)]
+                if failed and not stage.always_run:
+                    results[stage.name] = f"skipped ({', '.join(failed)} failed)"
+                    del pending[stage.name]
+            
+            ready = [s for s in pending.values() if all(d in results for d in s.deps)]
+            for stage in ready:
+                if len(running) >= max_concurrency:
+                    break
+                if running and memory_in_use + stage.memory_mb > memory_budget_mb:
+                    continue
+                # Copy the context so the stage's spans nest under the run's
+                running[pool.submit(contextvars.copy_context().run, _traced_stage, stage)] = stage
+                memory_in_use += stage.memory_mb
+                del pending[stage.name]
+            
+            if not running:
+                # Nothing runnable: remaining stages depend on unknown names
+                for name in pending:
+                    results[name] = "skipped (unmet dependencies)"
+                break
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                memory_in_use -= stage.memory_mb
+                try:
+                    future.result()
+                    results[stage.name] = None
+                except Exception as e:
+                    results[stage.name] = str(e)
     
-    # ClickHouse backup
+    return results
+
+
+def _traced_stage(stage: Stage):
+    with tracing.span(f"stage.{stage.name}", **{"backup.stage_label": stage.label}):
+        stage.func()
+
+
+# Held for the duration of a run; a trigger while it's held is deduplicated
+_backup_lock = Lock()
+
+
+def run_backup() -> bool:
+    """Execute full backup routine. Returns False if a run was already in progress."""
+    if not _backup_lock.acquire(blocking=False):
+        logger.info("Backup already in progress, ignoring trigger")
+        return False
     try:
-        ch_backup = backup_clickhouse()
-        if ch_backup:
-            upload_to_minio(ch_backup, "clickhouse")
-            backup_state["clickhouse_backups"] += 1
-    except Exception as e:
-        errors.append(f"ClickHouse: {e}")
+        with tracing.span("backup.run") as span:
+            _run_backup()
+            tracing.set_attributes(span, **{
+                "backup.id": backup_state.get("last_backup_id"),
+                "backup.status": backup_state["last_status"],
+                "backup.error": backup_state.get("last_error"),
+            })
+    finally:
+        _backup_lock.release()
+    return True
+
+
+def _run_backup():
+    logger.info("Starting backup routine...")
+    started = datetime.utcnow()
+    backup_state["last_backup"] = started.isoformat()
+    backup_state["last_status"] = "running"
     
-    # Cleanup old backups
-    try:
-        cleanup_old_backups()
-    except Exception as e:
-        errors.append(f"Cleanup: {e}")
+    throttle_stop = Event()
+    if CONFIG["io_mode"] == "adaptive":
+        Thread(target=_adaptive_throttle, args=(throttle_stop,), daemon=True).start()
+    
+    metrics.start_run(started.strftime("%Y%m%d_%H%M%S"))
+    manifest = {
+        "backup_id": started.strftime("%Y%m%d_%H%M%S"),
+        "created_at": started.isoformat(),
+        "artifacts": [],
+    }
+    artifacts = {}
+    results = {}
+    
+    def dump(database: str, backup_func):
+        def run():
+            artifacts[database] = backup_func()
+        return run
+    
+    def upload(database: str):
+        def run():
+            artifact = artifacts.get(database)
+            if artifact:
+                # Lets a restarted service add the artifact to this manifest if the upload is resumed
+                context = {
+                    "backup_id": manifest["backup_id"],
+                    "created_at": manifest["created_at"],
+                    "artifact": {k: v for k, v in artifact.items() if k != "file"},
+                }
+                artifact["object_name"] = upload_to_minio(artifact.pop("file"), database, database, context)
+                manifest["artifacts"].append(artifact)
+                backup_state[f"{database}_backups"] += 1
+        return run
+    
+    def sync_events():
+        from bucket_sync import run_sync
+        manifest["event_bucket_snapshot"] = run_sync()["snapshot"]
+    
+    def record_manifest():
+        # Record what was backed up so restores can find and verify it
+        if manifest["artifacts"] and MINIO_AVAILABLE:
+            manifest["errors"] = [f"{name}: {error}" for name, error in results.items() if error]
+            write_manifest(manifest)
+            backup_state["last_backup_id"] = manifest["backup_id"]
+    
+    upload_memory_mb = CONFIG["upload_parallelism"] * CONFIG["upload_part_size_mb"]
+    sync_enabled = CONFIG["bucket_sync_enabled"] and MINIO_AVAILABLE
+    # The manifest records the event bucket snapshot, so it waits for the sync
+    manifest_deps = ("postgres_upload", "clickhouse_upload", "redis_upload") + (("bucket_sync",) if sync_enabled else ())
+    stages = [
+        Stage("postgres_dump", "PostgreSQL", dump("postgres", backup_postgres), memory_mb=16),
+        Stage("clickhouse_dump", "ClickHouse", dump("clickhouse", backup_clickhouse), memory_mb=16),
+        Stage("redis_dump", "Redis", dump("redis", backup_redis), memory_mb=16),
+        Stage("postgres_upload", "PostgreSQL upload", upload("postgres"),
+              deps=("postgres_dump",), memory_mb=upload_memory_mb),
+        Stage("clickhouse_upload", "ClickHouse upload", upload("clickhouse"),
+              deps=("clickhouse_dump",), memory_mb=upload_memory_mb),
+        Stage("redis_upload", "Redis upload", upload("redis"),
+              deps=("redis_dump",), memory_mb=upload_memory_mb),
+        Stage("manifest", "Manifest", record_manifest, deps=manifest_deps, always_run=True),
+        Stage("cleanup", "Cleanup", cleanup_old_backups, deps=("manifest",), always_run=True),
+    ]
+    if sync_enabled:
+        # Runs alongside the dumps; the index is streamed, so memory stays flat
+        # regardless of bucket size (at most MAX_PENDING rows in flight)
+        stages.append(Stage("bucket_sync", "Langfuse event bucket", sync_events, memory_mb=128))
+    run_stages(stages, CONFIG["backup_max_concurrency"], CONFIG["backup_memory_budget_mb"], results)
+    
+    throttle_stop.set()
+    
+    labels = {stage.name: stage.label for stage in stages}
+    errors = [f"{labels[name]}: {error}" for name, error in results.items() if error]
     
     # Update state and send alerts
     if errors:
@@ -316,9 +1396,152 @@ def run_backup():
         if CONFIG["alert_on_success"]:
             send_alert("Backup completed successfully", "success")
     
+    metrics.finish_run(backup_state["last_status"])
     logger.info(f"Backup routine completed. Status: {backup_state['last_status']}")
 
 
+def _scratch_postgres_url() -> str:
+    """Connection string for the scratch database used by verification"""
+    if CONFIG["verify_database_url"]:
+        return CONFIG["verify_database_url"]
+    parsed = urlparse(CONFIG["postgres_url"])
+    return urlunparse(parsed._replace(path=f"/{CONFIG['verify_postgres_db']}"))
+
+
+def _reset_scratch_postgres(drop_only: bool = False):
+    """Drop and recreate the scratch Postgres database on the production server"""
+    if CONFIG["verify_database_url"]:
+        return  # Externally managed scratch database
+    
+    name = CONFIG["verify_postgres_db"]
+    if name == urlparse(CONFIG["postgres_url"]).path.lstrip("/"):
+        raise RuntimeError("VERIFY_POSTGRES_DB must differ from the production database")
+    
+    cmd = ["psql", CONFIG["postgres_url"], "-v", "ON_ERROR_STOP=1", "-q",
+           "-c", f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)']
+    if not drop_only:
+        cmd += ["-c", f'CREATE DATABASE "{name}"']
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to reset scratch database: {result.stderr.strip()}")
+
+
+def _reset_scratch_clickhouse():
+    """Drop the scratch ClickHouse database (the restore recreates it)"""
+    name = CONFIG["verify_clickhouse_db"]
+    if name == CONFIG["clickhouse_db"]:
+        raise RuntimeError("VERIFY_CLICKHOUSE_DB must differ from the production database")
+    get_clickhouse_client(database="default").command(f"DROP DATABASE IF EXISTS `{name}` SYNC")
+
+
+def _missing_key_tables(manifest: dict) -> list:
+    """Key tables that a backup is expected to contain but doesn't"""
+    present = set()
+    for artifact in manifest["artifacts"]:
+        for table in artifact["tables"]:
+            present.add(table.split(".")[-1].strip('"`'))
+    
+    databases = {artifact["database"] for artifact in manifest["artifacts"]}
+    expected = [
+        t for t in CONFIG["verify_key_tables"]
+        # LiteLLM tables live in Postgres, Langfuse analytics tables in ClickHouse
+        if ("postgres" in databases if t.startswith("LiteLLM_") else "clickhouse" in databases)
+    ]
+    return [t for t in expected if t not in present]
+
+
+def run_verification(backup_id: str = "latest", local: Optional[bool] = None) -> dict:
+    """
+    Prove the latest backup can be restored.
+    
+    Restores into scratch databases (or, in local mode, downloads and counts
+    rows without a database), compares checksums, row counts and key tables
+    with the manifest, and records the restore duration as the measured RTO.
+    """
+    from restore import load_manifest, restore_backup
+    
+    local = CONFIG["verify_mode"] == "local" if local is None else local
+    logger.info(f"Starting backup verification ({'local' if local else 'scratch'} mode)...")
+    started = time.time()
+    problems = []
+    results = []
+    manifest = None
+    
+    try:
+        manifest = load_manifest(get_minio_client(), backup_id)
+        
+        missing = _missing_key_tables(manifest)
+        if missing:
+            problems.append(f"key tables missing from backup: {', '.join(missing)}")
+        
+        databases = {artifact["database"] for artifact in manifest["artifacts"]}
+        if not local:
+            if "postgres" in databases:
+                _reset_scratch_postgres()
+            if "clickhouse" in databases:
+                _reset_scratch_clickhouse()
+        
+        try:
+            results = restore_backup(
+                manifest,
+                postgres_url=_scratch_postgres_url(),
+                clickhouse_database=CONFIG["verify_clickhouse_db"],
+                local=local,
+            )
+        finally:
+            if not local:
+                # Scratch copies are only needed for the duration of the check
+                if "postgres" in databases:
+                    _reset_scratch_postgres(drop_only=True)
+                if "clickhouse" in databases:
+                    _reset_scratch_clickhouse()
+        
+        for result in results:
+            if not result["checksum_ok"]:
+                problems.append(f"{result['database']} checksum mismatch")
+            for table, counts in result["row_mismatches"].items():
+                problems.append(
+                    f"{result['database']} {table} rows: "
+                    f"expected {counts['expected']}, got {counts['actual']}"
+                )
+    except Exception as e:
+        logger.error(f"Backup verification failed: {e}")
+        problems.append(str(e))
+    
+    rto_seconds = round(time.time() - started, 2)
+    if (CONFIG["verify_max_rto_seconds"] and not local
+            and rto_seconds > CONFIG["verify_max_rto_seconds"]):
+        problems.append(
+            f"restore took {rto_seconds}s, over the {CONFIG['verify_max_rto_seconds']}s RTO budget"
+        )
+    
+    verify_state.update({
+        "last_verified": datetime.utcnow().isoformat(),
+        "last_status": "error" if problems else "success",
+        "last_error": "; ".join(problems) or None,
+        "backup_id": manifest["backup_id"] if manifest else None,
+        "mode": "local" if local else "scratch",
+        "rto_seconds": rto_seconds,
+        "results": results,
+    })
+    verify_state["rto_history"] = (verify_state["rto_history"] + [rto_seconds])[-30:]
+    
+    if problems:
+        send_alert(
+            f"Backup verification failed for {verify_state['backup_id']}: {verify_state['last_error']}",
+            "error"
+        )
+    elif CONFIG["alert_on_success"]:
+        send_alert(
+            f"Backup {verify_state['backup_id']} verified: restored in {rto_seconds}s", "success"
+        )
+    
+    logger.info(
+        f"Backup verification completed. Status: {verify_state['last_status']}, RTO: {rto_seconds}s"
+    )
+    return dict(verify_state)
+
+
 class HealthHandler(BaseHTTPRequestHandler):
     """HTTP handler for health checks"""
     
@@ -331,18 +1554,62 @@ class HealthHandler(BaseHTTPRequestHandler):
             response = {
                 "status": "healthy",
                 "service": "backup-service",
-                "backup_state": backup_state
+                "backup_state": backup_state,
+                "verify_state": verify_state,
+                "wal_state": wal_state,
+                "archive_state": archive_state,
+                "bucket_sync_state": bucket_sync_state,
+                "clickhouse_state": clickhouse_state
             }
             self.wfile.write(json.dumps(response).encode())
             
+        elif self.path == "/ready":
+            # Deploy healthcheck: answers as soon as the server is listening
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "ready"}).encode())
+            
+        elif self.path == "/metrics":
+            # Prometheus-compatible metrics
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.end_headers()
+            self.wfile.write((metrics.render() + tracing.render_metrics("backup")).encode())
+            
+        elif self.path == "/runs":
+            # Per-stage breakdown of recent runs
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"runs": metrics.runs()}, indent=2).encode())
+            
         elif self.path == "/backup":
-            # Trigger manual backup
+            # Trigger manual backup, unless one is already running
+            if _backup_lock.locked():
+                self.send_response(409)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"status": "backup_in_progress"}).encode())
+                return
             Thread(target=run_backup).start()
             self.send_response(202)
             self.send_header("Content-Type", "application/json")
             self.end_headers()
             self.wfile.write(json.dumps({"status": "backup_started"}).encode())
             
+        elif self.path == "/verify":
+            # Trigger manual restore verification
+            Thread(target=run_verification).start()
+            self.send_response(202)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "verification_started"}).encode())
+            
+        elif self.path.startswith("/debug/"):
+            # Profiling endpoints; 404 unless DEBUG_TOKEN is set and supplied
+            profiling.handle(self)
+            
         else:
             self.send_response(404)
             self.end_headers()
@@ -355,11 +1622,20 @@ class HealthHandler(BaseHTTPRequestHandler):
 def run_health_server():
     """Run health check HTTP server"""
     port = int(os.getenv("PORT", "8080"))
-    server = HTTPServer(("0.0.0.0", port), HealthHandler)
+    # Threaded so a running /debug/profile doesn't hold up /health
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthHandler)
     logger.info(f"Health server running on port {port}")
     server.serve_forever()
 
 
+def _deferred(module: str, name: str) -> Callable:
+    """Scheduled job that imports its companion module (and its drivers) when it first runs"""
+    def run():
+        return getattr(importlib.import_module(module), name)()
+    run.__name__ = name
+    return run
+
+
 def setup_schedule():
     """Setup backup schedule based on configuration"""
     schedule_type = CONFIG["backup_schedule"]
@@ -373,16 +1649,69 @@ def setup_schedule():
     else:  # daily (default)
         schedule.every().day.at(f"{CONFIG['backup_hour']:02d}:00").do(run_backup)
         logger.info(f"Scheduled daily backups at {CONFIG['backup_hour']:02d}:00 UTC")
+    
+    verify_type = CONFIG["verify_schedule"]
+    verify_at = f"{CONFIG['verify_hour']:02d}:00"
+    if verify_type == "daily":
+        schedule.every().day.at(verify_at).do(run_verification)
+        logger.info(f"Scheduled daily restore verification at {verify_at} UTC")
+    elif verify_type == "weekly":
+        schedule.every().sunday.at(verify_at).do(run_verification)
+        logger.info(f"Scheduled weekly restore verification on Sunday at {verify_at} UTC")
+    
+    if CONFIG["wal_archive_enabled"]:
+        run_base_backup = _deferred("wal_archive", "run_base_backup")
+        
+        base_at = f"{CONFIG['backup_hour']:02d}:00"
+        if CONFIG["basebackup_schedule"] == "weekly":
+            schedule.every().sunday.at(base_at).do(run_base_backup)
+            logger.info(f"Scheduled weekly base backups on Sunday at {base_at} UTC")
+        else:
+            schedule.every().day.at(base_at).do(run_base_backup)
+            logger.info(f"Scheduled daily base backups at {base_at} UTC")
+    
+    if CONFIG["clickhouse_maintenance_enabled"]:
+        check_parts = _deferred("clickhouse_maintenance", "check_parts")
+        run_maintenance = _deferred("clickhouse_maintenance", "run_maintenance")
+        
+        quiet_at = f"{CONFIG['clickhouse_quiet_hours'][0]:02d}:00"
+        schedule.every().hour.do(check_parts)
+        schedule.every().day.at(quiet_at).do(run_maintenance)
+        logger.info(f"Scheduled ClickHouse maintenance at {quiet_at} UTC and hourly part checks")
+    
+    if CONFIG["spend_archive_enabled"]:
+        run_archive = _deferred("spend_archive", "run_archive")
+        
+        archive_at = f"{CONFIG['spend_archive_hour']:02d}:00"
+        schedule.every().day.at(archive_at).do(run_archive)
+        logger.info(
+            f"Scheduled daily spend-log archival at {archive_at} UTC "
+            f"(keeping {CONFIG['spend_archive_days']} days in Postgres)"
+        )
 
 
 def main():
     """Main entry point"""
     logger.info("Backup service starting...")
     logger.info(f"Configuration: schedule={CONFIG['backup_schedule']}, retention={CONFIG['retention_days']} days")
+    logger.info(
+        f"I/O mode: {CONFIG['io_mode']} (read {CONFIG['read_rate_mb'] or 'unlimited'} MB/s, "
+        f"upload {CONFIG['upload_rate_mb'] or 'unlimited'} MB/s)"
+    )
     
     # Start health server in background
     Thread(target=run_health_server, daemon=True).start()
     
+    tracing.setup("backup-service")
+    
+    # Finish any uploads interrupted by a restart
+    resume_pending_uploads()
+    
+    # Continuous WAL streaming for point-in-time recovery
+    if CONFIG["wal_archive_enabled"]:
+        from wal_archive import start_wal_archiver
+        start_wal_archiver()
+    
     # Setup schedule
     setup_schedule()
     
@@ -398,4 +1727,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # The companion scripts (restore.py, wal_archive.py, ...) import this module by name; share one copy of its state
+    sys.modules.setdefault("backup", sys.modules[__name__])
     main()
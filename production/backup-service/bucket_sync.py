@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+"""
+Langfuse Event Bucket Sync for LiteLLM + Langfuse Stack
+Incrementally mirrors the bucket where Langfuse stores raw ingestion events
+(LANGFUSE_S3_EVENT_UPLOAD_BUCKET) into a backup bucket, with snapshot
+manifests for listing the bucket as it was at any past run
+
+Each run lists the source bucket and compares it with a persisted index of
+key, ETag and size, so only new or changed objects are copied. S3 has no
+"changed since" listing, but listing is metadata only (1000 keys per
+request), while the copies are the expensive part. Copies run in parallel and
+server-side when source and backup share the MinIO server; objects are
+streamed through the service only when the source is elsewhere.
+
+The listing comes back in key order and the index is stored in key order, so
+a run walks both side by side and writes the new index as it goes (spooled
+under BACKUP_WORK_DIR): memory stays flat however many million events the
+bucket holds.
+
+Layout of the backup bucket:
+    objects/<key>                     latest copy of every key ever seen
+    _sync/index.jsonl.gz              the index as of the newest snapshot
+    _sync/snapshots/<id>.jsonl.gz     what changed (or, every Nth, everything)
+
+Objects deleted at the source are kept in the mirror and recorded as removed
+in the snapshot, so a point-in-time listing doesn't show them afterwards.
+
+Usage:
+    python3 bucket_sync.py run
+    python3 bucket_sync.py snapshots
+    python3 bucket_sync.py list [--at 2026-01-31T12:00] [--prefix PROJECT_ID/]
+    python3 bucket_sync.py restore --at 2026-01-31T12:00 [--prefix P] [--to-bucket B]
+"""
+
+import io
+import os
+import sys
+import json
+import gzip
+import time
+import heapq
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from backup import (
+    CONFIG,
+    MINIO_AVAILABLE,
+    ThrottledReader,
+    bucket_sync_state,
+    ensure_bucket_exists,
+    get_minio_client,
+    logger,
+    metrics,
+    upload_limiter,
+)
+
+OBJECTS_PREFIX = "objects/"
+INDEX_OBJECT = "_sync/index.jsonl.gz"
+SNAPSHOTS_PREFIX = "_sync/snapshots/"
+
+# Listed objects held between the listing and the index writer while copies
+# ahead of them finish; bounds memory when one copy is slow
+MAX_PENDING = 10_000
+
+# Index rows: [key, etag, size], in key order
+Row = list
+
+
+class SyncError(Exception):
+    """A sync run finished with objects it could not copy"""
+
+
+_source_client = None
+
+
+def source_client():
+    """Client for the event bucket: the backup MinIO unless BUCKET_SYNC_SOURCE_ENDPOINT is set"""
+    global _source_client
+    if not CONFIG["bucket_sync_source_endpoint"]:
+        return get_minio_client()
+    if _source_client is None:
+        import urllib3
+        from minio import Minio
+        _source_client = Minio(
+            CONFIG["bucket_sync_source_endpoint"],
+            access_key=CONFIG["bucket_sync_source_access_key"],
+            secret_key=CONFIG["bucket_sync_source_secret_key"],
+            secure=CONFIG["bucket_sync_source_secure"],
+            # A connection per copy worker
+            http_client=urllib3.PoolManager(
+                maxsize=CONFIG["bucket_sync_workers"],
+                timeout=urllib3.Timeout(connect=10, read=300),
+                retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+            ),
+        )
+    return _source_client
+
+
+def _snapshot_id(moment: datetime) -> str:
+    return moment.strftime("%Y%m%d_%H%M%S")
+
+
+def _json_line(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode() + b"\n"
+
+
+class _Chain(io.RawIOBase):
+    """Read several file objects one after the other"""
+
+    def __init__(self, *parts):
+        self._parts = list(parts)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while self._parts:
+            data = self._parts[0].read(size)
+            if data:
+                return data
+            self._parts.pop(0)
+        return b""
+
+
+class Spool:
+    """
+    Gzipped JSON-lines rows written to a temp file under BACKUP_WORK_DIR and
+    uploaded with a header line in front.
+
+    The header (totals, counts) is only known once every row is written, so
+    it goes in its own gzip member ahead of the rows; gzip readers treat
+    concatenated members as one stream.
+    """
+
+    def __init__(self):
+        os.makedirs(CONFIG["work_dir"], exist_ok=True)
+        handle, self.path = tempfile.mkstemp(prefix="bucket-sync-", suffix=".jsonl.gz", dir=CONFIG["work_dir"])
+        self._file = os.fdopen(handle, "wb")
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=6, mtime=0)
+        self.rows = 0
+
+    def write(self, row: list):
+        self._gzip.write(_json_line(row))
+        self.rows += 1
+
+    def upload(self, client, object_name: str, header: dict):
+        self._gzip.close()
+        self._file.close()
+        head = gzip.compress(_json_line(header), compresslevel=6, mtime=0)
+        try:
+            with open(self.path, "rb") as rows:
+                client.put_object(
+                    CONFIG["bucket_sync_bucket"], object_name, _Chain(io.BytesIO(head), rows),
+                    len(head) + os.path.getsize(self.path), content_type="application/gzip",
+                    part_size=CONFIG["upload_part_size_mb"] * 1024 * 1024,
+                )
+        finally:
+            os.remove(self.path)
+
+    def discard(self):
+        if not self._file.closed:
+            self._gzip.close()
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _read_header(client, object_name: str) -> dict:
+    response = client.get_object(CONFIG["bucket_sync_bucket"], object_name)
+    try:
+        return json.loads(gzip.GzipFile(fileobj=response).readline())
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _read_rows(client, object_name: str) -> Iterator[list]:
+    """Stream the rows after the header line; the connection is held until exhausted"""
+    response = client.get_object(CONFIG["bucket_sync_bucket"], object_name)
+    try:
+        lines = gzip.GzipFile(fileobj=response)
+        lines.readline()
+        for line in lines:
+            yield json.loads(line)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _ordered(rows: Iterator[Row], what: str) -> Iterator[Row]:
+    """Pass rows through, failing if they aren't in strictly increasing key order"""
+    previous = None
+    for row in rows:
+        key = row[0]
+        if previous is not None and key <= previous:
+            raise RuntimeError(f"{what} is not in key order at {key!r}")
+        previous = key
+        yield row
+
+
+def _tagged(delta: Iterator[list], age: int) -> Iterator[tuple]:
+    # (key, age, row after the change or None if removed)
+    for row in delta:
+        yield row[1], age, row[1:] if row[0] == "+" else None
+
+
+def replay(base: Iterator[Row], deltas: List[Iterator[list]]) -> Iterator[Row]:
+    """
+    Index rows of base with delta snapshots (["+", key, etag, size] /
+    ["-", key]) applied in order, as one key-ordered stream.
+    """
+    streams = [((row[0], 0, row) for row in base)]
+    streams += [_tagged(delta, age) for age, delta in enumerate(deltas, 1)]
+    last_key = latest = None
+    # Ordered by key, then by age: the last row seen for a key wins
+    for key, _, row in heapq.merge(*streams):
+        if key != last_key and latest is not None:
+            yield latest
+        last_key, latest = key, row
+    if latest is not None:
+        yield latest
+
+
+def _chain_rows(client, snapshots: List[str], base: Optional[Tuple[dict, Iterator[Row]]] = None
+                ) -> Tuple[Optional[dict], Iterator[Row]]:
+    """
+    Rows as of the last of `snapshots`: the newest full snapshot among them
+    (or else `base`, the index) with the deltas after it replayed. Returns
+    the header of the last snapshot (or base) for its totals.
+    """
+    chain = []
+    headers = []
+    start = None
+    for snapshot in reversed(snapshots):
+        header = _read_header(client, f"{SNAPSHOTS_PREFIX}{snapshot}.jsonl.gz")
+        headers.append(header)
+        if header["full"]:
+            start = snapshot
+            break
+        chain.append(snapshot)
+    chain.reverse()
+
+    if start is not None:
+        rows = (row[1:] for row in _read_rows(client, f"{SNAPSHOTS_PREFIX}{start}.jsonl.gz"))
+    elif base is not None:
+        rows = base[1]
+    else:
+        rows = iter(())
+    deltas = [_read_rows(client, f"{SNAPSHOTS_PREFIX}{snapshot}.jsonl.gz") for snapshot in chain]
+    last_header = headers[0] if headers else (base[0] if base else None)
+    return last_header, replay(rows, deltas)
+
+
+def load_index(client) -> Tuple[dict, Iterator[Row], List[str]]:
+    """
+    The persisted index header and its rows in key order (empty on the first
+    run), with the snapshots written after it applied: those are checkpoints
+    of a run that died before writing the index. Also returns their ids.
+    """
+    from minio.error import S3Error
+
+    try:
+        header = _read_header(client, INDEX_OBJECT)
+        rows = _read_rows(client, INDEX_OBJECT)
+    except S3Error as e:
+        if e.code != "NoSuchKey":
+            raise
+        header, rows = {"snapshot": None, "since_full": None, "objects": 0, "bytes": 0}, iter(())
+    newer = [s for s in list_snapshots(client) if header["snapshot"] is None or s > header["snapshot"]]
+    if not newer:
+        return header, rows, []
+    last, rows = _chain_rows(client, newer, (header, rows))
+    return dict(header, objects=last["objects"], bytes=last["bytes"]), rows, newer
+
+
+def _next_snapshot(previous: Optional[str]) -> str:
+    snapshot = _snapshot_id(datetime.utcnow())
+    if previous and snapshot <= previous:
+        # Several in one second (checkpoints of a fast run): number them, keeping the order
+        second, _, sequence = previous.partition(".")
+        snapshot = f"{second}.{int(sequence or 0) + 1:06d}"
+    return snapshot
+
+
+def copy_object(client, source, key: str, etag: str, size: int) -> None:
+    """
+    Copy one object into the mirror, pinned to the listed ETag.
+
+    Same server: a server-side copy (copy_object() stats the source first,
+    and switches to a multipart copy above 5 GiB). Elsewhere: streamed
+    through this service, paced by the upload rate limit.
+    """
+    from minio.commonconfig import CopySource
+
+    bucket, target = CONFIG["bucket_sync_bucket"], OBJECTS_PREFIX + key
+    if source is client:
+        client.copy_object(
+            bucket, target, CopySource(CONFIG["bucket_sync_source_bucket"], key, match_etag=f'"{etag}"')
+        )
+        return
+
+    response = source.get_object(CONFIG["bucket_sync_source_bucket"], key, request_headers={"If-Match": f'"{etag}"'})
+    try:
+        stream = ThrottledReader(response, upload_limiter) if upload_limiter.active else response
+        client.put_object(
+            bucket, target, stream, size,
+            content_type=response.headers.get("Content-Type", "application/octet-stream"),
+            part_size=CONFIG["upload_part_size_mb"] * 1024 * 1024,
+        )
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _changed(code: str) -> bool:
+    # The object changed or vanished between listing and copy; the next run sees the new state
+    return code in ("PreconditionFailed", "NoSuchKey")
+
+
+def _side_by_side(listed: Iterator[Row], indexed: Iterator[Row]
+                  ) -> Iterator[Tuple[str, Optional[Row], Optional[Row]]]:
+    """(key, listed row or None, indexed row or None) for every key in either, in key order"""
+    listed_row, indexed_row = next(listed, None), next(indexed, None)
+    while listed_row is not None or indexed_row is not None:
+        if indexed_row is None or (listed_row is not None and listed_row[0] < indexed_row[0]):
+            yield listed_row[0], listed_row, None
+            listed_row = next(listed, None)
+        elif listed_row is None or indexed_row[0] < listed_row[0]:
+            yield indexed_row[0], None, indexed_row
+            indexed_row = next(indexed, None)
+        else:
+            yield listed_row[0], listed_row, indexed_row
+            listed_row, indexed_row = next(listed, None), next(indexed, None)
+
+
+def sync_bucket() -> dict:
+    """List the event bucket, copy new and changed objects, and record a snapshot"""
+    from minio.error import S3Error
+
+    client = get_minio_client()
+    source = source_client()
+    ensure_bucket_exists(client, CONFIG["bucket_sync_bucket"])
+    header, indexed, recovered = load_index(client)
+    report = {
+        "source": f"{CONFIG['bucket_sync_source_bucket']}/{CONFIG['bucket_sync_source_prefix']}",
+        "server_side": source is client,
+        "listed": 0, "new": 0, "changed": 0, "removed": 0,
+        "copied": 0, "bytes": 0, "skipped": 0, "failed": 0, "snapshots": [],
+    }
+    if recovered:
+        logger.info(f"Applying {len(recovered)} checkpoint(s) of an interrupted sync to the index")
+    started = time.perf_counter()
+    last_commit = time.monotonic()
+    latest = recovered[-1] if recovered else header["snapshot"]
+    since_full = header.get("since_full")
+    full = since_full is None or since_full + 1 >= CONFIG["bucket_sync_full_every"]
+    # Objects and bytes in the mirror's current state (the index plus what this run changed so far)
+    totals = {"objects": header.get("objects", 0), "bytes": header.get("bytes", 0)}
+    counts = {"added": 0, "removed": 0}
+    kept = {"objects": 0, "bytes": 0}
+    checkpoints = 0
+    failures = []
+    pending = deque()  # [key, indexed row, listed row, copy future] in key order
+    copying = 0
+    workers = CONFIG["bucket_sync_workers"]
+
+    index_out, changes = Spool(), Spool()
+    full_out = Spool() if full else None
+
+    def keep(row: Row):
+        index_out.write(row)
+        kept["objects"] += 1
+        kept["bytes"] += row[2]
+        if full_out:
+            full_out.write(["+", *row])
+
+    def record(change: list, objects: int, size: int):
+        changes.write(change)
+        counts["added" if change[0] == "+" else "removed"] += 1
+        totals["objects"] += objects
+        totals["bytes"] += size
+
+    def drain(limit: int):
+        """Resolve finished entries at the head, waiting for copies once too many are queued"""
+        nonlocal copying
+        while pending:
+            key, old, new, future = pending[0]
+            if future is not None and not future.done():
+                if len(pending) <= limit and copying < workers * 4:
+                    return
+                wait([future])
+            pending.popleft()
+            if future is None:
+                if new is None:
+                    record(["-", key], -1, -old[2])
+                else:
+                    keep(new)
+                continue
+
+            copying -= 1
+            try:
+                future.result()
+            except Exception as e:
+                if isinstance(e, S3Error) and _changed(e.code):
+                    report["skipped"] += 1
+                else:
+                    report["failed"] += 1
+                    failures.append(f"{key}: {e.code if isinstance(e, S3Error) else e}")
+                if old is not None:
+                    keep(old)  # Still what the mirror holds
+                continue
+            keep(new)
+            record(["+", *new], 0 if old else 1, new[2] - (old[2] if old else 0))
+            report["copied"] += 1
+            report["bytes"] += new[2]
+
+    def commit_snapshot(spool: Spool, is_full: bool) -> str:
+        nonlocal latest
+        snapshot = _next_snapshot(latest)
+        spool.upload(client, f"{SNAPSHOTS_PREFIX}{snapshot}.jsonl.gz", dict(
+            totals, snapshot=snapshot, created_at=datetime.utcnow().isoformat(), full=is_full,
+            source_bucket=CONFIG["bucket_sync_source_bucket"], previous=latest, **counts,
+        ))
+        report["snapshots"].append(snapshot)
+        latest = snapshot
+        return snapshot
+
+    logger.info(f"Syncing {report['source']} to {CONFIG['bucket_sync_bucket']} "
+                f"({header.get('objects', 0)} objects indexed)...")
+    try:
+        with metrics.stage("langfuse_events", "sync") as stage:
+            listed = (
+                [obj.object_name, obj.etag, obj.size or 0]
+                for obj in source.list_objects(CONFIG["bucket_sync_source_bucket"],
+                                               prefix=CONFIG["bucket_sync_source_prefix"] or None, recursive=True)
+            )
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for key, new, old in _side_by_side(_ordered(listed, "The source listing"),
+                                                   _ordered(indexed, "The index")):
+                    future = None
+                    if new is not None:
+                        report["listed"] += 1
+                        if old is None or old[1:] != new[1:]:
+                            report["new" if old is None else "changed"] += 1
+                            future = pool.submit(copy_object, client, source, key, new[1], new[2])
+                            copying += 1
+                    else:
+                        # Only a complete listing can tell what was deleted; it's walked in full
+                        report["removed"] += 1
+                    pending.append([key, old, new, future])
+                    drain(MAX_PENDING)
+                    if changes.rows and time.monotonic() - last_commit >= CONFIG["bucket_sync_checkpoint_seconds"]:
+                        # Long first syncs keep their progress if interrupted: the next run
+                        # applies snapshots newer than the index
+                        commit_snapshot(changes, False)
+                        changes = Spool()
+                        counts.update(added=0, removed=0)
+                        checkpoints += 1
+                        last_commit = time.monotonic()
+                drain(0)
+            totals.update(kept)
+
+            if changes.rows or latest is None:
+                # The snapshot first, then the index it produces; if the run dies in between,
+                # the next run applies the snapshot to the old index
+                commit_snapshot(full_out if full else changes, full)
+                since_full = 0 if full else since_full + 1 + checkpoints
+            elif checkpoints:
+                since_full = (since_full or 0) + checkpoints
+            if latest != header["snapshot"]:
+                header.update(totals, snapshot=latest, since_full=since_full, updated_at=datetime.utcnow().isoformat())
+                index_out.upload(client, INDEX_OBJECT, header)
+            stage["bytes_in"] = stage["bytes_out"] = report["bytes"]
+    finally:
+        for spool in (index_out, changes, full_out):
+            if spool:
+                spool.discard()
+
+    seconds = max(time.perf_counter() - started, 0.001)
+    report.update(
+        snapshot=latest,
+        objects=totals["objects"],
+        seconds=round(seconds, 1),
+        objects_per_second=round(report["copied"] / seconds, 1),
+        listed_per_second=round(report["listed"] / seconds, 1),
+        mib_per_second=round(report["bytes"] / seconds / 1024 / 1024, 2),
+    )
+    if failures:
+        report["failures"] = failures[:20]
+    return report
+
+
+def run_sync() -> dict:
+    """Run a sync and record it in bucket_sync_state; raises if it failed"""
+    if not MINIO_AVAILABLE:
+        raise RuntimeError("minio package not installed")
+    try:
+        report = sync_bucket()
+    except Exception as e:
+        bucket_sync_state.update(last_run=datetime.utcnow().isoformat(), last_status="failed", last_error=str(e))
+        logger.error(f"Event bucket sync failed: {e}")
+        raise
+
+    bucket_sync_state.update(
+        last_run=datetime.utcnow().isoformat(),
+        last_status="error" if report["failed"] else "success",
+        last_error=f"{report['failed']} objects failed to copy" if report["failed"] else None,
+        last_snapshot=report["snapshot"],
+        objects=report["objects"],
+        last_copied=report["copied"],
+        last_bytes=report["bytes"],
+        last_objects_per_second=report["objects_per_second"],
+        last_mib_per_second=report["mib_per_second"],
+    )
+    logger.info(
+        f"Event bucket sync completed: {report['listed']} listed, {report['copied']} copied "
+        f"({report['new']} new, {report['changed']} changed, {report['removed']} removed), "
+        f"{report['bytes'] / 1024 / 1024:.1f} MiB in {report['seconds']}s "
+        f"({report['objects_per_second']} objects/s, {report['mib_per_second']} MiB/s)"
+    )
+    if report["failed"]:
+        raise SyncError(f"{report['failed']} of {report['new'] + report['changed']} objects failed to copy "
+                        f"(first: {report['failures'][0]}); they are retried on the next run")
+    return report
+
+
+def list_snapshots(client) -> List[str]:
+    names = (obj.object_name for obj in client.list_objects(CONFIG["bucket_sync_bucket"], prefix=SNAPSHOTS_PREFIX))
+    return sorted(name[len(SNAPSHOTS_PREFIX):-len(".jsonl.gz")] for name in names)
+
+
+def listing_at(client, at: Optional[datetime] = None) -> Tuple[Optional[str], Iterator[Row]]:
+    """
+    The source bucket's objects, in key order, as of the last snapshot at or
+    before `at` (naive UTC; None for the newest): the newest full snapshot up
+    to then, with the deltas after it replayed.
+    """
+    snapshots = list_snapshots(client)
+    if at is not None:
+        cutoff = _snapshot_id(at)
+        snapshots = [s for s in snapshots if s[:len(cutoff)] <= cutoff]
+    if not snapshots:
+        return None, iter(())
+    return snapshots[-1], _chain_rows(client, snapshots)[1]
+
+
+def restore(client, rows: Iterator[Row], prefix: str, to_bucket: str) -> dict:
+    """
+    Copy mirrored objects back (server-side) into to_bucket.
+
+    The mirror only holds the latest copy of each key. Where it no longer has
+    the ETag the listing recorded (the key was rewritten since, or the copy
+    was made in parts), that latest copy is restored and reported.
+    """
+    from minio.commonconfig import CopySource
+    from minio.error import S3Error
+
+    ensure_bucket_exists(client, to_bucket)
+    report = {"restored": 0, "bytes": 0, "bucket": to_bucket, "etag_mismatch": 0}
+    mismatched = []
+    started = time.perf_counter()
+
+    def copy(key: str, etag: str):
+        try:
+            client.copy_object(to_bucket, key, CopySource(CONFIG["bucket_sync_bucket"], OBJECTS_PREFIX + key,
+                                                          match_etag=f'"{etag}"'))
+            return True
+        except S3Error as e:
+            if e.code != "PreconditionFailed":
+                raise
+        client.copy_object(to_bucket, key, CopySource(CONFIG["bucket_sync_bucket"], OBJECTS_PREFIX + key))
+        return False
+
+    inflight = {}
+    workers = CONFIG["bucket_sync_workers"]
+
+    def finish(done):
+        for future in done:
+            key, size = inflight.pop(future)
+            if not future.result():
+                report["etag_mismatch"] += 1
+                mismatched.append(key)
+            report["restored"] += 1
+            report["bytes"] += size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, etag, size in rows:
+            if not key.startswith(prefix):
+                continue
+            inflight[pool.submit(copy, key, etag)] = (key, size)
+            if len(inflight) >= workers * 4:
+                finish(wait(inflight, return_when=FIRST_COMPLETED)[0])
+        finish(wait(inflight)[0])
+
+    if mismatched:
+        logger.warning(f"{len(mismatched)} objects restored from a newer copy than the snapshot listed "
+                       f"(first: {', '.join(mismatched[:5])})")
+        report["etag_mismatch_keys"] = mismatched[:20]
+    seconds = max(time.perf_counter() - started, 0.001)
+    report.update(seconds=round(seconds, 1), objects_per_second=round(report["restored"] / seconds, 1))
+    return report
+
+
+def _utc(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Incremental backup of the Langfuse event bucket")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("run", help="Copy new and changed objects and record a snapshot")
+    commands.add_parser("snapshots", help="List snapshots")
+
+    listing = commands.add_parser("list", help="List the source bucket as of a snapshot")
+    listing.add_argument("--at", help="Point in time, ISO 8601 (UTC if no offset given; default: newest)")
+    listing.add_argument("--prefix", default="", help="Only keys starting with this")
+
+    restore_cmd = commands.add_parser(
+        "restore", help="Copy the keys listed at a snapshot back from the mirror",
+        description="Restores the keys that existed at the snapshot. The mirror keeps only the latest copy of "
+                    "each key, so a key rewritten since then comes back in its newer version; those are counted "
+                    "in etag_mismatch and logged.",
+    )
+    restore_cmd.add_argument("--at", help="Point in time, ISO 8601 (default: newest)")
+    restore_cmd.add_argument("--prefix", default="", help="Only keys starting with this, e.g. a project id")
+    restore_cmd.add_argument("--to-bucket", default=CONFIG["bucket_sync_source_bucket"],
+                             help=f"Target bucket (default {CONFIG['bucket_sync_source_bucket']})")
+
+    args = parser.parse_args()
+
+    if not MINIO_AVAILABLE:
+        logger.error("minio package not installed")
+        sys.exit(1)
+
+    if args.command == "run":
+        try:
+            report = run_sync()
+        except Exception as e:
+            print(json.dumps({"error": str(e)}, indent=2))
+            sys.exit(1)
+        print(json.dumps(report, indent=2))
+        return
+
+    client = get_minio_client()
+    if args.command == "snapshots":
+        for snapshot in list_snapshots(client):
+            header = _read_header(client, f"{SNAPSHOTS_PREFIX}{snapshot}.jsonl.gz")
+            kind = "full " if header["full"] else "delta"
+            print(f"{snapshot}  {kind}  +{header['added']} -{header['removed']}  "
+                  f"{header['objects']} objects  {header['bytes'] / 1024 / 1024:.1f} MiB")
+        return
+
+    snapshot, rows = listing_at(client, _utc(args.at))
+    if snapshot is None:
+        logger.error("No snapshot at or before that time")
+        sys.exit(1)
+
+    if args.command == "list":
+        for key, etag, size in rows:
+            if key.startswith(args.prefix):
+                print(f"{key}  {size}  {etag}")
+        print(f"Snapshot {snapshot}", file=sys.stderr)
+        return
+
+    report = restore(client, rows, args.prefix, args.to_bucket)
+    report["snapshot"] = snapshot
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+ClickHouse Storage Maintenance for LiteLLM + Langfuse Stack
+Applies retention to the Langfuse tables by dropping whole expired
+partitions, merges partitions with too many parts during quiet hours, and
+reports compression and the before/after effect of each run
+
+Usage:
+    python3 clickhouse_maintenance.py report
+    python3 clickhouse_maintenance.py run [--dry-run] [--ignore-quiet-hours]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from backup import (
+    CLICKHOUSE_AVAILABLE,
+    CONFIG,
+    clickhouse_state,
+    get_clickhouse_client,
+    logger,
+    metrics,
+    send_alert,
+)
+
+# Partition keys we can turn into a date range, e.g. toYYYYMM(timestamp)
+PARTITION_KEY = re.compile(r"^(toYYYYMM|toYYYYMMDD|toDate|toStartOfMonth)\((\w+)\)$")
+
+# Before/after measurements must not be answered from the query cache
+SETTINGS = {"use_query_cache": 0}
+
+
+def _retention_days(table: str) -> int:
+    return CONFIG["clickhouse_retention"].get(table, CONFIG["clickhouse_retention_days"])
+
+
+def in_quiet_hours(now: Optional[datetime] = None) -> bool:
+    """Whether the current UTC hour falls in CLICKHOUSE_QUIET_HOURS (e.g. 1-5, may wrap midnight)"""
+    start, end = CONFIG["clickhouse_quiet_hours"]
+    hour = (now or datetime.utcnow()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def partition_end(function: str, partition: str) -> Optional[date]:
+    """First day after a partition's range, or None when it can't be parsed"""
+    value = partition.strip("'")
+    try:
+        if function in ("toYYYYMM", "toStartOfMonth"):
+            if function == "toYYYYMM":
+                year, month = int(value[:4]), int(value[4:6])
+            else:
+                year, month = int(value[:4]), int(value[5:7])
+            return date(year + month // 12, month % 12 + 1, 1)
+        if function == "toYYYYMMDD":
+            return date(int(value[:4]), int(value[4:6]), int(value[6:8])) + timedelta(days=1)
+        return date.fromisoformat(value) + timedelta(days=1)
+    except ValueError:
+        return None
+
+
+def table_info(client) -> Dict[str, dict]:
+    """Partition function and time column of each maintained table"""
+    rows = client.query(
+        "SELECT name, partition_key FROM system.tables "
+        "WHERE database = currentDatabase() AND name IN {tables:Array(String)}",
+        parameters={"tables": CONFIG["clickhouse_tables"]}, settings=SETTINGS
+    ).result_rows
+    info = {}
+    for name, partition_key in rows:
+        match = PARTITION_KEY.match(partition_key.replace(" ", ""))
+        info[name] = {
+            "partition_function": match.group(1) if match else None,
+            "time_column": match.group(2) if match else None,
+            "partition_key": partition_key,
+        }
+    return info
+
+
+def storage_snapshot(client) -> Dict[str, dict]:
+    """Active parts, rows and on-disk/compressed/uncompressed bytes per table"""
+    rows = client.query(
+        "SELECT table, sum(parts), count(), sum(part_rows), sum(on_disk), sum(compressed), "
+        "sum(uncompressed), max(parts) "
+        "FROM (SELECT table, partition_id, count() AS parts, sum(rows) AS part_rows, "
+        "      sum(bytes_on_disk) AS on_disk, sum(data_compressed_bytes) AS compressed, "
+        "      sum(data_uncompressed_bytes) AS uncompressed "
+        "      FROM system.parts WHERE database = currentDatabase() AND active "
+        "      AND table IN {tables:Array(String)} GROUP BY table, partition_id) "
+        "GROUP BY table ORDER BY table",
+        parameters={"tables": CONFIG["clickhouse_tables"]}, settings=SETTINGS
+    ).result_rows
+    snapshot = {}
+    for table, parts, partitions, total_rows, on_disk, compressed, uncompressed, max_parts in rows:
+        snapshot[table] = {
+            "parts": parts,
+            "partitions": partitions,
+            "max_parts_per_partition": max_parts,
+            "rows": total_rows,
+            "bytes_on_disk": on_disk,
+            "compression_ratio": round(uncompressed / compressed, 2) if compressed else None,
+        }
+    return snapshot
+
+
+def column_compression(client, limit: int = 10) -> Dict[str, List[dict]]:
+    """Largest columns per table with their compression ratios"""
+    rows = client.query(
+        "SELECT table, name, type, compression_codec, data_compressed_bytes, data_uncompressed_bytes "
+        "FROM system.columns WHERE database = currentDatabase() AND table IN {tables:Array(String)} "
+        "ORDER BY table, data_compressed_bytes DESC",
+        parameters={"tables": CONFIG["clickhouse_tables"]}, settings=SETTINGS
+    ).result_rows
+    columns = {}
+    for table, name, column_type, codec, compressed, uncompressed in rows:
+        entries = columns.setdefault(table, [])
+        if len(entries) < limit:
+            entries.append({
+                "column": name,
+                "type": column_type,
+                "codec": codec or "default",
+                "compressed_bytes": compressed,
+                "compression_ratio": round(uncompressed / compressed, 2) if compressed else None,
+            })
+    return columns
+
+
+def probe_latency(client, info: Dict[str, dict], runs: int = 3) -> Dict[str, float]:
+    """
+    Median latency (ms) of a recent-window count per table.
+
+    Uses FINAL like Langfuse's own reads of its ReplacingMergeTree tables, so
+    the number moves when merges reduce the parts a query has to combine.
+    """
+    latencies = {}
+    for table, details in info.items():
+        if not details["time_column"]:
+            continue
+        query = (
+            f"SELECT count() FROM `{table}` FINAL "
+            f"WHERE `{details['time_column']}` >= now() - INTERVAL {CONFIG['clickhouse_probe_days']} DAY"
+        )
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            client.query(query, settings=SETTINGS)
+            samples.append((time.perf_counter() - started) * 1000)
+        latencies[table] = round(statistics.median(samples), 1)
+    return latencies
+
+
+def expired_partitions(client, info: Dict[str, dict], today: Optional[date] = None) -> List[dict]:
+    """Partitions whose whole range is older than the table's retention"""
+    today = today or datetime.utcnow().date()
+    rows = client.query(
+        "SELECT table, partition, partition_id, sum(rows), sum(bytes_on_disk) FROM system.parts "
+        "WHERE database = currentDatabase() AND active AND table IN {tables:Array(String)} "
+        "GROUP BY table, partition, partition_id ORDER BY table, partition_id",
+        parameters={"tables": CONFIG["clickhouse_tables"]}, settings=SETTINGS
+    ).result_rows
+    expired = []
+    for table, partition, partition_id, total_rows, on_disk in rows:
+        days = _retention_days(table)
+        function = info.get(table, {}).get("partition_function")
+        if days <= 0 or not function:
+            continue
+        end = partition_end(function, partition)
+        if end is not None and end <= today - timedelta(days=days):
+            expired.append({"table": table, "partition": partition, "partition_id": partition_id,
+                            "rows": total_rows, "bytes_on_disk": on_disk})
+    return expired
+
+
+def partitions_to_merge(client) -> List[dict]:
+    """Partitions with at least clickhouse_optimize_min_parts active parts, most fragmented first"""
+    rows = client.query(
+        "SELECT table, partition_id, count() AS parts FROM system.parts "
+        "WHERE database = currentDatabase() AND active AND table IN {tables:Array(String)} "
+        "GROUP BY table, partition_id HAVING parts >= {min_parts:UInt32} ORDER BY parts DESC",
+        parameters={"tables": CONFIG["clickhouse_tables"], "min_parts": CONFIG["clickhouse_optimize_min_parts"]},
+        settings=SETTINGS
+    ).result_rows
+    return [{"table": t, "partition_id": p, "parts": n} for t, p, n in rows]
+
+
+def check_parts() -> Optional[dict]:
+    """Hourly part-count watch; alerts before ClickHouse starts delaying inserts"""
+    if not CLICKHOUSE_AVAILABLE or not CONFIG["clickhouse_password"]:
+        return None
+    try:
+        snapshot = storage_snapshot(get_clickhouse_client())
+    except Exception as e:
+        logger.error(f"ClickHouse part check failed: {e}")
+        return None
+    clickhouse_state["tables"] = snapshot
+    clickhouse_state["last_part_check"] = datetime.utcnow().isoformat()
+    crowded = {t: s["max_parts_per_partition"] for t, s in snapshot.items()
+               if s["max_parts_per_partition"] >= CONFIG["clickhouse_parts_alert"]}
+    if crowded:
+        message = f"ClickHouse partitions with many active parts (inserts slow down at 150): {crowded}"
+        logger.warning(message)
+        send_alert(message, "error")
+    return snapshot
+
+
+def run_maintenance(dry_run: bool = False, ignore_quiet_hours: bool = False) -> dict:
+    """
+    Drop expired partitions and merge fragmented ones, measuring storage and
+    probe latency before and after. Merges only start inside the quiet-hours
+    window; a run that reaches its end leaves the rest for the next night.
+    """
+    if not CLICKHOUSE_AVAILABLE:
+        logger.warning("clickhouse-connect not installed, skipping ClickHouse maintenance")
+        return {}
+    if not CONFIG["clickhouse_password"]:
+        logger.warning("ClickHouse password not configured, skipping maintenance")
+        return {}
+
+    started = datetime.utcnow()
+    report = {"started_at": started.isoformat(), "dry_run": dry_run, "dropped": [], "optimized": []}
+    logger.info("Starting ClickHouse maintenance...")
+    try:
+        client = get_clickhouse_client()
+        info = table_info(client)
+        report["before"] = {"storage": storage_snapshot(client), "latency_ms": probe_latency(client, info)}
+
+        with metrics.stage("clickhouse", "retention") as stage:
+            for partition in expired_partitions(client, info):
+                if not dry_run:
+                    # Metadata-only: the partition's parts are unlinked, no rows are rewritten
+                    client.command(
+                        f"ALTER TABLE `{partition['table']}` DROP PARTITION ID '{partition['partition_id']}'",
+                        settings={"max_partition_size_to_drop": 0}
+                    )
+                stage["bytes_in"] += partition["bytes_on_disk"]
+                report["dropped"].append(partition)
+                logger.info(
+                    f"{'Would drop' if dry_run else 'Dropped'} {partition['table']} partition "
+                    f"{partition['partition']} ({partition['rows']} rows, {partition['bytes_on_disk']} bytes)"
+                )
+
+        with metrics.stage("clickhouse", "optimize"):
+            for candidate in partitions_to_merge(client):
+                if not (ignore_quiet_hours or in_quiet_hours()):
+                    report["deferred"] = True
+                    logger.info("Quiet hours over, leaving remaining merges for the next run")
+                    break
+                if not dry_run:
+                    merge_started = time.perf_counter()
+                    client.command(
+                        f"OPTIMIZE TABLE `{candidate['table']}` PARTITION ID '{candidate['partition_id']}' FINAL",
+                        settings={"optimize_skip_merged_partitions": 1,
+                                  **({"priority": CONFIG["clickhouse_priority"]} if CONFIG["clickhouse_priority"] else {})}
+                    )
+                    candidate["seconds"] = round(time.perf_counter() - merge_started, 1)
+                report["optimized"].append(candidate)
+                logger.info(f"{'Would optimize' if dry_run else 'Optimized'} {candidate['table']} "
+                            f"partition {candidate['partition_id']} ({candidate['parts']} parts)")
+
+        report["after"] = {"storage": storage_snapshot(client), "latency_ms": probe_latency(client, info)}
+        report["columns"] = column_compression(client)
+        report["effect"] = {
+            table: {
+                "bytes_on_disk_delta": report["after"]["storage"].get(table, {}).get("bytes_on_disk", 0) - before["bytes_on_disk"],
+                "parts_delta": report["after"]["storage"].get(table, {}).get("parts", 0) - before["parts"],
+                "latency_ms_before": report["before"]["latency_ms"].get(table),
+                "latency_ms_after": report["after"]["latency_ms"].get(table),
+            }
+            for table, before in report["before"]["storage"].items()
+        }
+        report["seconds"] = round((datetime.utcnow() - started).total_seconds(), 1)
+        report["status"] = "success"
+        clickhouse_state.update(last_run=report["started_at"], last_status="success", last_error=None,
+                                tables=report["after"]["storage"])
+        logger.info(
+            f"ClickHouse maintenance completed: {len(report['dropped'])} partitions dropped, "
+            f"{len(report['optimized'])} merged, {report['seconds']}s"
+        )
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = str(e)
+        clickhouse_state.update(last_run=report["started_at"], last_status="failed", last_error=str(e))
+        logger.error(f"ClickHouse maintenance failed: {e}")
+        send_alert(f"ClickHouse maintenance failed: {e}", "error")
+
+    summary = {k: report.get(k) for k in ("started_at", "status", "seconds", "dry_run", "effect")}
+    summary.update(dropped=len(report["dropped"]), optimized=len(report["optimized"]))
+    clickhouse_state["runs"] = (clickhouse_state["runs"] + [summary])[-CONFIG["metrics_history_runs"]:]
+    return report
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="ClickHouse retention, merges and compression report")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("report", help="Storage, compression, expired partitions and merge candidates")
+
+    run = commands.add_parser("run", help="Drop expired partitions and merge fragmented ones")
+    run.add_argument("--dry-run", action="store_true", help="Report what would be dropped and merged")
+    run.add_argument("--ignore-quiet-hours", action="store_true", help="Merge even outside CLICKHOUSE_QUIET_HOURS")
+
+    args = parser.parse_args()
+
+    if not CLICKHOUSE_AVAILABLE:
+        logger.error("clickhouse-connect package not installed")
+        sys.exit(1)
+
+    if args.command == "run":
+        report = run_maintenance(args.dry_run, args.ignore_quiet_hours)
+        print(json.dumps(report, indent=2, default=str))
+        sys.exit(1 if report.get("status") == "failed" else 0)
+
+    client = get_clickhouse_client()
+    info = table_info(client)
+    print(json.dumps({
+        "storage": storage_snapshot(client),
+        "columns": column_compression(client),
+        "latency_ms": probe_latency(client, info),
+        "expired_partitions": expired_partitions(client, info),
+        "merge_candidates": partitions_to_merge(client),
+        "retention_days": {t: _retention_days(t) for t in CONFIG["clickhouse_tables"]},
+    }, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
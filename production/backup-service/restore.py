@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Restore Tool for LiteLLM + Langfuse Stack Backups
+Lists backups from their manifests and restores PostgreSQL, ClickHouse and
+Redis artifacts with parallel ranged downloads, checksum and row-count verification
+
+Usage:
+    python3 restore.py list
+    python3 restore.py restore [BACKUP_ID] [--only postgres|clickhouse|redis]
+        [--postgres-url URL] [--clickhouse-database DB] [--redis-rdb-path PATH] [--json]
+    python3 restore.py verify [BACKUP_ID] [--local] [--json]
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import hashlib
+import argparse
+import tarfile
+import tempfile
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from backup import (
+    CONFIG,
+    CLICKHOUSE_AVAILABLE,
+    MINIO_AVAILABLE,
+    count_copy_rows,
+    get_clickhouse_client,
+    get_minio_client,
+    logger,
+)
+
+RESTORE_CONFIG = {
+    "download_parallelism": int(os.getenv("RESTORE_PARALLELISM", "8")),
+    "download_chunk_size_mb": int(os.getenv("RESTORE_CHUNK_SIZE_MB", "16")),
+    "redis_rdb_path": os.getenv("REDIS_RESTORE_PATH", os.path.join(CONFIG["work_dir"], "dump.rdb")),
+}
+
+VIEW_ENGINES = ("View", "MaterializedView", "LiveView", "Dictionary")
+
+
+class RestoreError(Exception):
+    """Raised when an artifact cannot be restored or fails verification"""
+
+
+def list_backups(client) -> List[dict]:
+    """Return all backup manifests, newest first"""
+    bucket = CONFIG["backup_bucket"]
+    manifests = []
+    for obj in client.list_objects(bucket, prefix="manifests/", recursive=True):
+        if obj.object_name.endswith(".json"):
+            manifests.append(_read_json(client, bucket, obj.object_name))
+    return sorted(manifests, key=lambda m: m["backup_id"], reverse=True)
+
+
+def load_manifest(client, backup_id: Optional[str] = None) -> dict:
+    """Load one manifest by id, or the latest one"""
+    if backup_id and backup_id != "latest":
+        return _read_json(client, CONFIG["backup_bucket"], f"manifests/backup_{backup_id}.json")
+
+    manifests = list_backups(client)
+    if not manifests:
+        raise RestoreError("No backup manifests found")
+    return manifests[0]
+
+
+def _read_json(client, bucket: str, object_name: str) -> dict:
+    response = client.get_object(bucket, object_name)
+    try:
+        return json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def download_chunks(client, bucket: str, object_name: str, size: int,
+                    parallelism: int, chunk_size: int) -> Iterator[bytes]:
+    """
+    Yield an object's bytes in order, fetching byte ranges in parallel.
+
+    At most 2 * parallelism chunks are in flight, which bounds memory use.
+    """
+    def fetch(offset: int) -> bytes:
+        response = client.get_object(
+            bucket, object_name, offset=offset, length=min(chunk_size, size - offset)
+        )
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    offsets = iter(range(0, size, chunk_size))
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        pending = deque(pool.submit(fetch, offset) for _, offset in zip(range(parallelism * 2), offsets))
+        while pending:
+            data = pending.popleft().result()
+            next_offset = next(offsets, None)
+            if next_offset is not None:
+                pending.append(pool.submit(fetch, next_offset))
+            yield data
+
+
+class ChunkReader(io.RawIOBase):
+    """File-like view over a chunk iterator that hashes and counts what it reads"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+        self.sha256 = hashlib.sha256()
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self.sha256.update(chunk)
+            self.bytes_read += len(chunk)
+            self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _open_artifact(client, artifact: dict, parallelism: int, chunk_size_mb: int) -> ChunkReader:
+    chunks = download_chunks(
+        client, CONFIG["backup_bucket"], artifact["object_name"], artifact["size"],
+        parallelism, chunk_size_mb * 1024 * 1024
+    )
+    return ChunkReader(chunks)
+
+
+def _result(artifact: dict, reader: ChunkReader, started: float, actual_rows: Dict[str, int]) -> dict:
+    """Compare a finished restore with its manifest entry"""
+    elapsed = max(time.time() - started, 0.001)
+    expected_rows = {
+        table: meta["rows"] for table, meta in artifact["tables"].items()
+        if meta.get("rows") is not None
+    }
+    mismatches = {
+        table: {"expected": expected, "actual": actual_rows.get(table)}
+        for table, expected in expected_rows.items()
+        if actual_rows.get(table) != expected
+    }
+    total_rows = sum(v for v in actual_rows.values() if v)
+    return {
+        "database": artifact["database"],
+        "object_name": artifact["object_name"],
+        "bytes": reader.bytes_read,
+        "seconds": round(elapsed, 2),
+        "mib_per_second": round(reader.bytes_read / elapsed / 1024 / 1024, 2),
+        "rows": total_rows,
+        "rows_per_second": round(total_rows / elapsed, 1),
+        "checksum_ok": reader.sha256.hexdigest() == artifact["sha256"],
+        "row_counts_ok": not mismatches,
+        "row_mismatches": mismatches,
+    }
+
+
+def postgres_row_counts(target_url: str, tables: List[str]) -> Dict[str, int]:
+    """Exact row counts for the given tables, in a single round trip"""
+    if not tables:
+        return {}
+    query = " UNION ALL ".join(
+        f"SELECT {i}, count(*) FROM {table}" for i, table in enumerate(tables)
+    )
+    result = subprocess.run(
+        ["psql", target_url, "-At", "-F", "\t", "-c", query],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RestoreError(f"Row count query failed: {result.stderr.strip()}")
+    counts = {}
+    for line in result.stdout.splitlines():
+        index, count = line.split("\t")
+        counts[tables[int(index)]] = int(count)
+    return counts
+
+
+def restore_postgres(client, artifact: dict, target_url: str,
+                     parallelism: int, chunk_size_mb: int) -> dict:
+    """
+    Stream a pg_dump artifact from MinIO through gunzip into psql.
+
+    The target database should be empty: the dump has no DROP statements and
+    psql stops on the first error.
+    """
+    started = time.time()
+    reader = _open_artifact(client, artifact, parallelism, chunk_size_mb)
+
+    with tempfile.TemporaryFile() as psql_errors:
+        psql = subprocess.Popen(
+            ["psql", target_url, "-v", "ON_ERROR_STOP=1", "-q", "-o", os.devnull],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=psql_errors
+        )
+        try:
+            with gzip.open(io.BufferedReader(reader, 1024 * 1024)) as dump:
+                count_copy_rows(dump, psql.stdin)
+            psql.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        if psql.wait() != 0:
+            psql_errors.seek(0)
+            raise RestoreError(f"psql failed: {psql_errors.read().decode(errors='replace')[-2000:]}")
+
+    actual_rows = postgres_row_counts(target_url, list(artifact["tables"]))
+    return _result(artifact, reader, started, actual_rows)
+
+
+def _retarget(create_query: str, source_db: str, target_db: str) -> str:
+    """Point a CREATE statement captured from source_db at target_db"""
+    if source_db == target_db:
+        return create_query
+    pattern = rf"(?<![\w`])(`?){re.escape(source_db)}\1\."
+    return re.sub(pattern, f"`{target_db}`.", create_query)
+
+
+def restore_clickhouse(client, artifact: dict, target_db: str,
+                       parallelism: int, chunk_size_mb: int) -> dict:
+    """
+    Recreate tables from the manifest and stream each TSV out of the tarball
+    into INSERT ... FORMAT TabSeparatedWithNames.
+
+    Target tables must be empty so a restore never duplicates rows.
+    """
+    if not CLICKHOUSE_AVAILABLE:
+        raise RestoreError("clickhouse-connect not installed")
+
+    started = time.time()
+    source_db = artifact.get("source_database", CONFIG["clickhouse_db"])
+
+    get_clickhouse_client(database="default").command(f"CREATE DATABASE IF NOT EXISTS `{target_db}`")
+    ch = get_clickhouse_client(database=target_db)
+
+    tables = artifact["tables"]
+    data_tables = [name for name, meta in tables.items() if meta["engine"] not in VIEW_ENGINES]
+    for name in data_tables:
+        query = _retarget(tables[name]["create_query"], source_db, target_db)
+        ch.command(query.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        if ch.command(f"SELECT count() FROM `{name}`"):
+            raise RestoreError(f"Target table {target_db}.{name} is not empty")
+
+    reader = _open_artifact(client, artifact, parallelism, chunk_size_mb)
+    with tarfile.open(fileobj=io.BufferedReader(reader, 1024 * 1024), mode="r|gz") as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith(".tsv"):
+                continue
+            table = os.path.basename(member.name)[:-len(".tsv")]
+            ch.raw_insert(table, insert_block=tar.extractfile(member), fmt="TabSeparatedWithNames")
+            logger.info(f"Restored table: {table}")
+
+    # Views last, so inserting the data above doesn't fire materialized views
+    for name, meta in tables.items():
+        if meta["engine"] in VIEW_ENGINES:
+            ch.command(_retarget(meta["create_query"], source_db, target_db))
+
+    actual_rows = {name: int(ch.command(f"SELECT count() FROM `{name}`")) for name in data_tables}
+    return _result(artifact, reader, started, actual_rows)
+
+
+def _copy_rdb(reader: ChunkReader, sink) -> int:
+    """
+    Decompress an RDB snapshot into sink, checking its framing on the way:
+    the REDIS magic up front and the EOF opcode before the 8-byte checksum.
+    """
+    size = 0
+    head = b""
+    tail = b""
+    with gzip.open(io.BufferedReader(reader, 1024 * 1024)) as rdb:
+        for chunk in iter(lambda: rdb.read(1024 * 1024), b""):
+            if len(head) < 9:
+                head = (head + chunk)[:9]
+            tail = (tail + chunk)[-9:]
+            size += len(chunk)
+            if sink is not None:
+                sink.write(chunk)
+    if not head.startswith(b"REDIS") or tail[:1] != b"\xff":
+        raise RestoreError("Redis artifact is not a complete RDB snapshot")
+    return size
+
+
+def restore_redis(client, artifact: dict, target_path: str,
+                  parallelism: int, chunk_size_mb: int) -> dict:
+    """
+    Download a Redis snapshot and write it out as an RDB file.
+
+    Redis loads the file on startup when it is placed in its data directory
+    as dump.rdb (with appendonly off for that first start; see the runbook).
+    """
+    started = time.time()
+    reader = _open_artifact(client, artifact, parallelism, chunk_size_mb)
+    partial = f"{target_path}.partial"
+    with open(partial, "wb") as f:
+        size = _copy_rdb(reader, f)
+    os.replace(partial, target_path)
+    logger.info(f"Wrote Redis snapshot to {target_path} ({size} bytes)")
+    return _result(artifact, reader, started, {})
+
+
+def verify_redis_locally(client, artifact: dict, parallelism: int, chunk_size_mb: int) -> dict:
+    """Stream a Redis snapshot and check it is a complete RDB without writing it"""
+    started = time.time()
+    reader = _open_artifact(client, artifact, parallelism, chunk_size_mb)
+    _copy_rdb(reader, None)
+    return _result(artifact, reader, started, {})
+
+
+def verify_postgres_locally(client, artifact: dict, parallelism: int, chunk_size_mb: int) -> dict:
+    """Stream a pg_dump artifact and count its COPY rows without a database"""
+    started = time.time()
+    reader = _open_artifact(client, artifact, parallelism, chunk_size_mb)
+    with gzip.open(io.BufferedReader(reader, 1024 * 1024)) as dump:
+        actual_rows = count_copy_rows(dump)
+    return _result(artifact, reader, started, actual_rows)
+
+
+def verify_clickhouse_locally(client, artifact: dict, parallelism: int, chunk_size_mb: int) -> dict:
+    """Stream a ClickHouse tarball and count its TSV rows without a database"""
+    started = time.time()
+    reader = _open_artifact(client, artifact, parallelism, chunk_size_mb)
+    actual_rows = {}
+    with tarfile.open(fileobj=io.BufferedReader(reader, 1024 * 1024), mode="r|gz") as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith(".tsv"):
+                continue
+            table = os.path.basename(member.name)[:-len(".tsv")]
+            f = tar.extractfile(member)
+            newlines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1024 * 1024), b""))
+            actual_rows[table] = max(newlines - 1, 0)
+    return _result(artifact, reader, started, actual_rows)
+
+
+def restore_backup(manifest: dict, only: Optional[str] = None,
+                   postgres_url: Optional[str] = None,
+                   clickhouse_database: Optional[str] = None,
+                   redis_rdb_path: Optional[str] = None,
+                   parallelism: Optional[int] = None,
+                   chunk_size_mb: Optional[int] = None,
+                   local: bool = False) -> List[dict]:
+    """
+    Restore every artifact of a backup and return per-artifact verification results.
+    
+    With local=True nothing is written to a database: artifacts are downloaded,
+    decompressed and their rows counted, as a stand-in for a real restore.
+    Redis snapshots are only written out as an RDB file when redis_rdb_path is
+    given; otherwise they are checked the same way as in local mode.
+    """
+    client = get_minio_client()
+    parallelism = parallelism or RESTORE_CONFIG["download_parallelism"]
+    chunk_size_mb = chunk_size_mb or RESTORE_CONFIG["download_chunk_size_mb"]
+
+    results = []
+    for artifact in manifest["artifacts"]:
+        database = artifact["database"]
+        if only and database != only:
+            continue
+
+        logger.info(f"Restoring {database} from {artifact['object_name']} ({artifact['size']} bytes)")
+        if local and database == "postgres":
+            result = verify_postgres_locally(client, artifact, parallelism, chunk_size_mb)
+        elif local and database == "clickhouse":
+            result = verify_clickhouse_locally(client, artifact, parallelism, chunk_size_mb)
+        elif database == "redis" and (local or not redis_rdb_path):
+            result = verify_redis_locally(client, artifact, parallelism, chunk_size_mb)
+        elif database == "postgres":
+            result = restore_postgres(
+                client, artifact, postgres_url or CONFIG["postgres_url"], parallelism, chunk_size_mb
+            )
+        elif database == "clickhouse":
+            result = restore_clickhouse(
+                client, artifact, clickhouse_database or CONFIG["clickhouse_db"], parallelism, chunk_size_mb
+            )
+        elif database == "redis":
+            result = restore_redis(client, artifact, redis_rdb_path, parallelism, chunk_size_mb)
+        else:
+            logger.warning(f"No restore handler for {database}, skipping")
+            continue
+
+        logger.info(
+            f"{'Verified' if local else 'Restored'} {database}: {result['bytes']} bytes in {result['seconds']}s "
+            f"({result['mib_per_second']} MiB/s, {result['rows_per_second']} rows/s), "
+            f"checksum {'ok' if result['checksum_ok'] else 'MISMATCH'}, "
+            f"row counts {'ok' if result['row_counts_ok'] else 'MISMATCH'}"
+        )
+        results.append(result)
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Restore LiteLLM + Langfuse backups")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List available backups")
+
+    restore = commands.add_parser("restore", help="Restore a backup (default: latest)")
+    restore.add_argument("backup_id", nargs="?", default="latest")
+    restore.add_argument("--only", choices=["postgres", "clickhouse", "redis"])
+    restore.add_argument("--postgres-url", help="Target database (default: DATABASE_URL)")
+    restore.add_argument("--clickhouse-database", help="Target database (default: CLICKHOUSE_DB)")
+    restore.add_argument("--redis-rdb-path", default=RESTORE_CONFIG["redis_rdb_path"],
+                         help="Where to write the Redis snapshot (default: REDIS_RESTORE_PATH)")
+    restore.add_argument("--parallelism", type=int, help="Concurrent ranged GETs per artifact")
+    restore.add_argument("--chunk-size-mb", type=int, help="Size of each ranged GET")
+    restore.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    verify = commands.add_parser("verify", help="Restore into scratch databases and check against the manifest")
+    verify.add_argument("backup_id", nargs="?", default="latest")
+    verify.add_argument("--local", action="store_true",
+                        help="Download and count rows without restoring into a database")
+    verify.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    if not MINIO_AVAILABLE:
+        logger.error("minio package not installed")
+        sys.exit(1)
+
+    client = get_minio_client()
+
+    if args.command == "list":
+        for manifest in list_backups(client):
+            parts = ", ".join(
+                f"{a['database']} {a['size'] / 1024 / 1024:.1f} MiB" for a in manifest["artifacts"]
+            )
+            print(f"{manifest['backup_id']}  {manifest['created_at']}  {parts}")
+        return
+
+    if args.command == "verify":
+        from backup import run_verification
+        report = run_verification(args.backup_id, local=args.local)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        sys.exit(0 if report["last_status"] == "success" else 1)
+
+    manifest = load_manifest(client, args.backup_id)
+    results = restore_backup(
+        manifest,
+        only=args.only,
+        postgres_url=args.postgres_url,
+        clickhouse_database=args.clickhouse_database,
+        redis_rdb_path=args.redis_rdb_path,
+        parallelism=args.parallelism,
+        chunk_size_mb=args.chunk_size_mb,
+    )
+
+    if args.json:
+        print(json.dumps({"backup_id": manifest["backup_id"], "results": results}, indent=2))
+
+    if not all(r["checksum_ok"] and r["row_counts_ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
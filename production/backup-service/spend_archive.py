@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Spend-Log Archival for LiteLLM + Langfuse Stack
+Moves LiteLLM spend-log rows older than N days out of PostgreSQL into
+date-partitioned, compressed Parquet in MinIO, and reads them back
+
+Usage:
+    python3 spend_archive.py run [--days 90]
+    python3 spend_archive.py list
+    python3 spend_archive.py query --from 2026-01-01 --to 2026-01-31 [--group-by model]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from backup import (
+    CONFIG,
+    MINIO_AVAILABLE,
+    archive_state,
+    ensure_bucket_exists,
+    get_minio_client,
+    logger,
+    metrics,
+    send_alert,
+)
+
+try:
+    import psycopg
+    from psycopg import sql
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARCHIVE_AVAILABLE = True
+except ImportError:
+    ARCHIVE_AVAILABLE = False
+
+# LiteLLM's spend-log columns used for partitioning and deletes
+TIME_COLUMN = "startTime"
+KEY_COLUMN = "request_id"
+
+# Postgres types with a direct Parquet equivalent; everything else (json,
+# arrays, uuid, ...) is archived as its text representation
+ARROW_TYPES = {
+    "text": "string",
+    "character varying": "string",
+    "character": "string",
+    "smallint": "int16",
+    "integer": "int32",
+    "bigint": "int64",
+    "real": "float32",
+    "double precision": "float64",
+    "boolean": "bool",
+    "date": "date32",
+    "timestamp without time zone": "timestamp[us]",
+    "timestamp with time zone": "timestamp[us, tz=UTC]",
+}
+
+
+class ArchiveError(Exception):
+    """An archived partition failed verification"""
+
+
+def _connect():
+    # Autocommit: the export and each delete batch get their own short transaction
+    return psycopg.connect(CONFIG["postgres_url"], autocommit=True, application_name="backup-service-archive")
+
+
+def _prefix(day: date) -> str:
+    return f"{CONFIG['spend_archive_prefix']}/date={day.isoformat()}/"
+
+
+def _arrow_type(name: str):
+    if name.startswith("timestamp["):
+        return pa.timestamp("us", tz="UTC" if "tz=" in name else None)
+    return pa.type_for_alias(name)
+
+
+def table_schema(conn) -> Tuple[List[sql.Composable], "pa.Schema"]:
+    """Select list and matching Arrow schema for the spend-log table"""
+    rows = conn.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position",
+        (CONFIG["spend_archive_table"],)
+    ).fetchall()
+    if not rows:
+        raise ArchiveError(f"Table {CONFIG['spend_archive_table']} not found")
+    select, fields = [], []
+    for name, data_type in rows:
+        arrow_name = ARROW_TYPES.get(data_type, "string")
+        column = sql.Identifier(name)
+        select.append(column if data_type in ARROW_TYPES else sql.SQL("{}::text").format(column))
+        fields.append(pa.field(name, _arrow_type(arrow_name)))
+    return select, pa.schema(fields)
+
+
+def pending_days(conn, cutoff: date) -> List[date]:
+    """Days with rows older than the cutoff, oldest first"""
+    oldest = conn.execute(
+        sql.SQL("SELECT min({t}) FROM {table} WHERE {t} < %s").format(
+            t=sql.Identifier(TIME_COLUMN), table=sql.Identifier(CONFIG["spend_archive_table"])
+        ),
+        (datetime.combine(cutoff, datetime.min.time()),)
+    ).fetchone()[0]
+    if oldest is None:
+        return []
+    return [oldest.date() + timedelta(days=i) for i in range((cutoff - oldest.date()).days)]
+
+
+def _day_has_rows(conn, day: date) -> bool:
+    start = datetime.combine(day, datetime.min.time())
+    return conn.execute(
+        sql.SQL("SELECT EXISTS (SELECT 1 FROM {table} WHERE {t} >= %s AND {t} < %s)").format(
+            t=sql.Identifier(TIME_COLUMN), table=sql.Identifier(CONFIG["spend_archive_table"])
+        ),
+        (start, start + timedelta(days=1))
+    ).fetchone()[0]
+
+
+def archived_parts(client, day: date) -> List[dict]:
+    """Verified parts of one day's partition (a part counts once its manifest exists)"""
+    parts = []
+    for obj in client.list_objects(CONFIG["spend_archive_bucket"], prefix=_prefix(day)):
+        if obj.object_name.endswith(".json"):
+            response = client.get_object(CONFIG["spend_archive_bucket"], obj.object_name)
+            try:
+                parts.append(json.loads(response.read()))
+            finally:
+                response.close()
+                response.release_conn()
+    return sorted(parts, key=lambda p: p["object"])
+
+
+def export_day(conn, select, schema, day: date, local_path: str) -> dict:
+    """
+    Stream one day of rows through a server-side cursor into a Parquet file.
+
+    Rows arrive in (time, request_id) order and each fetch becomes a row
+    group, so memory stays bounded by spend_archive_fetch_rows.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    query = sql.SQL("SELECT {columns} FROM {table} WHERE {t} >= %s AND {t} < %s ORDER BY {t}, {key}").format(
+        columns=sql.SQL(", ").join(select),
+        table=sql.Identifier(CONFIG["spend_archive_table"]),
+        t=sql.Identifier(TIME_COLUMN),
+        key=sql.Identifier(KEY_COLUMN),
+    )
+    fetch_rows = CONFIG["spend_archive_fetch_rows"]
+    time_index = schema.get_field_index(TIME_COLUMN)
+    rows_written = 0
+    first = last = None
+    with pq.ParquetWriter(local_path, schema, compression="zstd") as writer:
+        with conn.transaction():
+            with conn.cursor(name=f"spend_archive_{day:%Y%m%d}") as cursor:
+                cursor.execute(query, (start, start + timedelta(days=1)))
+                while True:
+                    rows = cursor.fetchmany(fetch_rows)
+                    if not rows:
+                        break
+                    columns = list(zip(*rows))
+                    writer.write_batch(pa.RecordBatch.from_arrays(
+                        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                        schema=schema
+                    ))
+                    first = first or rows[0][time_index]
+                    last = rows[-1][time_index]
+                    rows_written += len(rows)
+    return {
+        "rows": rows_written,
+        "min_time": first.isoformat() if first else None,
+        "max_time": last.isoformat() if last else None,
+    }
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def upload_and_verify(client, local_path: str, object_name: str, rows: int) -> dict:
+    """Upload a part, then read it back and check checksum and row count"""
+    bucket = CONFIG["spend_archive_bucket"]
+    checksum = _sha256(local_path)
+    size = os.path.getsize(local_path)
+    if pq.ParquetFile(local_path).metadata.num_rows != rows:
+        raise ArchiveError(f"{object_name}: Parquet file has a different row count than was exported")
+
+    client.fput_object(bucket, object_name, local_path, metadata={"sha256": checksum})
+
+    digest = hashlib.sha256()
+    remote_size = 0
+    response = client.get_object(bucket, object_name)
+    try:
+        for block in response.stream(1024 * 1024):
+            digest.update(block)
+            remote_size += len(block)
+    finally:
+        response.close()
+        response.release_conn()
+    if remote_size != size or digest.hexdigest() != checksum:
+        raise ArchiveError(f"{object_name}: read-back does not match the local file")
+    return {"object": object_name, "bytes": size, "sha256": checksum}
+
+
+def delete_archived(conn, day: date, keys: List[str]) -> int:
+    """Delete archived rows in bounded batches, each its own short transaction"""
+    start = datetime.combine(day, datetime.min.time())
+    statement = sql.SQL("DELETE FROM {table} WHERE {key} = ANY(%s) AND {t} >= %s AND {t} < %s").format(
+        table=sql.Identifier(CONFIG["spend_archive_table"]),
+        key=sql.Identifier(KEY_COLUMN),
+        t=sql.Identifier(TIME_COLUMN),
+    )
+    batch = CONFIG["spend_archive_delete_batch"]
+    deleted = 0
+    for i in range(0, len(keys), batch):
+        with conn.transaction():
+            deleted += conn.execute(statement, (keys[i:i + batch], start, start + timedelta(days=1))).rowcount
+        # Room for autovacuum, replication and the hot path between batches
+        time.sleep(CONFIG["spend_archive_delete_pause_ms"] / 1000)
+    return deleted
+
+
+def _part_keys(client, part: dict) -> List[str]:
+    response = client.get_object(CONFIG["spend_archive_bucket"], part["object"])
+    try:
+        data = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+    return pq.read_table(io.BytesIO(data), columns=[KEY_COLUMN]).column(KEY_COLUMN).to_pylist()
+
+
+def archive_day(conn, client, select, schema, day: date) -> dict:
+    """
+    Archive one day: resume deletes for parts archived by an interrupted run,
+    export whatever rows remain as a new part, verify it, then delete its rows.
+    """
+    result = {"day": day.isoformat(), "rows": 0, "bytes": 0, "deleted": 0}
+    if not _day_has_rows(conn, day):
+        return result
+    parts = archived_parts(client, day)
+    for part in parts:
+        result["deleted"] += delete_archived(conn, day, _part_keys(client, part))
+
+    local_path = os.path.join(CONFIG["work_dir"], f"spend_archive_{day:%Y%m%d}.parquet")
+    try:
+        with metrics.stage("spend_logs", "archive") as stage:
+            exported = export_day(conn, select, schema, day, local_path)
+            if not exported["rows"]:
+                return result
+            object_name = f"{_prefix(day)}part-{len(parts):05d}.parquet"
+            part = upload_and_verify(client, local_path, object_name, exported["rows"])
+            stage["bytes_out"] = part["bytes"]
+        part.update(exported, archived_at=datetime.utcnow().isoformat(),
+                    columns=schema.names, table=CONFIG["spend_archive_table"])
+        # Written last: its presence marks the part as verified and safe to delete from
+        body = json.dumps(part, indent=2).encode()
+        client.put_object(
+            CONFIG["spend_archive_bucket"], object_name[:-len(".parquet")] + ".json",
+            io.BytesIO(body), len(body), content_type="application/json"
+        )
+
+        keys = pq.read_table(local_path, columns=[KEY_COLUMN]).column(KEY_COLUMN).to_pylist()
+        with metrics.stage("spend_logs", "delete"):
+            result["deleted"] += delete_archived(conn, day, keys)
+        result["rows"], result["bytes"] = exported["rows"], part["bytes"]
+        return result
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+
+def run_archive(days: Optional[int] = None) -> dict:
+    """Archive every whole day older than the retention window"""
+    if not CONFIG["postgres_url"]:
+        logger.warning("PostgreSQL URL not configured, skipping spend-log archival")
+        return {}
+    if not (ARCHIVE_AVAILABLE and MINIO_AVAILABLE):
+        logger.warning("psycopg, pyarrow or minio not installed, skipping spend-log archival")
+        return {}
+
+    days = CONFIG["spend_archive_days"] if days is None else days
+    # Whole days only, so each partition is archived in one piece
+    cutoff = datetime.utcnow().date() - timedelta(days=days)
+    started = time.time()
+    report = {"cutoff": cutoff.isoformat(), "days": [], "rows": 0, "bytes": 0, "deleted": 0}
+    logger.info(f"Archiving {CONFIG['spend_archive_table']} rows before {cutoff}...")
+
+    try:
+        client = get_minio_client()
+        ensure_bucket_exists(client, CONFIG["spend_archive_bucket"])
+        with _connect() as conn:
+            select, schema = table_schema(conn)
+            for day in pending_days(conn, cutoff):
+                result = archive_day(conn, client, select, schema, day)
+                if result["rows"] or result["deleted"]:
+                    logger.info(
+                        f"Archived {day}: {result['rows']} rows, {result['bytes']} bytes, "
+                        f"{result['deleted']} deleted"
+                    )
+                    report["days"].append(result)
+                for key in ("rows", "bytes", "deleted"):
+                    report[key] += result[key]
+            if report["deleted"]:
+                # Make the freed space reusable now rather than whenever autovacuum gets to it
+                conn.execute(sql.SQL("VACUUM (ANALYZE) {}").format(sql.Identifier(CONFIG["spend_archive_table"])))
+
+        report["seconds"] = round(time.time() - started, 1)
+        archive_state.update(
+            last_run=datetime.utcnow().isoformat(), last_status="success", last_error=None,
+            rows_archived=archive_state["rows_archived"] + report["rows"],
+            bytes_archived=archive_state["bytes_archived"] + report["bytes"],
+        )
+        logger.info(
+            f"Spend-log archival completed: {report['rows']} rows in {len(report['days'])} partitions, "
+            f"{report['deleted']} deleted, {report['seconds']}s"
+        )
+    except Exception as e:
+        archive_state.update(last_run=datetime.utcnow().isoformat(), last_status="failed", last_error=str(e))
+        logger.error(f"Spend-log archival failed: {e}")
+        send_alert(f"Spend-log archival failed: {e}", "error")
+        report["error"] = str(e)
+    return report
+
+
+def read_archive(start: date, end: date, columns: Optional[List[str]] = None,
+                 client=None) -> "pa.Table":
+    """
+    Read archived spend logs for days in [start, end] back as one Arrow table.
+
+    Only the requested columns are decoded; pass e.g. ["startTime", "model",
+    "spend"] to skip the large message and response payloads.
+    """
+    client = client or get_minio_client()
+    tables = []
+    day = start
+    while day <= end:
+        for part in archived_parts(client, day):
+            response = client.get_object(CONFIG["spend_archive_bucket"], part["object"])
+            try:
+                data = response.read()
+            finally:
+                response.close()
+                response.release_conn()
+            tables.append(pq.read_table(io.BytesIO(data), columns=columns))
+        day += timedelta(days=1)
+    if not tables:
+        return pa.table({name: [] for name in columns or []})
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def summarize(table: "pa.Table", group_by: List[str]) -> List[Dict]:
+    """Request count, spend and tokens per group"""
+    aggregates = [(KEY_COLUMN, "count")]
+    for column in ("spend", "total_tokens"):
+        if column in table.column_names:
+            aggregates.append((column, "sum"))
+    return table.group_by(group_by).aggregate(aggregates).sort_by(
+        [(name, "ascending") for name in group_by]
+    ).to_pylist()
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Archive LiteLLM spend logs to Parquet in MinIO")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Archive and delete rows older than the retention window")
+    run.add_argument("--days", type=int, help=f"Keep this many days in Postgres (default {CONFIG['spend_archive_days']})")
+
+    commands.add_parser("list", help="List archived partitions")
+
+    query = commands.add_parser("query", help="Summarise archived spend")
+    query.add_argument("--from", dest="start", required=True, help="First day, YYYY-MM-DD")
+    query.add_argument("--to", dest="end", help="Last day, YYYY-MM-DD (default: --from)")
+    query.add_argument("--group-by", default="model", help="Comma-separated columns (default: model)")
+    query.add_argument("--json", action="store_true", help="Print rows as JSON")
+
+    args = parser.parse_args()
+
+    if not (ARCHIVE_AVAILABLE and MINIO_AVAILABLE):
+        logger.error("psycopg, pyarrow and minio packages are required")
+        sys.exit(1)
+
+    if args.command == "run":
+        report = run_archive(args.days)
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if "error" in report else 0)
+
+    client = get_minio_client()
+    if args.command == "list":
+        prefix = f"{CONFIG['spend_archive_prefix']}/"
+        for obj in client.list_objects(CONFIG["spend_archive_bucket"], prefix=prefix, recursive=True):
+            if obj.object_name.endswith(".parquet"):
+                print(f"{obj.object_name}  {obj.size / 1024 / 1024:.1f} MiB")
+        return
+
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end) if args.end else start
+    group_by = [c.strip() for c in args.group_by.split(",") if c.strip()]
+    table = read_archive(start, end, columns=list(dict.fromkeys(group_by + [KEY_COLUMN, "spend", "total_tokens"])))
+    rows = summarize(table, group_by) if table.num_rows else []
+    if args.json:
+        print(json.dumps(rows, indent=2, default=str))
+        return
+    for row in rows:
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+    print(f"{table.num_rows} requests from {start} to {end}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Continuous WAL Archiving for LiteLLM + Langfuse Stack
+Streams PostgreSQL WAL to MinIO with pg_receivewal, takes periodic base
+backups with pg_basebackup, and prepares point-in-time restores
+
+Usage:
+    python3 wal_archive.py list
+    python3 wal_archive.py restore-to "2026-01-03 14:05:00" --target-dir /path/to/pgdata
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import glob
+import shutil
+import hashlib
+import argparse
+import tarfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Thread
+from typing import List
+
+from backup import (
+    CONFIG,
+    MINIO_AVAILABLE,
+    ensure_bucket_exists,
+    get_minio_client,
+    logger,
+    send_alert,
+    upload_to_minio,
+    wal_state,
+)
+
+SEGMENT_NAME = re.compile(r"^[0-9A-F]{24}$")
+HISTORY_NAME = re.compile(r"^[0-9A-F]{8}\.history$")
+START_WAL = re.compile(r"START WAL LOCATION: .* \(file ([0-9A-F]{24})\)")
+
+# Local WAL files already shipped to MinIO
+_uploaded_local = set()
+
+
+def _wal_dir() -> str:
+    return os.path.join(CONFIG["work_dir"], "wal")
+
+
+def _put_compressed(client, local_path: str, object_name: str):
+    """Gzip a WAL file in memory and upload it with its checksum"""
+    with open(local_path, "rb") as f:
+        data = gzip.compress(f.read(), compresslevel=6)
+    client.put_object(
+        CONFIG["backup_bucket"], object_name, io.BytesIO(data), len(data),
+        metadata={"sha256": hashlib.sha256(data).hexdigest()}
+    )
+    return len(data)
+
+
+def archive_pending_wal(client, pool: ThreadPoolExecutor, partial_marker: dict):
+    """
+    Upload completed WAL segments and timeline history files in parallel,
+    then the in-progress .partial segment if it has grown.
+    """
+    wal_dir = _wal_dir()
+    completed = sorted(
+        name for name in os.listdir(wal_dir)
+        if SEGMENT_NAME.match(name) or HISTORY_NAME.match(name)
+    )
+    segments = [name for name in completed if SEGMENT_NAME.match(name)]
+    # pg_receivewal finds its restart position from the newest local segment
+    keep = segments[-1] if segments else None
+
+    uploads = {
+        name: pool.submit(_put_compressed, client, os.path.join(wal_dir, name), f"wal/{name}.gz")
+        for name in completed if name not in _uploaded_local
+    }
+    for name, future in uploads.items():
+        wal_state["compressed_bytes"] += future.result()
+        wal_state["segments_uploaded"] += 1
+        wal_state["last_segment"] = name
+        wal_state["last_upload"] = datetime.utcnow().isoformat()
+        _uploaded_local.add(name)
+        try:
+            client.remove_object(CONFIG["backup_bucket"], f"wal/{name}.partial.gz")
+        except Exception:
+            pass
+
+    for name in completed:
+        if name != keep and name in _uploaded_local:
+            os.remove(os.path.join(wal_dir, name))
+            _uploaded_local.discard(name)
+
+    # The partial segment is what brings RPO down from a whole segment to seconds
+    for path in glob.glob(os.path.join(wal_dir, "*.partial")):
+        stat = os.stat(path)
+        marker = (os.path.basename(path), stat.st_size, stat.st_mtime)
+        if partial_marker.get("last") != marker:
+            _put_compressed(client, path, f"wal/{os.path.basename(path)}.gz")
+            partial_marker["last"] = marker
+            wal_state["last_upload"] = datetime.utcnow().isoformat()
+
+    wal_state["pending_segments"] = len([n for n in completed if n not in _uploaded_local])
+
+
+def _run_receiver():
+    """Run pg_receivewal, restarting it with backoff whenever it exits"""
+    backoff = 1
+    while True:
+        cmd = [
+            "pg_receivewal",
+            "-d", CONFIG["postgres_url"],
+            "-D", _wal_dir(),
+            "--slot", CONFIG["wal_slot_name"],
+            "--synchronous",
+            "--no-loop",
+        ]
+        # Create the slot first so the server retains WAL while we are down
+        subprocess.run(
+            cmd[:5] + ["--slot", CONFIG["wal_slot_name"], "--create-slot", "--if-not-exists"],
+            capture_output=True
+        )
+        logger.info(f"Starting WAL streaming with slot {CONFIG['wal_slot_name']}")
+        started = time.time()
+        wal_state["streaming"] = True
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        wal_state["streaming"] = False
+        wal_state["receiver_restarts"] += 1
+        wal_state["last_error"] = result.stderr.strip()[-500:] or None
+        logger.error(f"pg_receivewal exited with {result.returncode}: {wal_state['last_error']}")
+
+        backoff = 1 if time.time() - started > 60 else min(backoff * 2, 60)
+        time.sleep(backoff)
+
+
+def _run_uploader():
+    """Ship WAL files to MinIO every few seconds"""
+    client = None
+    partial_marker = {}
+    backoff = CONFIG["wal_partial_upload_seconds"]
+    failing_since = alerted = None
+    with ThreadPoolExecutor(max_workers=CONFIG["wal_upload_parallelism"]) as pool:
+        while True:
+            try:
+                # Set up here so MinIO being down at startup is retried, not fatal
+                if client is None:
+                    client = get_minio_client()
+                    ensure_bucket_exists(client, CONFIG["backup_bucket"])
+                archive_pending_wal(client, pool, partial_marker)
+                backoff = CONFIG["wal_partial_upload_seconds"]
+                failing_since = alerted = None
+            except Exception as e:
+                client = None
+                wal_state["last_error"] = str(e)
+                logger.error(f"WAL upload failed: {e}")
+                backoff = min(backoff * 2, max(60, CONFIG["wal_partial_upload_seconds"]))
+                failing_since = failing_since or time.time()
+                if not alerted and time.time() - failing_since > 300:
+                    # Once per outage: the slot keeps holding WAL on the Postgres volume meanwhile
+                    send_alert(f"WAL archiving has been failing for over 5 minutes: {e}", "error")
+                    alerted = True
+            time.sleep(backoff)
+
+
+def start_wal_archiver():
+    """Start continuous WAL streaming and upload in background threads"""
+    if not CONFIG["postgres_url"]:
+        logger.warning("PostgreSQL URL not configured, WAL archiving disabled")
+        return
+    if not MINIO_AVAILABLE:
+        logger.warning("MinIO not available, WAL archiving disabled")
+        return
+
+    os.makedirs(_wal_dir(), mode=0o700, exist_ok=True)
+    Thread(target=_run_receiver, daemon=True).start()
+    Thread(target=_run_uploader, daemon=True).start()
+    logger.info(
+        f"WAL archiving enabled (partial segments every {CONFIG['wal_partial_upload_seconds']}s)"
+    )
+
+
+def _start_segment(fileobj) -> str:
+    """WAL segment a base backup starts replay from, read from its backup_label"""
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            if member.name == "backup_label":
+                match = START_WAL.search(tar.extractfile(member).read().decode())
+                if match:
+                    return match.group(1)
+                break
+    raise RuntimeError("backup_label has no START WAL LOCATION")
+
+
+def run_base_backup():
+    """Take a pg_basebackup and upload it as the starting point for WAL replay"""
+    started = datetime.utcnow()
+    backup_id = started.strftime("%Y%m%d_%H%M%S")
+    backup_dir = os.path.join(CONFIG["work_dir"], f"basebackup_{backup_id}")
+    logger.info("Starting base backup...")
+
+    try:
+        # WAL comes from the archive, so the base backup doesn't need to include it
+        result = subprocess.run(
+            ["pg_basebackup", "-d", CONFIG["postgres_url"], "-D", backup_dir,
+             "-Ft", "-z", "-X", "none", "--checkpoint=spread"],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"pg_basebackup failed: {result.stderr.strip()}")
+
+        with open(os.path.join(backup_dir, "base.tar.gz"), "rb") as f:
+            start_wal = _start_segment(f)
+
+        files = []
+        for name in sorted(os.listdir(backup_dir)):
+            path = os.path.join(backup_dir, name)
+            files.append({"name": name, "size": os.path.getsize(path)})
+            upload_to_minio(path, f"basebackups/{backup_id}", "postgres-base")
+
+        # Written last: its presence marks the base backup as complete
+        info = {
+            "backup_id": backup_id,
+            "started_at": started.isoformat(),
+            "finished_at": datetime.utcnow().isoformat(),
+            "start_wal": start_wal,
+            "files": files,
+        }
+        body = json.dumps(info, indent=2).encode()
+        get_minio_client().put_object(
+            CONFIG["backup_bucket"], f"basebackups/{backup_id}/backup_info.json",
+            io.BytesIO(body), len(body), content_type="application/json"
+        )
+        wal_state["last_base_backup"] = backup_id
+        logger.info(f"Base backup {backup_id} completed")
+    except Exception as e:
+        wal_state["last_error"] = str(e)
+        logger.error(f"Base backup failed: {e}")
+    finally:
+        shutil.rmtree(backup_dir, ignore_errors=True)
+
+
+def list_base_backups(client) -> List[dict]:
+    """Completed base backups, oldest first"""
+    from restore import _read_json
+
+    infos = []
+    for obj in client.list_objects(CONFIG["backup_bucket"], prefix="basebackups/", recursive=True):
+        if obj.object_name.endswith("/backup_info.json"):
+            infos.append(_read_json(client, CONFIG["backup_bucket"], obj.object_name))
+    return sorted(infos, key=lambda i: i["finished_at"])
+
+
+def prune_archive(client, cutoff: datetime) -> List:
+    """
+    Remove base backups and WAL no retained recovery point needs.
+
+    Keeps the base backups finished after cutoff plus the newest one before
+    it, so any time in the retention window stays recoverable, and the WAL
+    from the oldest kept base backup's start segment onwards. Returns the
+    removed objects.
+    """
+    bucket = CONFIG["backup_bucket"]
+    bases = list_base_backups(client)
+    if not bases:
+        return []  # Without a base backup the WAL can't be replayed; leave it for the first one
+    older = [i for i, info in enumerate(bases) if datetime.fromisoformat(info["finished_at"]) < cutoff]
+    oldest_kept = bases[older[-1] if older else 0]
+    kept = {info["backup_id"] for info in bases if info["backup_id"] >= oldest_kept["backup_id"]}
+
+    removed = []
+    for obj in client.list_objects(bucket, prefix="basebackups/", recursive=True):
+        backup_id = obj.object_name.split("/")[1]
+        # Incomplete base backups are kept until they age out, one may be in progress
+        if backup_id not in kept and (backup_id < oldest_kept["backup_id"]
+                                      or obj.last_modified.replace(tzinfo=None) < cutoff):
+            removed.append(obj)
+
+    start_wal = oldest_kept.get("start_wal")
+    if start_wal is None:
+        # Base backups from before start_wal was recorded
+        response = client.get_object(bucket, f"basebackups/{oldest_kept['backup_id']}/base.tar.gz")
+        try:
+            start_wal = _start_segment(response)
+        finally:
+            response.close()
+            response.release_conn()
+    for obj in client.list_objects(bucket, prefix="wal/", recursive=True):
+        segment = obj.object_name[len("wal/"):-len(".gz")].replace(".partial", "")
+        # Positions compare without the timeline; history files are tiny and always kept
+        if SEGMENT_NAME.match(segment) and segment[8:] < start_wal[8:]:
+            removed.append(obj)
+
+    for obj in removed:
+        client.remove_object(bucket, obj.object_name)
+    return removed
+
+
+def _download_to(client, object_name: str, size: int, parallelism: int):
+    from restore import ChunkReader, RESTORE_CONFIG, download_chunks
+
+    chunks = download_chunks(
+        client, CONFIG["backup_bucket"], object_name, size,
+        parallelism, RESTORE_CONFIG["download_chunk_size_mb"] * 1024 * 1024
+    )
+    return io.BufferedReader(ChunkReader(chunks), 1024 * 1024)
+
+
+def prepare_pitr(target_time: datetime, target_dir: str, parallelism: int = 8) -> dict:
+    """
+    Build a data directory that recovers to target_time when Postgres starts.
+
+    Extracts the newest base backup finished before target_time, downloads the
+    WAL needed after it in parallel, and writes recovery settings.
+    """
+    client = get_minio_client()
+    bucket = CONFIG["backup_bucket"]
+    target_naive = target_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+    candidates = [
+        info for info in list_base_backups(client)
+        if datetime.fromisoformat(info["finished_at"]) <= target_naive
+    ]
+    if not candidates:
+        raise RuntimeError(f"No base backup finished before {target_time.isoformat()}")
+    base = candidates[-1]
+    logger.info(f"Using base backup {base['backup_id']}")
+
+    if os.path.exists(target_dir) and os.listdir(target_dir):
+        raise RuntimeError(f"Target directory {target_dir} is not empty")
+    os.makedirs(target_dir, mode=0o700, exist_ok=True)
+
+    started = time.time()
+    for f in base["files"]:
+        object_name = f"basebackups/{base['backup_id']}/{f['name']}"
+        if f["name"] == "base.tar.gz":
+            with tarfile.open(fileobj=_download_to(client, object_name, f["size"], parallelism),
+                              mode="r|gz") as tar:
+                tar.extractall(target_dir, filter="tar")
+
+    with open(os.path.join(target_dir, "backup_label")) as f:
+        match = START_WAL.search(f.read())
+    if not match:
+        raise RuntimeError("backup_label has no START WAL LOCATION")
+    start_segment = match.group(1)
+
+    # Completed segments win over partial uploads of the same segment
+    wanted = {}
+    for obj in client.list_objects(bucket, prefix="wal/", recursive=True):
+        name = obj.object_name[len("wal/"):-len(".gz")]
+        segment = name.replace(".partial", "")
+        if HISTORY_NAME.match(segment) or (SEGMENT_NAME.match(segment) and segment >= start_segment):
+            if segment not in wanted or not name.endswith(".partial"):
+                wanted[segment] = obj.object_name
+
+    wal_dir = os.path.join(target_dir, "wal_restore")
+    os.makedirs(wal_dir, mode=0o700, exist_ok=True)
+
+    def fetch(item):
+        segment, object_name = item
+        response = client.get_object(bucket, object_name)
+        try:
+            data = gzip.decompress(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+        with open(os.path.join(wal_dir, segment), "wb") as out:
+            out.write(data)
+
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        list(pool.map(fetch, sorted(wanted.items())))
+
+    with open(os.path.join(target_dir, "postgresql.auto.conf"), "a") as conf:
+        conf.write(
+            f"\n# Point-in-time recovery prepared by wal_archive.py\n"
+            # Relative: restore_command runs in the data directory, wherever it ends up mounted
+            f"restore_command = 'cp wal_restore/%f \"%p\"'\n"
+            f"recovery_target_time = '{target_time.astimezone(timezone.utc).isoformat(sep=' ')}'\n"
+            f"recovery_target_action = 'promote'\n"
+        )
+    open(os.path.join(target_dir, "recovery.signal"), "w").close()
+
+    return {
+        "base_backup": base["backup_id"],
+        "start_segment": start_segment,
+        "wal_files": len(wanted),
+        "target_time": target_time.isoformat(),
+        "target_dir": target_dir,
+        "seconds": round(time.time() - started, 2),
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="WAL archive and point-in-time recovery")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List base backups and the WAL archive head")
+
+    pitr = commands.add_parser("restore-to", help="Prepare a data directory recovering to a timestamp")
+    pitr.add_argument("timestamp", help="Recovery target, ISO 8601 (UTC if no offset given)")
+    pitr.add_argument("--target-dir", required=True, help="Empty directory for the restored cluster")
+    pitr.add_argument("--parallelism", type=int, default=8)
+
+    args = parser.parse_args()
+
+    if not MINIO_AVAILABLE:
+        logger.error("minio package not installed")
+        sys.exit(1)
+
+    if args.command == "list":
+        client = get_minio_client()
+        for info in list_base_backups(client):
+            size = sum(f["size"] for f in info["files"])
+            print(f"{info['backup_id']}  finished {info['finished_at']}  {size / 1024 / 1024:.1f} MiB")
+        newest = max(
+            (obj for obj in client.list_objects(CONFIG["backup_bucket"], prefix="wal/", recursive=True)),
+            key=lambda obj: obj.last_modified, default=None
+        )
+        if newest:
+            print(f"WAL archived up to {newest.last_modified.isoformat()} ({newest.object_name})")
+        return
+
+    target_time = datetime.fromisoformat(args.timestamp)
+    if target_time.tzinfo is None:
+        target_time = target_time.replace(tzinfo=timezone.utc)
+
+    report = prepare_pitr(target_time, args.target_dir, args.parallelism)
+    print(json.dumps(report, indent=2))
+    print(
+        f"\nStart PostgreSQL (same major version) on {args.target_dir}; it will replay WAL "
+        f"to {report['target_time']} and promote."
+    )
+
+
+if __name__ == "__main__":
+    main()
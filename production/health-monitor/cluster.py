@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Cluster mode for the health monitor.
+
+Several monitor replicas coordinate through the stack's Redis:
+
+- Membership: every replica refreshes a member key with a short TTL; a
+  replica that stops heartbeating drops out when its key expires.
+- Sharding: check names are placed on a consistent-hash ring of the live
+  members, so each check runs on exactly one replica and a membership change
+  only moves the checks of the replica that joined or left.
+- Leadership: one replica holds a leader lease (SET NX PX, renewed with a
+  compare-and-extend script). Only the leader evaluates alerts, so each
+  incident is announced once. A replica that dies loses the lease within
+  CLUSTER_LEASE_SECONDS; one that shuts down cleanly releases it at once.
+- Shared state: results, failure counts and open incidents live in Redis
+  hashes, so any replica serves the merged /health view and a new owner or
+  leader continues where the previous one stopped.
+
+If Redis is unreachable the replica falls back to checking and alerting on
+its own, so a Redis outage is still reported (possibly once per replica).
+"""
+
+import json
+import bisect
+import contextvars
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from monitor import (
+    CONFIG, ServiceHealth, ServiceStatus, health_state, logger,
+    run_check, send_alert, send_recovery, track_failures,
+)
+
+# Extend the lease only if this replica still holds it
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+VIRTUAL_NODES = 64
+
+cluster_state = {
+    "replica": CONFIG["replica_id"],
+    "leader": None,
+    "is_leader": False,
+    "members": [],
+    "owned_checks": [],
+    "last_heartbeat": None,
+    "redis_error": None,
+}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes per member"""
+
+    def __init__(self, members: List[str], vnodes: int = VIRTUAL_NODES):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._members = [m for _, m in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._members[index]
+
+
+class Cluster:
+    def __init__(self, client=None):
+        self.replica = CONFIG["replica_id"]
+        self.prefix = CONFIG["cluster_prefix"]
+        self.lease_ms = int(CONFIG["cluster_lease_seconds"] * 1000)
+        if client is None:
+            import redis
+            client = redis.Redis(
+                host=CONFIG["redis_host"],
+                port=CONFIG["redis_port"],
+                password=CONFIG["redis_password"] or None,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+            )
+        self.redis = client
+        self._renew = self.redis.register_script(RENEW_SCRIPT)
+        self._release = self.redis.register_script(RELEASE_SCRIPT)
+        self._stop = threading.Event()
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    # ------------------------------------------------------------------
+    # Membership and leadership
+    # ------------------------------------------------------------------
+
+    def heartbeat(self):
+        """Refresh membership and take or keep the leader lease"""
+        self.redis.set(self.key(f"member:{self.replica}"), datetime.utcnow().isoformat(), px=self.lease_ms)
+        leader_key = self.key("leader")
+        is_leader = bool(self._renew(keys=[leader_key], args=[self.replica, self.lease_ms]))
+        if not is_leader and self.redis.set(leader_key, self.replica, nx=True, px=self.lease_ms):
+            is_leader = True
+            logger.info(f"Replica {self.replica} is now the alerting leader")
+        leader = self.redis.get(leader_key)
+        members = sorted(
+            k.decode().rsplit(":", 1)[1]
+            for k in self.redis.scan_iter(match=self.key("member:*"), count=100)
+        )
+        cluster_state.update(
+            leader=leader.decode() if leader else None,
+            is_leader=is_leader,
+            members=members,
+            last_heartbeat=datetime.utcnow().isoformat(),
+            redis_error=None,
+        )
+        return is_leader
+
+    def heartbeat_loop(self):
+        """Heartbeat every third of the lease, so a missed beat doesn't lose it"""
+        interval = self.lease_ms / 3000
+        while not self._stop.wait(interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                if cluster_state["redis_error"] is None:
+                    logger.error(f"Cluster heartbeat failed: {e}")
+                cluster_state.update(redis_error=str(e)[:200], is_leader=False)
+
+    def leave(self):
+        """Drop membership and hand the lease over immediately (on shutdown)"""
+        self._stop.set()
+        try:
+            self._release(keys=[self.key("leader")], args=[self.replica])
+            self.redis.delete(self.key(f"member:{self.replica}"))
+            logger.info(f"Replica {self.replica} left the cluster")
+        except Exception as e:
+            logger.warning(f"Could not leave the cluster cleanly: {e}")
+
+    def owned(self, names: List[str]) -> List[str]:
+        ring = HashRing(cluster_state["members"] or [self.replica])
+        return [name for name in names if ring.owner(name) == self.replica]
+
+    # ------------------------------------------------------------------
+    # Shared state
+    # ------------------------------------------------------------------
+
+    def load(self, names: Optional[List[str]] = None) -> Dict[str, ServiceHealth]:
+        """Shared check results (all of them, or just `names`)"""
+        if names is None:
+            raw = self.redis.hgetall(self.key("state"))
+        else:
+            raw = dict(zip(names, self.redis.hmget(self.key("state"), names))) if names else {}
+        incidents = self.redis.hgetall(self.key("alerts"))
+        results = {}
+        for name, value in raw.items():
+            if value is None:
+                continue
+            name = name.decode() if isinstance(name, bytes) else name
+            data = json.loads(value)
+            data.pop("checked_by", None)
+            data["status"] = ServiceStatus(data["status"])
+            result = ServiceHealth(**data)
+            incident = incidents.get(name.encode())
+            if incident:
+                result.last_alert_time = json.loads(incident).get("last_alert_time")
+            results[name] = result
+        return results
+
+    def publish(self, results: Dict[str, ServiceHealth]):
+        if not results:
+            return
+        payload = {}
+        for name, result in results.items():
+            data = {k: v for k, v in result.__dict__.items() if k != "last_alert_time"}
+            data.update(status=result.status.value, checked_by=self.replica)
+            payload[name] = json.dumps(data)
+        self.redis.hset(self.key("state"), mapping=payload)
+
+    def merged(self, names: List[str]) -> Dict[str, ServiceHealth]:
+        """Every replica's latest results; checks whose owner went quiet show as unknown"""
+        stale_after = 3 * CONFIG["check_interval_seconds"] + CONFIG["cluster_lease_seconds"]
+        now = datetime.utcnow()
+        merged = {}
+        for name, result in self.load().items():
+            if name not in names:
+                continue
+            age = (now - datetime.fromisoformat(result.last_check)).total_seconds() if result.last_check else None
+            if age is None or age > stale_after:
+                result.status = ServiceStatus.UNKNOWN
+                result.error = f"No result for {age:.0f}s" if age is not None else "Not checked yet"
+            merged[name] = result
+        return merged
+
+    # ------------------------------------------------------------------
+    # Rounds
+    # ------------------------------------------------------------------
+
+    def run_round(self, checks: list):
+        """Run this replica's share of the checks, then alert if leader"""
+        names = [name for name, _ in checks]
+        mine = self.owned(names)
+        cluster_state["owned_checks"] = mine
+        previous = self.load(mine)
+        funcs = dict(checks)
+
+        def run(name):
+            try:
+                return run_check(name, funcs[name])
+            except Exception as e:
+                logger.error(f"Health check failed for {name}: {e}")
+                return ServiceHealth(name=name, status=ServiceStatus.UNKNOWN,
+                                     last_check=datetime.utcnow().isoformat(), error=str(e)[:200])
+
+        results = {}
+        if mine:
+            with ThreadPoolExecutor(max_workers=min(CONFIG["check_workers"], len(mine))) as pool:
+                # Each check carries the round's trace context into the pool
+                futures = [pool.submit(contextvars.copy_context().run, run, name) for name in mine]
+                for name, future in zip(mine, futures):
+                    result = future.result()
+                    track_failures(result, previous.get(name))
+                    results[name] = result
+        self.publish(results)
+
+        healthy = sum(1 for r in results.values() if r.status == ServiceStatus.HEALTHY)
+        logger.info(f"Health check complete: {healthy}/{len(results)} owned services healthy "
+                    f"({len(names)} checks across {len(cluster_state['members'])} replicas)")
+
+        if cluster_state["is_leader"]:
+            self.evaluate_alerts(names)
+
+    def evaluate_alerts(self, names: List[str]):
+        """
+        Leader only: open an incident (and alert) when a check reaches the
+        failure threshold, repeat the alert every ALERT_COOLDOWN while it
+        stays down, and announce recovery when it is healthy again. Open
+        incidents and their last alert time are kept in Redis so a new leader
+        doesn't repeat them early.
+        """
+        # Fencing: don't alert on a lease that expired while this round ran
+        if not self._renew(keys=[self.key("leader")], args=[self.replica, self.lease_ms]):
+            cluster_state["is_leader"] = False
+            return
+        merged = self.merged(names)
+        incidents = {k.decode(): json.loads(v) for k, v in self.redis.hgetall(self.key("alerts")).items()}
+        health_state.clear()
+        health_state.update(merged)  # send_alert reads cooldowns from here
+
+        for name, result in merged.items():
+            incident = incidents.get(name)
+            if incident is None and result.consecutive_failures >= CONFIG["consecutive_failures_threshold"]:
+                send_alert(name, result.status, result.error)
+                self.redis.hset(self.key("alerts"), name, json.dumps({
+                    "opened": datetime.utcnow().isoformat(),
+                    "last_alert_time": health_state[name].last_alert_time,
+                }))
+            elif incident is not None and result.status == ServiceStatus.HEALTHY:
+                send_recovery(name)
+                self.redis.hdel(self.key("alerts"), name)
+            elif incident is not None:
+                # Still down: send_alert skips it until the cooldown since the
+                # incident's last alert has passed
+                send_alert(name, result.status, result.error)
+                if health_state[name].last_alert_time != incident.get("last_alert_time"):
+                    incident["last_alert_time"] = health_state[name].last_alert_time
+                    self.redis.hset(self.key("alerts"), name, json.dumps(incident))
+
+        # Checks that were removed from the configuration
+        stored = {k.decode() for k in self.redis.hkeys(self.key("state"))}
+        removed = [n for n in stored | set(incidents) if n not in names]
+        if removed:
+            self.redis.hdel(self.key("state"), *removed)
+            self.redis.hdel(self.key("alerts"), *removed)
+
+
+_cluster: Optional[Cluster] = None
+
+
+def get_cluster() -> Cluster:
+    global _cluster
+    if _cluster is None:
+        _cluster = Cluster()
+    return _cluster
+
+
+def start():
+    """Join the cluster and keep heartbeating in the background"""
+    cluster = get_cluster()
+    try:
+        cluster.heartbeat()
+    except Exception as e:
+        logger.error(f"Cluster heartbeat failed: {e}")
+        cluster_state["redis_error"] = str(e)[:200]
+    threading.Thread(target=cluster.heartbeat_loop, daemon=True).start()
+    logger.info(f"Cluster mode: replica {cluster.replica}, lease {CONFIG['cluster_lease_seconds']}s")
+    return cluster
@@ -8,29 +8,26 @@ import os
 import sys
 import json
 import time
+import signal
+import socket
 import logging
+import importlib.util
 from datetime import datetime, timedelta
 from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from typing import Dict, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
 
-import requests
 import schedule
 
-# Optional imports with fallbacks
-try:
-    import redis
-    REDIS_AVAILABLE = True
-except ImportError:
-    REDIS_AVAILABLE = False
+import profiling
+import tracing
 
-try:
-    import psycopg2
-    POSTGRES_AVAILABLE = True
-except ImportError:
-    POSTGRES_AVAILABLE = False
+# Client libraries are imported by the checks that use them, so the HTTP
+# server is answering before they load; here we only check they are installed
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
+POSTGRES_AVAILABLE = importlib.util.find_spec("psycopg2") is not None
 
 
 # Configuration
@@ -55,6 +52,17 @@ CONFIG = {
     "check_interval_seconds": int(os.getenv("CHECK_INTERVAL", "60")),
     "alert_cooldown_minutes": int(os.getenv("ALERT_COOLDOWN", "15")),
     "consecutive_failures_threshold": int(os.getenv("FAILURE_THRESHOLD", "3")),
+    # Extra HTTP checks: "name=https://host/health,name2=..."
+    "http_targets": [
+        tuple(t.strip().split("=", 1)) for t in os.getenv("MONITOR_HTTP_TARGETS", "").split(",") if "=" in t
+    ],
+    "check_workers": int(os.getenv("CHECK_WORKERS", "8")),
+    
+    # Cluster mode: replicas share checks and alerting through Redis
+    "cluster_enabled": os.getenv("CLUSTER_MODE", "false").lower() == "true",
+    "replica_id": os.getenv("RAILWAY_REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}",
+    "cluster_prefix": os.getenv("CLUSTER_PREFIX", "health-monitor"),
+    "cluster_lease_seconds": float(os.getenv("CLUSTER_LEASE_SECONDS", "10")),
     
     # Alerting
     "alert_webhook_url": os.getenv("ALERT_WEBHOOK_URL", ""),
@@ -94,6 +102,7 @@ health_state: Dict[str, ServiceHealth] = {}
 
 def send_alert(service: str, status: ServiceStatus, error: Optional[str] = None):
     """Send alert via webhook or PagerDuty"""
+    import requests
     
     # Check cooldown
     if service in health_state:
@@ -167,8 +176,21 @@ def send_alert(service: str, status: ServiceStatus, error: Optional[str] = None)
         health_state[service].last_alert_time = datetime.utcnow().isoformat()
 
 
+def send_recovery(service: str):
+    """Announce that a service is healthy again"""
+    if CONFIG["alert_webhook_url"]:
+        try:
+            import requests
+            message = f"✅ Service Recovered: {service} is now healthy"
+            requests.post(CONFIG["alert_webhook_url"], json={"text": message}, timeout=10)
+        except:
+            pass
+
+
 def check_http_endpoint(name: str, url: str, path: str = "/health") -> ServiceHealth:
     """Check HTTP endpoint health"""
+    import requests
+    
     full_url = f"{url}{path}"
     start_time = time.time()
     
@@ -226,6 +248,8 @@ def check_postgres() -> ServiceHealth:
             error="PostgreSQL check not configured"
         )
     
+    import psycopg2
+    
     start_time = time.time()
     try:
         conn = psycopg2.connect(CONFIG["postgres_url"], connect_timeout=10)
@@ -260,6 +284,8 @@ def check_redis() -> ServiceHealth:
             error="Redis check not configured"
         )
     
+    import redis
+    
     start_time = time.time()
     try:
         r = redis.Redis(
@@ -297,6 +323,8 @@ def check_clickhouse() -> ServiceHealth:
             error="ClickHouse check not configured"
         )
     
+    import requests
+    
     start_time = time.time()
     try:
         response = requests.get(
@@ -328,10 +356,8 @@ def check_clickhouse() -> ServiceHealth:
         )
 
 
-def run_health_checks():
-    """Run all health checks"""
-    global health_state
-    
+def build_checks() -> list:
+    """(name, check function) for every service and configured extra target"""
     checks = [
         ("litellm", lambda: check_http_endpoint("litellm", CONFIG["litellm_url"], "/health")),
         ("langfuse-web", lambda: check_http_endpoint("langfuse-web", CONFIG["langfuse_url"], "/api/public/health")),
@@ -340,19 +366,60 @@ def run_health_checks():
         ("redis", check_redis),
         ("clickhouse", check_clickhouse),
     ]
+    for name, url in CONFIG["http_targets"]:
+        checks.append((name, lambda name=name, url=url: check_http_endpoint(name, url, "")))
+    return checks
+
+
+def track_failures(result: ServiceHealth, previous: Optional[ServiceHealth]):
+    """Carry the failure count and alert time over from the previous result"""
+    if previous:
+        if result.status == ServiceStatus.UNHEALTHY:
+            result.consecutive_failures = previous.consecutive_failures + 1
+        else:
+            result.consecutive_failures = 0
+        result.last_alert_time = previous.last_alert_time
+
+
+def run_check(name: str, check_func) -> ServiceHealth:
+    """Run one check inside a span that records its outcome"""
+    with tracing.span("health.check", **{"health.service": name}) as span:
+        result = check_func()
+        tracing.set_attributes(span, **{
+            "health.status": result.status.value,
+            "health.response_time_ms": result.response_time_ms,
+            "health.error": result.error,
+        })
+        return result
+
+
+def run_health_checks():
+    """Run all health checks"""
+    checks = build_checks()
+    with tracing.span("health.round", **{"health.checks": len(checks),
+                                         "health.replica": CONFIG["replica_id"]}):
+        _run_health_checks(checks)
+
+
+def _run_health_checks(checks: list):
+    global health_state
+    
+    if CONFIG["cluster_enabled"]:
+        import cluster
+        if cluster.cluster_state["redis_error"] is None:
+            try:
+                cluster.get_cluster().run_round(checks)
+                return
+            except Exception as e:
+                logger.error(f"Cluster round failed, checking everything locally: {e}")
     
     for name, check_func in checks:
         try:
-            result = check_func()
+            result = run_check(name, check_func)
             
             # Track consecutive failures
             previous = health_state.get(name)
-            if previous:
-                if result.status == ServiceStatus.UNHEALTHY:
-                    result.consecutive_failures = previous.consecutive_failures + 1
-                else:
-                    result.consecutive_failures = 0
-                result.last_alert_time = previous.last_alert_time
+            track_failures(result, previous)
             
             # Send alert if threshold reached
             if result.consecutive_failures >= CONFIG["consecutive_failures_threshold"]:
@@ -361,12 +428,7 @@ def run_health_checks():
             
             # Send recovery alert
             if previous and previous.status == ServiceStatus.UNHEALTHY and result.status == ServiceStatus.HEALTHY:
-                if CONFIG["alert_webhook_url"]:
-                    try:
-                        message = f"✅ Service Recovered: {name} is now healthy"
-                        requests.post(CONFIG["alert_webhook_url"], json={"text": message}, timeout=10)
-                    except:
-                        pass
+                send_recovery(name)
             
             health_state[name] = result
             logger.debug(f"Health check {name}: {result.status.value}")
@@ -386,12 +448,24 @@ def run_health_checks():
     logger.info(f"Health check complete: {healthy}/{total} services healthy")
 
 
-def get_overall_status() -> ServiceStatus:
+def current_state() -> Dict[str, ServiceHealth]:
+    """This replica's results, or the merged view of all replicas in cluster mode"""
+    if CONFIG["cluster_enabled"]:
+        import cluster
+        try:
+            return cluster.get_cluster().merged([name for name, _ in build_checks()])
+        except Exception as e:
+            logger.warning(f"Serving local health state, cluster state unavailable: {e}")
+    return health_state
+
+
+def get_overall_status(state: Optional[Dict[str, ServiceHealth]] = None) -> ServiceStatus:
     """Calculate overall system status"""
-    if not health_state:
+    state = health_state if state is None else state
+    if not state:
         return ServiceStatus.UNKNOWN
     
-    statuses = [h.status for h in health_state.values()]
+    statuses = [h.status for h in state.values()]
     
     if all(s == ServiceStatus.HEALTHY for s in statuses):
         return ServiceStatus.HEALTHY
@@ -408,7 +482,8 @@ class HealthHandler(BaseHTTPRequestHandler):
     
     def do_GET(self):
         if self.path == "/health" or self.path == "/":
-            overall = get_overall_status()
+            state = current_state()
+            overall = get_overall_status(state)
             status_code = 200 if overall == ServiceStatus.HEALTHY else 503
             
             self.send_response(status_code)
@@ -426,31 +501,43 @@ class HealthHandler(BaseHTTPRequestHandler):
                         "error": h.error,
                         "consecutive_failures": h.consecutive_failures
                     }
-                    for name, h in health_state.items()
+                    for name, h in state.items()
                 }
             }
+            if CONFIG["cluster_enabled"]:
+                import cluster
+                response["cluster"] = cluster.cluster_state
             self.wfile.write(json.dumps(response, indent=2).encode())
             
+        elif self.path == "/ready":
+            # Deploy healthcheck: answers as soon as the server is listening,
+            # whatever the state of the monitored services
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "ready"}).encode())
+            
         elif self.path == "/metrics":
             # Prometheus-compatible metrics
             self.send_response(200)
             self.send_header("Content-Type", "text/plain")
             self.end_headers()
             
+            state = current_state()
             lines = []
             lines.append("# HELP service_health Service health status (1=healthy, 0=unhealthy)")
             lines.append("# TYPE service_health gauge")
-            for name, h in health_state.items():
+            for name, h in state.items():
                 value = 1 if h.status == ServiceStatus.HEALTHY else 0
                 lines.append(f'service_health{{service="{name}"}} {value}')
             
             lines.append("# HELP service_response_time_ms Service response time in milliseconds")
             lines.append("# TYPE service_response_time_ms gauge")
-            for name, h in health_state.items():
+            for name, h in state.items():
                 if h.response_time_ms is not None:
                     lines.append(f'service_response_time_ms{{service="{name}"}} {h.response_time_ms}')
             
-            self.wfile.write("\n".join(lines).encode())
+            self.wfile.write(("\n".join(lines) + "\n" + tracing.render_metrics("monitor")).encode())
             
         elif self.path == "/check":
             # Trigger immediate health check
@@ -460,6 +547,10 @@ class HealthHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"status": "check_triggered"}).encode())
             
+        elif self.path.startswith("/debug/"):
+            # Profiling endpoints; 404 unless DEBUG_TOKEN is set and supplied
+            profiling.handle(self)
+            
         else:
             self.send_response(404)
             self.end_headers()
@@ -471,7 +562,8 @@ class HealthHandler(BaseHTTPRequestHandler):
 def run_http_server():
     """Run HTTP server for health API"""
     port = int(os.getenv("PORT", "8080"))
-    server = HTTPServer(("0.0.0.0", port), HealthHandler)
+    # Threaded so a running /debug/profile doesn't hold up /health
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthHandler)
     logger.info(f"Health monitor API running on port {port}")
     server.serve_forever()
 
@@ -486,6 +578,19 @@ def main():
     # Start HTTP server in background
     Thread(target=run_http_server, daemon=True).start()
     
+    tracing.setup("health-monitor")
+    
+    if CONFIG["cluster_enabled"]:
+        import cluster
+        member = cluster.start()
+        
+        def shutdown(signum, frame):
+            member.leave()
+            sys.exit(0)
+        
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+    
     # Run initial check
     run_health_checks()
     
@@ -498,4 +603,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # cluster.py imports this module by name; share one copy of its state
+    sys.modules.setdefault("monitor", sys.modules[__name__])
     main()
@@ -0,0 +1,200 @@
+"""
+On-demand profiling endpoints for the service's HTTP server.
+
+    GET /debug/profile?seconds=30&hz=100   sampling CPU profile, collapsed stacks
+    GET /debug/memory?action=start         start tracemalloc and take a baseline
+    GET /debug/memory?limit=25             top allocators and growth since the last call
+    GET /debug/memory?since=baseline       growth since tracing started
+    GET /debug/memory?action=stop          stop tracemalloc and drop the snapshots
+
+The endpoints are off unless DEBUG_TOKEN is set, and every request must
+carry it as `Authorization: Bearer <token>` (never in the URL, which ends up
+in proxy and access logs); otherwise they answer 404. Nothing runs between
+requests: the sampler runs inside the request that asked for a profile, and
+tracemalloc (which slows allocation-heavy code noticeably) only traces
+between `start` and `stop`.
+
+The profile is in the collapsed-stack format read by flamegraph.pl,
+speedscope and inferno:
+
+    curl -H "Authorization: Bearer $DEBUG_TOKEN" "$URL/debug/profile?seconds=30" > cpu.folded
+    flamegraph.pl cpu.folded > cpu.svg
+
+This file is kept identical in backup-service and health-monitor, which
+build from separate directories.
+"""
+
+import os
+import sys
+import hmac
+import json
+import math
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+MAX_PROFILE_SECONDS = 300
+MAX_HZ = 1000
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_snapshots = {"baseline": None, "last": None}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, hz: float, exclude: Optional[set] = None) -> tuple:
+    """
+    Sample every thread's Python stack `hz` times a second for `seconds`.
+
+    Returns (collapsed stack -> samples, sampling seconds spent), with each
+    stack rooted at its thread name. Threads in `exclude` (by ident) are skipped.
+    """
+    exclude = set(exclude or ()) | {threading.get_ident()}
+    names = {}
+    counts = Counter()
+    interval = 1 / hz
+    busy = 0.0
+    deadline = time.monotonic() + seconds
+    while True:
+        started = time.monotonic()
+        if started >= deadline:
+            break
+        for ident, frame in sys._current_frames().items():
+            if ident in exclude:
+                continue
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(stack))] += 1
+        elapsed = time.monotonic() - started
+        busy += elapsed
+        time.sleep(max(0.0, interval - elapsed))
+    return counts, busy
+
+
+def render_collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def memory_report(limit: int = 25, group: str = "lineno", since: str = "last") -> dict:
+    """Top allocators now, and the biggest growth since the baseline or the previous report"""
+    rss_kb = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+    except OSError:
+        pass
+    report = {"rss_mb": round(rss_kb / 1024, 1) if rss_kb else None, "tracing": tracemalloc.is_tracing()}
+    if not tracemalloc.is_tracing():
+        report["hint"] = "Start tracing with ?action=start"
+        return report
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    report.update(traced_mb=round(current / 2 ** 20, 2), peak_mb=round(peak / 2 ** 20, 2))
+    report["top"] = [
+        {"where": str(stat.traceback), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics(group)[:limit]
+    ]
+    previous = _snapshots[since] or _snapshots["baseline"]
+    if previous is not None:
+        report["growth_since"] = since
+        report["growth"] = [
+            {"where": str(stat.traceback), "size_diff_kb": round(stat.size_diff / 1024, 1),
+             "count_diff": stat.count_diff}
+            for stat in snapshot.compare_to(previous, group)[:limit]
+            if stat.size_diff
+        ]
+    _snapshots["last"] = snapshot
+    return report
+
+
+def _send(handler, status: int, body, content_type: str = "application/json", headers: Optional[dict] = None):
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    if body is not None:
+        handler.wfile.write(body if isinstance(body, bytes) else json.dumps(body, indent=2).encode())
+
+
+def _authorized(handler) -> bool:
+    scheme, _, supplied = handler.headers.get("Authorization", "").partition(" ")
+    return bool(DEBUG_TOKEN) and scheme == "Bearer" and hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+
+def handle(handler):
+    """Serve a /debug/* request on a BaseHTTPRequestHandler"""
+    url = urlsplit(handler.path)
+    query = parse_qs(url.query)
+    if not _authorized(handler):
+        # Indistinguishable from a service without the endpoints
+        _send(handler, 404, None)
+        return
+
+    try:
+        if url.path == "/debug/profile":
+            seconds = float(query.get("seconds", ["30"])[0])
+            hz = float(query.get("hz", ["100"])[0])
+            # nan passes every comparison, and a nan deadline never arrives
+            if not (math.isfinite(seconds) and math.isfinite(hz)) or seconds <= 0 or hz <= 0:
+                raise ValueError("seconds and hz must be positive numbers")
+            seconds, hz = min(seconds, MAX_PROFILE_SECONDS), min(hz, MAX_HZ)
+            if not _profile_lock.acquire(blocking=False):
+                _send(handler, 409, {"error": "A profile is already running"})
+                return
+            try:
+                counts, busy = sample_stacks(seconds, hz)
+            finally:
+                _profile_lock.release()
+            _send(handler, 200, render_collapsed(counts).encode(), "text/plain", {
+                "Content-Disposition": f'attachment; filename="profile-{int(time.time())}.folded"',
+                "X-Profile-Samples": str(sum(counts.values())),
+                # Share of one core the sampler itself used
+                "X-Profile-Overhead-Percent": f"{busy / seconds * 100:.2f}",
+            })
+
+        elif url.path == "/debug/memory":
+            action = query.get("action", [""])[0]
+            limit = int(query.get("limit", ["25"])[0])
+            group = query.get("group", ["lineno"])[0]
+            since = query.get("since", ["last"])[0]
+            if group not in ("lineno", "filename", "traceback") or since not in ("last", "baseline"):
+                raise ValueError("group is lineno|filename|traceback, since is last|baseline")
+            with _memory_lock:
+                if action == "start":
+                    if not tracemalloc.is_tracing():
+                        tracemalloc.start(int(query.get("frames", ["10"])[0]))
+                    _snapshots["baseline"] = _snapshots["last"] = tracemalloc.take_snapshot()
+                    _send(handler, 200, {"tracing": True, "frames": tracemalloc.get_traceback_limit()})
+                elif action == "stop":
+                    tracemalloc.stop()
+                    _snapshots.update(baseline=None, last=None)
+                    _send(handler, 200, {"tracing": False})
+                elif action:
+                    raise ValueError(f"Unknown action: {action}")
+                else:
+                    _send(handler, 200, memory_report(limit, group, since))
+
+        else:
+            _send(handler, 404, None)
+    except ValueError as e:
+        _send(handler, 400, {"error": str(e)})
@@ -0,0 +1,214 @@
+"""
+OpenTelemetry spans for the service's own work.
+
+Spans go to any OTLP/HTTP endpoint (OTEL_EXPORTER_OTLP_ENDPOINT and the other
+standard OTEL_* variables), or to Langfuse's OTLP endpoint when
+LANGFUSE_PUBLIC_KEY and LANGFUSE_SECRET_KEY are set, so backup runs and
+health rounds show up as trace timelines next to the LLM traces. Set
+TRACING_ENABLED=false to turn it off; without an endpoint or the
+opentelemetry packages, span() is a no-op.
+
+Export is batched on a background thread (BatchSpanProcessor) with a bounded
+queue, so a slow or unreachable collector drops spans rather than slowing the
+service. The time spans cost on the calling threads and the exporter's own
+time are counted and rendered on /metrics.
+
+Work handed to thread pools keeps its parent span when submitted through
+contextvars.copy_context().run.
+
+This file is kept identical in backup-service and health-monitor, which
+build from separate directories.
+"""
+
+import os
+import time
+import atexit
+import base64
+import logging
+import importlib.util
+from contextlib import contextmanager
+from threading import Lock
+
+# The SDK takes a noticeable share of startup to import, so it is only
+# loaded by setup() once tracing is known to be wanted
+OTEL_AVAILABLE = importlib.util.find_spec("opentelemetry.sdk") is not None
+otel_context = trace = Status = StatusCode = SpanExportResult = None
+
+logger = logging.getLogger(__name__)
+
+# BatchSpanProcessor limits: at most this many spans wait in memory
+MAX_QUEUE_SIZE = int(os.getenv("TRACING_MAX_QUEUE_SIZE", "2048"))
+EXPORT_BATCH_SIZE = 512
+EXPORT_DELAY_MS = int(os.getenv("TRACING_EXPORT_DELAY_MS", "5000"))
+EXPORT_TIMEOUT_MS = 10000
+
+_tracer = None
+_provider = None
+_stats_lock = Lock()
+tracing_stats = {
+    "enabled": False,
+    "exporter": None,
+    "spans": 0,
+    "record_seconds": 0.0,     # Time spent starting and ending spans on the instrumented threads
+    "export_batches": 0,
+    "exported_spans": 0,
+    "failed_spans": 0,
+    "export_seconds": 0.0,     # Time the background exporter spent sending
+}
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _MeasuredExporter:
+    """Counts what the wrapped SpanExporter sends and how long it takes"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def export(self, spans):
+        started = time.perf_counter()
+        try:
+            result = self.inner.export(spans)
+        except Exception as e:
+            logger.warning(f"Span export failed: {e}")
+            result = SpanExportResult.FAILURE
+        with _stats_lock:
+            tracing_stats["export_batches"] += 1
+            tracing_stats["export_seconds"] += time.perf_counter() - started
+            key = "exported_spans" if result == SpanExportResult.SUCCESS else "failed_spans"
+            tracing_stats[key] += len(spans)
+        return result
+
+    def shutdown(self):
+        self.inner.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.inner.force_flush(timeout_millis)
+
+
+def _exporter():
+    """OTLP exporter from the OTEL_* variables, else Langfuse's OTLP endpoint"""
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"):
+        return OTLPSpanExporter(timeout=EXPORT_TIMEOUT_MS / 1000), "otlp"
+    public_key = os.getenv("LANGFUSE_PUBLIC_KEY", "")
+    secret_key = os.getenv("LANGFUSE_SECRET_KEY", "")
+    host = os.getenv("LANGFUSE_HOST") or os.getenv("LANGFUSE_URL", "")
+    if public_key and secret_key and host:
+        auth = base64.b64encode(f"{public_key}:{secret_key}".encode()).decode()
+        return OTLPSpanExporter(
+            endpoint=f"{host.rstrip('/')}/api/public/otel/v1/traces",
+            headers={"Authorization": f"Basic {auth}"},
+            timeout=EXPORT_TIMEOUT_MS / 1000,
+        ), "langfuse"
+    return None, None
+
+
+def setup(service_name: str):
+    """Start exporting spans if tracing is enabled and an endpoint is configured"""
+    global _tracer, _provider, otel_context, trace, Status, StatusCode, SpanExportResult
+    if os.getenv("TRACING_ENABLED", "true").lower() != "true" or not OTEL_AVAILABLE:
+        return
+    from opentelemetry import context as otel_context, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExportResult
+    from opentelemetry.trace import Status, StatusCode
+    
+    exporter, kind = _exporter()
+    if exporter is None:
+        return
+    _provider = TracerProvider(resource=Resource.create({
+        "service.name": os.getenv("OTEL_SERVICE_NAME", service_name),
+        "service.instance.id": os.getenv("RAILWAY_REPLICA_ID", os.getenv("HOSTNAME", "")),
+    }))
+    _provider.add_span_processor(BatchSpanProcessor(
+        _MeasuredExporter(exporter),
+        max_queue_size=MAX_QUEUE_SIZE,
+        max_export_batch_size=EXPORT_BATCH_SIZE,
+        schedule_delay_millis=EXPORT_DELAY_MS,
+        export_timeout_millis=EXPORT_TIMEOUT_MS,
+    ))
+    _tracer = _provider.get_tracer(service_name)
+    atexit.register(shutdown)
+    tracing_stats.update(enabled=True, exporter=kind)
+    logger.info(f"Tracing enabled: exporting spans to {kind}")
+
+
+def shutdown(timeout_ms: int = 5000):
+    """Flush queued spans (on exit)"""
+    if _provider is not None:
+        _provider.force_flush(timeout_ms)
+        _provider.shutdown()
+
+
+def _attributes(attributes: dict) -> dict:
+    return {k: v for k, v in attributes.items() if v is not None and v != ""}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Record the enclosed block as a span, a child of the current one.
+
+    Yields an object with set_attribute/set_attributes; an exception marks the
+    span as an error and propagates.
+    """
+    if _tracer is None:
+        yield _NOOP
+        return
+    started = time.perf_counter()
+    current = _tracer.start_span(name, attributes=_attributes(attributes))
+    token = otel_context.attach(trace.set_span_in_context(current))
+    recorded = time.perf_counter() - started
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        current.set_status(Status(StatusCode.ERROR, str(e)[:200]))
+        raise
+    finally:
+        ending = time.perf_counter()
+        otel_context.detach(token)
+        current.end()
+        with _stats_lock:
+            tracing_stats["spans"] += 1
+            tracing_stats["record_seconds"] += recorded + time.perf_counter() - ending
+
+
+def set_attributes(target, **attributes):
+    """Set attributes on a span from span(), skipping empty values"""
+    target.set_attributes(_attributes(attributes))
+
+
+def render_metrics(prefix: str) -> str:
+    """Prometheus lines for the tracing overhead counters"""
+    if not tracing_stats["enabled"]:
+        return ""
+    with _stats_lock:
+        stats = dict(tracing_stats)
+    lines = []
+    for key, help_text in (
+        ("spans", "Spans recorded"),
+        ("record_seconds", "Seconds spent starting and ending spans on instrumented threads"),
+        ("export_batches", "Span batches sent"),
+        ("exported_spans", "Spans exported successfully"),
+        ("failed_spans", "Spans dropped by failed exports"),
+        ("export_seconds", "Seconds the background exporter spent sending"),
+    ):
+        name = f"{prefix}_tracing_{key}_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        value = stats[key]
+        lines.append(f"{name} {round(value, 6) if isinstance(value, float) else value}")
+    return "\n".join(lines) + "\n"
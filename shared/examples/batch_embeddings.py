@@ -0,0 +1,311 @@
+"""
+LiteLLM Batch Embeddings
+
+Embed large corpora through the LiteLLM gateway: texts stream in from any
+iterator, are packed into requests up to item and token limits, sent
+concurrently, and come back in input order as one float32 NumPy array.
+An on-disk cache keyed by (model, text hash) means re-runs only embed text
+that hasn't been seen before.
+
+Usage:
+    pip install "openai[aiohttp]" numpy
+    export LITELLM_URL=https://your-litellm.up.railway.app
+    export LITELLM_API_KEY=sk-your-key
+
+    python batch_embeddings.py docs.txt --model text-embedding-3-small --out vectors.npy
+
+    # Against the bundled mock provider
+    python batch_embeddings.py --mock --count 20000
+"""
+
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from async_integration import GatewayClient, _start_mock, create_async_client
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.expanduser("~/.cache/litellm-embeddings"))
+
+# OpenAI accepts up to 2048 inputs and ~300k tokens per embeddings request;
+# smaller requests spread better across concurrent connections
+MAX_ITEMS_PER_REQUEST = 256
+MAX_TOKENS_PER_REQUEST = 64_000
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise ~4 characters per token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def text_key(text: str) -> bytes:
+    """16-byte cache key for a text (the model is part of the cache path)."""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+# ============================================================================
+# On-Disk Cache
+# ============================================================================
+
+class EmbeddingCache:
+    """
+    Append-only embedding cache for one model.
+
+    Vectors live in a raw float32 file read through a memory map, so lookups
+    don't load the cache into memory; keys live in a sidecar file of 16-byte
+    text hashes in the same row order, loaded into a dict on open. A crash
+    mid-append can leave one file longer than the other; opening truncates
+    both to the rows they have in common, so only that append is lost.
+    """
+
+    def __init__(self, model: str, cache_dir: str = CACHE_DIR):
+        slug = hashlib.sha1(model.encode()).hexdigest()[:12]
+        self.path = os.path.join(cache_dir, f"{model.replace('/', '_')}-{slug}")
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.keys_path = os.path.join(self.path, "keys.bin")
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.dim = None
+        self.rows: Dict[bytes, int] = {}
+        self._vectors = None  # Memory map, reopened when the file grows
+        self._mapped_rows = 0
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+            keys = b""
+            if os.path.exists(self.keys_path):
+                with open(self.keys_path, "rb") as f:
+                    keys = f.read()
+            vector_rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+            aligned = min(len(keys) // 16, vector_rows)
+            # Later appends go at row len(self.rows), so drop rows only one file has
+            for path, size in ((self.keys_path, aligned * 16), (self.vectors_path, aligned * 4 * self.dim)):
+                if os.path.exists(path) and os.path.getsize(path) != size:
+                    os.truncate(path, size)
+            for row in range(aligned):
+                self.rows[keys[row * 16:(row + 1) * 16]] = row
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if row >= self._mapped_rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                      shape=(len(self.rows), self.dim))
+            self._mapped_rows = len(self.rows)
+        return self._vectors[row]
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Append vectors (one row per key) that aren't cached yet."""
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": self.dim}, f)
+        new = [i for i, key in enumerate(keys) if key not in self.rows]
+        if not new:
+            return
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors[new], dtype=np.float32).tobytes())
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(keys[i] for i in new))
+        for i in new:
+            self.rows[keys[i]] = len(self.rows)
+
+
+# ============================================================================
+# Pipeline
+# ============================================================================
+
+def _decode(embedding) -> np.ndarray:
+    """Embeddings arrive as base64 float32 when the gateway honours encoding_format"""
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+    return np.asarray(embedding, dtype=np.float32)
+
+
+async def embed_texts(texts: Iterable[str], model: str, gateway: GatewayClient,
+                      cache: Optional[EmbeddingCache] = None,
+                      max_items: int = MAX_ITEMS_PER_REQUEST,
+                      max_tokens: int = MAX_TOKENS_PER_REQUEST,
+                      dimensions: Optional[int] = None,
+                      stats: Optional[dict] = None) -> np.ndarray:
+    """
+    Embed every text and return an (n, dim) float32 array in input order.
+
+    Cached texts and repeats within the run are not sent again. At most about
+    two batches per concurrent request are held in memory, so the input can
+    be a generator over a large file. Pass a dict as stats to get text,
+    request and token counts back.
+    """
+    out = None
+    filled = 0
+    waiting: Dict[bytes, List[int]] = {}  # Text hash -> output rows awaiting it
+    batch: List[tuple] = []
+    batch_tokens = 0
+    in_flight = set()
+    stats = stats if stats is not None else {}
+    stats.update(texts=0, requests=0, tokens=0)
+
+    def place(rows: List[int], vector: np.ndarray):
+        nonlocal out
+        if out is None:
+            out = np.empty((max(1024, max(rows) + 1), vector.shape[0]), dtype=np.float32)
+        needed = max(rows) + 1
+        if needed > out.shape[0]:
+            # Amortised doubling; the final array is trimmed to size
+            grown = np.empty((max(needed, out.shape[0] * 2), out.shape[1]), dtype=np.float32)
+            grown[:out.shape[0]] = out
+            out = grown
+        out[rows] = vector
+
+    async def send(items: List[tuple]):
+        kwargs = {"encoding_format": "base64"}
+        if dimensions:
+            kwargs["dimensions"] = dimensions
+        response = await gateway.embed(model=model, input=[text for _, text in items], **kwargs)
+        vectors = np.stack([_decode(d.embedding) for d in sorted(response.data, key=lambda d: d.index)])
+        stats["requests"] += 1
+        stats["tokens"] += getattr(response.usage, "prompt_tokens", 0) or 0
+        keys = [key for key, _ in items]
+        if cache is not None:
+            cache.put_many(keys, vectors)
+        for key, vector in zip(keys, vectors):
+            place(waiting.pop(key), vector)
+
+    async def flush():
+        nonlocal batch, batch_tokens
+        if not batch:
+            return
+        in_flight.add(asyncio.create_task(send(batch)))
+        batch, batch_tokens = [], 0
+        if len(in_flight) >= 2 * gateway.concurrency:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.difference_update(done)
+            for task in done:
+                task.result()
+
+    for row, text in enumerate(texts):
+        stats["texts"] += 1
+        filled = row + 1
+        key = text_key(text)
+        if key in waiting:
+            waiting[key].append(row)  # Same text already queued in this run
+            continue
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            place([row], cached)
+            continue
+        waiting[key] = [row]
+        tokens = count_tokens(text)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            await flush()
+        batch.append((key, text))
+        batch_tokens += tokens
+
+    await flush()
+    if in_flight:
+        for task in await asyncio.gather(*in_flight, return_exceptions=True):
+            if isinstance(task, Exception):
+                raise task
+
+    if out is None:
+        return np.empty((0, cache.dim if cache and cache.dim else 0), dtype=np.float32)
+    return out[:filled]
+
+
+# ============================================================================
+# Main
+# ============================================================================
+
+def _read_lines(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line:
+                yield line
+
+
+async def _run(args, base_url: str, api_key: str) -> np.ndarray:
+    gateway = GatewayClient(create_async_client(base_url, api_key, max_connections=args.concurrency),
+                            concurrency=args.concurrency)
+    cache = None if args.no_cache else EmbeddingCache(args.model, args.cache_dir)
+    if args.mock:
+        texts = (f"Document {i % (args.count // 2 or 1)}: embeddings through the gateway"
+                 for i in range(args.count))
+    else:
+        texts = _read_lines(args.input)
+    try:
+        stats = {}
+        started = time.perf_counter()
+        vectors = await embed_texts(texts, args.model, gateway, cache, max_items=args.max_items,
+                                    max_tokens=args.max_tokens, stats=stats)
+        elapsed = time.perf_counter() - started
+    finally:
+        await gateway.aclose()
+
+    print(f"Embedded {stats['texts']} texts in {elapsed:.1f}s ({stats['texts'] / elapsed:.0f} texts/s), "
+          f"{stats['requests']} requests, shape {vectors.shape}")
+    if cache is not None:
+        print(f"Cache: {cache.hits} hits, {len(cache)} entries in {cache.path}")
+    return vectors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed a text file through LiteLLM")
+    parser.add_argument("input", nargs="?", help="Text file, one document per line")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--out", help="Write the vectors to this .npy file")
+    parser.add_argument("--concurrency", type=int, default=8, help="Embedding requests in flight")
+    parser.add_argument("--max-items", type=int, default=MAX_ITEMS_PER_REQUEST)
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS_PER_REQUEST)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--mock", action="store_true", help="Run against the bundled mock provider")
+    parser.add_argument("--count", type=int, default=10000, help="Synthetic texts to embed with --mock")
+    args = parser.parse_args()
+
+    if args.mock:
+        args.model = "mock-embedding"
+        process, url = _start_mock(latency_ms=50, error_rate_429=0)
+        try:
+            vectors = asyncio.run(_run(args, url, "mock"))
+        finally:
+            process.terminate()
+    elif not args.input:
+        parser.error("input file required (or --mock)")
+    else:
+        vectors = asyncio.run(_run(
+            args, os.getenv("LITELLM_URL", "https://your-litellm.up.railway.app"),
+            os.getenv("LITELLM_API_KEY", "sk-your-master-key")
+        ))
+
+    if args.out:
+        np.save(args.out, vectors)
+        print(f"Saved {args.out}")
@@ -5,6 +5,14 @@ This file demonstrates how to use the LiteLLM gateway with automatic Langfuse tr
 """
 
 import os
+import re
+import math
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 from openai import OpenAI
 
 
@@ -40,23 +48,147 @@ def basic_completion():
 
 def streaming_completion():
     """Streaming completion - also traced in Langfuse."""
-    stream = client.chat.completions.create(
+    stream = StreamConsumer.open(
+        client,
         model="claude-sonnet",
         messages=[
             {"role": "user", "content": "Write a haiku about programming."}
-        ],
-        stream=True
+        ]
     )
-    
-    full_response = ""
-    for chunk in stream:
-        if chunk.choices[0].delta.content:
-            content = chunk.choices[0].delta.content
-            print(content, end="", flush=True)
-            full_response += content
-    
+
+    for content in stream:
+        print(content, end="", flush=True)
+
     print()  # Newline after streaming
-    return full_response
+    print(f"Timings: {stream.timings()}")
+    return stream.text
+
+
+# ============================================================================
+# Streaming Consumer with Timings
+# ============================================================================
+
+def _percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class StreamConsumer:
+    """
+    Consume a streamed chat completion and measure it.
+
+    Iterate with `for` (OpenAI client) or `async for` (AsyncOpenAI) to get
+    content deltas as they arrive, or call collect() / acollect(). Deltas are
+    kept in a list and joined once, so long outputs stay linear rather than
+    re-copying the reply on every chunk.
+
+    timings() reports time to first token, inter-token latency percentiles
+    and output tokens per second. Timings are only known once the stream
+    ends, so they can't ride on the request they measure; pass the consumer
+    as timings_from= to the next request in the conversation and they are
+    sent as Langfuse metadata via extra_body.
+    """
+
+    def __init__(self, stream, started: Optional[float] = None):
+        self.stream = stream
+        self.started = started if started is not None else time.perf_counter()
+        self.parts: List[str] = []
+        self.arrivals: List[float] = []  # perf_counter() of each content chunk
+        self.finished = None
+        self.finish_reason = None
+        self.usage = None
+        self._text = None
+
+    @staticmethod
+    def _request(kwargs: dict, timings_from: Optional["StreamConsumer"]) -> dict:
+        kwargs = dict(kwargs, stream=True)
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        if timings_from is not None:
+            extra_body = dict(kwargs.get("extra_body") or {})
+            extra_body["metadata"] = {**extra_body.get("metadata", {}), **timings_from.metadata()}
+            kwargs["extra_body"] = extra_body
+        return kwargs
+
+    @classmethod
+    def open(cls, client: OpenAI, timings_from: Optional["StreamConsumer"] = None, **kwargs) -> "StreamConsumer":
+        """Start a streamed chat completion; the clock starts before the request is sent."""
+        started = time.perf_counter()
+        return cls(client.chat.completions.create(**cls._request(kwargs, timings_from)), started)
+
+    @classmethod
+    async def aopen(cls, client, timings_from: Optional["StreamConsumer"] = None, **kwargs) -> "StreamConsumer":
+        """open() for an AsyncOpenAI client"""
+        started = time.perf_counter()
+        return cls(await client.chat.completions.create(**cls._request(kwargs, timings_from)), started)
+
+    def _observe(self, chunk) -> Optional[str]:
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return None  # The usage-only chunk that ends an include_usage stream
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        content = choice.delta.content if choice.delta else None
+        if content:
+            self.arrivals.append(time.perf_counter())
+            self.parts.append(content)
+            self._text = None
+        return content
+
+    def __iter__(self):
+        for chunk in self.stream:
+            content = self._observe(chunk)
+            if content:
+                yield content
+        self.finished = time.perf_counter()
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            content = self._observe(chunk)
+            if content:
+                yield content
+        self.finished = time.perf_counter()
+
+    def collect(self) -> str:
+        for _ in self:
+            pass
+        return self.text
+
+    async def acollect(self) -> str:
+        async for _ in self:
+            pass
+        return self.text
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self.parts)
+        return self._text
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """Millisecond timings and output tokens/s (tokens from usage, else one per chunk)"""
+        end = self.finished or time.perf_counter()
+        tokens = self.usage.completion_tokens if self.usage is not None else len(self.arrivals)
+        result = {"ttft_ms": None, "itl_p50_ms": None, "itl_p95_ms": None, "itl_p99_ms": None,
+                  "total_ms": round((end - self.started) * 1000, 1), "output_tokens": tokens,
+                  "tokens_per_second": None}
+        if not self.arrivals:
+            return result
+        result["ttft_ms"] = round((self.arrivals[0] - self.started) * 1000, 1)
+        gaps = sorted(b - a for a, b in zip(self.arrivals, self.arrivals[1:]))
+        if gaps:
+            for p in (50, 95, 99):
+                result[f"itl_p{p}_ms"] = round(_percentile(gaps, p) * 1000, 1)
+        generating = end - self.arrivals[0]
+        if generating > 0 and tokens > 1:
+            # Decode rate after the first token, so queueing and prefill don't skew it
+            result["tokens_per_second"] = round((tokens - 1) / generating, 1)
+        return result
+
+    def metadata(self) -> Dict[str, float]:
+        """timings() with a client_ prefix, for extra_body.metadata"""
+        return {f"client_{k}": v for k, v in self.timings().items() if v is not None}
 
 
 # ============================================================================
@@ -221,29 +353,181 @@ def get_embeddings():
 # Langfuse Direct Integration (for prompt management)
 # ============================================================================
 
+_VARIABLE = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+
+
+class CompiledTemplate:
+    """
+    A Langfuse {{variable}} template split into literals and variable names once.
+
+    render() joins the pieces instead of rescanning the template on every
+    call. Missing variables are left as written and None renders as an empty
+    string, as in the Langfuse SDK's compile().
+    """
+
+    def __init__(self, template: str):
+        parts = _VARIABLE.split(template)
+        self.literals = parts[0::2]
+        self.variables = [name.strip() for name in parts[1::2]]
+        self.raw = [f"{{{{{name}}}}}" for name in parts[1::2]]
+
+    def render(self, values: dict) -> str:
+        out = [self.literals[0]]
+        for name, raw, literal in zip(self.variables, self.raw, self.literals[1:]):
+            if name in values:
+                value = values[name]
+                out.append("" if value is None else str(value))
+            else:
+                out.append(raw)
+            out.append(literal)
+        return "".join(out)
+
+
+class CachedPrompt:
+    """One fetched prompt version with its templates precompiled"""
+
+    def __init__(self, prompt, fetched_at: float):
+        self.prompt = prompt  # Langfuse TextPromptClient / ChatPromptClient
+        self.version = prompt.version
+        self.config = prompt.config
+        self.fetched_at = fetched_at
+        self.text = None
+        self.messages = None
+        if isinstance(prompt.prompt, str):
+            self.text = CompiledTemplate(prompt.prompt)
+        elif all(m.get("type", "message") == "message" for m in prompt.prompt):
+            self.messages = [(m["role"], CompiledTemplate(m["content"])) for m in prompt.prompt]
+
+    def compile(self, **variables):
+        if self.text is not None:
+            return self.text.render(variables)
+        if self.messages is not None:
+            return [{"role": role, "content": t.render(variables)} for role, t in self.messages]
+        return self.prompt.compile(**variables)  # Chat prompts with message placeholders
+
+
+class PromptStore:
+    """
+    Process-local Langfuse prompt cache with stale-while-revalidate refresh.
+
+    The first get() of a prompt fetches it; after that every get() is served
+    from memory. Once an entry is older than ttl, the cached version is still
+    returned and a background thread refetches it, so Langfuse is never on
+    the request path after warm-up. When a refresh fails (Langfuse down) the
+    last known version keeps being served and the failure is counted.
+    """
+
+    def __init__(self, langfuse=None, ttl: float = 60, refresh_workers: int = 2,
+                 fetch_timeout: int = 5):
+        self.langfuse = langfuse
+        self.ttl = ttl
+        self.fetch_timeout = fetch_timeout
+        self.entries: Dict[tuple, CachedPrompt] = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="prompt-refresh")
+        self.counters = Counter()
+        self.last_error = None
+
+    def _client(self):
+        if self.langfuse is None:
+            from langfuse import Langfuse
+
+            self.langfuse = Langfuse(
+                public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+                secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+                host=os.getenv("LANGFUSE_URL", "https://your-langfuse.up.railway.app")
+            )
+        return self.langfuse
+
+    def _fetch(self, key: tuple) -> CachedPrompt:
+        name, label, prompt_type = key
+        prompt = self._client().get_prompt(
+            name, label=label, type=prompt_type,
+            cache_ttl_seconds=0,  # The SDK's own cache would hide refreshes from us
+            fetch_timeout_seconds=self.fetch_timeout,
+        )
+        return CachedPrompt(prompt, time.monotonic())
+
+    def _refresh(self, key: tuple):
+        try:
+            entry = self._fetch(key)
+            with self.lock:
+                previous = self.entries.get(key)
+                if previous is not None and previous.version != entry.version:
+                    self.counters["version_changes"] += 1
+                self.entries[key] = entry
+                self.counters["refreshes"] += 1
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def get(self, name: str, label: str = "production", type: str = "text") -> CachedPrompt:
+        """Cached prompt; blocks only on the first fetch of a prompt."""
+        key = (name, label, type)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.fetched_at
+                self.counters["hits"] += 1
+                if age > self.ttl:
+                    self.counters["stale_hits"] += 1
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        self.executor.submit(self._refresh, key)
+                return entry
+
+        self.counters["misses"] += 1
+        entry = self._fetch(key)
+        with self.lock:
+            self.entries.setdefault(key, entry)
+            return self.entries[key]
+
+    def compile(self, name: str, label: str = "production", type: str = "text", **variables):
+        return self.get(name, label, type).compile(**variables)
+
+    def preload(self, names: List[str], label: str = "production", type: str = "text"):
+        """Fetch prompts at startup so the first requests don't wait on Langfuse."""
+        for future in [self.executor.submit(self.get, name, label, type) for name in names]:
+            future.result()
+
+    def stats(self) -> dict:
+        """Counters plus how old each cached prompt is"""
+        now = time.monotonic()
+        with self.lock:
+            ages = {f"{name}@{label}": round(now - entry.fetched_at, 1)
+                    for (name, label, _), entry in self.entries.items()}
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else None,
+            "max_age_seconds": max(ages.values(), default=None),
+            "ages_seconds": ages,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+# One store per process, shared by every request
+prompt_store = PromptStore()
+
+
 def use_langfuse_prompts():
     """
     Fetch prompts from Langfuse for prompt management.
-    
-    This requires direct Langfuse SDK connection.
+
+    This requires direct Langfuse SDK connection. Prompts come from the
+    process-wide PromptStore, so only the first call waits on Langfuse.
     """
-    from langfuse import Langfuse
-    
-    LANGFUSE_URL = os.getenv("LANGFUSE_URL", "https://your-langfuse.up.railway.app")
-    LANGFUSE_PUBLIC_KEY = os.getenv("LANGFUSE_PUBLIC_KEY")
-    LANGFUSE_SECRET_KEY = os.getenv("LANGFUSE_SECRET_KEY")
-    
-    langfuse = Langfuse(
-        public_key=LANGFUSE_PUBLIC_KEY,
-        secret_key=LANGFUSE_SECRET_KEY,
-        host=LANGFUSE_URL
-    )
-    
     # Get a prompt template (create it first in Langfuse UI)
     try:
-        prompt = langfuse.get_prompt("summarization-prompt")
-        compiled = prompt.compile(text="Some text to summarize")
-        
+        compiled = prompt_store.compile("summarization-prompt", text="Some text to summarize")
+
         # Use the compiled prompt with LiteLLM
         response = client.chat.completions.create(
             model="gpt-4o",
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+LiteLLM Gateway Load Test
+
+Open-loop load generator for the gateway: requests are sent on a fixed
+schedule at the target rate whether or not earlier ones have finished, so
+queueing inside the gateway shows up as latency instead of silently lowering
+the offered load. Reports throughput, time to first token, end-to-end
+p50/p95/p99 and an error breakdown, and writes JSON to diff between deploys.
+
+Usage:
+    pip install aiohttp requests
+    export LITELLM_URL=https://your-litellm.up.railway.app
+    export LITELLM_API_KEY=sk-your-key
+
+    python benchmark.py --rps 20 --duration 60 --stream-ratio 0.5 --json before.json
+    python benchmark.py --rps 20 --duration 60 --stream-ratio 0.5 --compare before.json
+
+    # Offline, against the bundled mock provider (no gateway, no provider costs)
+    python benchmark.py --mock --rps 200 --duration 30
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from test_setup import check_litellm_health, models_check, print_result
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROMPT = "Write one sentence about load testing."
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 plus mean and max, in milliseconds"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "p50": round(rank(50) * 1000, 1),
+        "p95": round(rank(95) * 1000, 1),
+        "p99": round(rank(99) * 1000, 1),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+def classify_error(error: BaseException) -> str:
+    """Short, stable name for a client-side failure"""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if AIOHTTP_AVAILABLE and isinstance(error, aiohttp.ClientConnectionError):
+        return "connection_error"
+    return type(error).__name__
+
+
+async def send_request(session, url: str, api_key: str, model: str, prompt: str,
+                       max_tokens: int, stream: bool, scheduled: float) -> dict:
+    """
+    Send one chat completion and time it.
+
+    Latencies are measured from the scheduled send time, not from when the
+    request got a connection, so waiting for the client pool counts too.
+    """
+    loop = asyncio.get_running_loop()
+    result = {"stream": stream, "ok": False, "error": None, "ttft": None, "e2e": None, "tokens": 0}
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "stream": stream,
+    }
+    if stream:
+        payload["stream_options"] = {"include_usage": True}
+
+    try:
+        async with session.post(
+            f"{url}/v1/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=payload,
+        ) as response:
+            if response.status != 200:
+                await response.read()
+                result["error"] = f"http_{response.status}"
+                return result
+
+            if not stream:
+                body = await response.json()
+                result["ttft"] = result["e2e"] = loop.time() - scheduled
+                result["tokens"] = body.get("usage", {}).get("completion_tokens", 0)
+                result["ok"] = True
+                return result
+
+            chunks = 0
+            async for line in response.content:
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    result["tokens"] = chunk["usage"].get("completion_tokens", 0)
+                choices = chunk.get("choices") or [{}]
+                if choices[0].get("delta", {}).get("content"):
+                    chunks += 1
+                    if result["ttft"] is None:
+                        result["ttft"] = loop.time() - scheduled
+            result["e2e"] = loop.time() - scheduled
+            result["tokens"] = result["tokens"] or chunks
+            result["ok"] = True
+    except Exception as e:
+        result["error"] = classify_error(e)
+    return result
+
+
+async def run_load(url: str, api_key: str, model: str, rps: float, duration: float,
+                   stream_ratio: float = 0.0, max_tokens: int = 64, prompt: str = DEFAULT_PROMPT,
+                   connections: int = 100, timeout: float = 60, arrival: str = "constant",
+                   seed: int = 0) -> dict:
+    """Offer rps requests/second for duration seconds and summarise the results"""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    total = max(1, int(rps * duration))
+    lags = []
+    tasks = []
+
+    # One pooled session for the whole run: connections are reused across requests
+    connector = aiohttp.TCPConnector(limit=connections, limit_per_host=connections, keepalive_timeout=30)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        started = loop.time()
+        next_send = started
+        for _ in range(total):
+            delay = next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, loop.time() - next_send))
+            stream = rng.random() < stream_ratio
+            tasks.append(asyncio.create_task(
+                send_request(session, url, api_key, model, prompt, max_tokens, stream, next_send)
+            ))
+            next_send += rng.expovariate(rps) if arrival == "poisson" else 1 / rps
+        results = await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+
+    return summarise(results, elapsed, lags, {
+        "url": url,
+        "model": model,
+        "rps": rps,
+        "duration": duration,
+        "stream_ratio": stream_ratio,
+        "max_tokens": max_tokens,
+        "connections": connections,
+        "timeout": timeout,
+        "arrival": arrival,
+    })
+
+
+def _latency_summary(results: List[dict]) -> dict:
+    ok = [r for r in results if r["ok"]]
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "ttft_ms": percentiles([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "e2e_ms": percentiles([r["e2e"] for r in ok]),
+    }
+
+
+def summarise(results: List[dict], elapsed: float, lags: List[float], config: dict) -> dict:
+    """Build the JSON report for one run"""
+    ok = [r for r in results if r["ok"]]
+    tokens = sum(r["tokens"] for r in ok)
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "config": config,
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0,
+        "tokens_per_second": round(tokens / elapsed, 1) if elapsed else 0,
+        # How far behind schedule the generator sent requests; if this is high
+        # the client machine, not the gateway, is the bottleneck
+        "send_lag_ms": percentiles(lags),
+        "latency": {
+            "all": _latency_summary(results),
+            "stream": _latency_summary([r for r in results if r["stream"]]),
+            "non_stream": _latency_summary([r for r in results if not r["stream"]]),
+        },
+        "errors": dict(Counter(r["error"] for r in results if r["error"])),
+    }
+
+
+def print_report(report: dict):
+    """Print a run summary"""
+    print(f"Requests:    {report['requests']} ({report['succeeded']} ok, {report['failed']} failed)")
+    print(f"Throughput:  {report['throughput_rps']} req/s, {report['tokens_per_second']} tokens/s")
+    print(f"Send lag:    p99 {report['send_lag_ms']['p99']} ms")
+    for name, summary in report["latency"].items():
+        if not summary["requests"]:
+            continue
+        ttft, e2e = summary["ttft_ms"], summary["e2e_ms"]
+        print(f"{name:<12} TTFT p50/p95/p99 {ttft['p50']}/{ttft['p95']}/{ttft['p99']} ms, "
+              f"e2e {e2e['p50']}/{e2e['p95']}/{e2e['p99']} ms")
+    if report["errors"]:
+        print("Errors:      " + ", ".join(f"{k}={v}" for k, v in sorted(report["errors"].items())))
+
+
+def print_comparison(baseline: dict, report: dict):
+    """Print key metrics of this run next to a previous report"""
+    rows = [
+        ("throughput_rps", baseline["throughput_rps"], report["throughput_rps"]),
+        ("error_rate", baseline["error_rate"], report["error_rate"]),
+    ]
+    for name in ("all", "stream", "non_stream"):
+        for metric in ("ttft_ms", "e2e_ms"):
+            for p in ("p50", "p95", "p99"):
+                before = baseline["latency"][name][metric][p]
+                after = report["latency"][name][metric][p]
+                if before is not None and after is not None:
+                    rows.append((f"{name} {metric} {p}", before, after))
+    print(f"{'metric':<28}{'baseline':>12}{'this run':>12}{'change':>10}")
+    for metric, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+        print(f"{metric:<28}{before:>12}{after:>12}{change:>10}")
+
+
+def start_mock_provider(args) -> tuple:
+    """Run the bundled mock provider in a subprocess; returns (process, url)"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([
+        sys.executable, os.path.join(SCRIPTS_DIR, "mock_provider.py"),
+        "--host", "127.0.0.1", "--port", str(port),
+        "--latency-ms", str(args.mock_latency_ms),
+        "--tokens-per-second", str(args.mock_tokens_per_second),
+    ], stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        ok, _ = check_litellm_health(url)
+        if ok:
+            return process, url
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Mock provider did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the LiteLLM gateway")
+    parser.add_argument("--rps", type=float, default=10, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="Fraction of streaming requests")
+    parser.add_argument("--model", help="Model to call (default: first from /v1/models)")
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant",
+                        help="Evenly spaced or Poisson-distributed request arrivals")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write the report to this file")
+    parser.add_argument("--compare", help="Previous --json report to compare against")
+    parser.add_argument("--mock", action="store_true",
+                        help="Start the bundled mock provider and load test it directly")
+    parser.add_argument("--mock-latency-ms", type=float, default=200)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=50)
+    args = parser.parse_args()
+
+    if not AIOHTTP_AVAILABLE:
+        print("aiohttp is required: pip install aiohttp")
+        sys.exit(1)
+
+    mock = None
+    if args.mock:
+        mock, url = start_mock_provider(args)
+        api_key = "mock"
+    else:
+        url = os.getenv("LITELLM_URL", "").rstrip("/")
+        api_key = os.getenv("LITELLM_API_KEY", "")
+        if not url or not api_key:
+            print("Set LITELLM_URL and LITELLM_API_KEY, or use --mock")
+            sys.exit(1)
+
+    try:
+        # Don't load test something that isn't up
+        ok, msg = check_litellm_health(url)
+        print_result("Gateway Health", ok, msg)
+        if not ok:
+            sys.exit(1)
+        context = {"litellm_url": url, "litellm_key": api_key}
+        ok, msg = models_check(context)
+        print_result("Gateway Models", ok, msg)
+        if not ok and not args.model:
+            sys.exit(1)
+
+        model = args.model or context["models"][0]["id"]
+        print(f"Offering {args.rps} req/s for {args.duration}s to {model} "
+              f"({args.stream_ratio:.0%} streaming, {args.arrival} arrivals)...")
+        print()
+
+        report = asyncio.run(run_load(
+            url, api_key, model, args.rps, args.duration,
+            stream_ratio=args.stream_ratio, max_tokens=args.max_tokens, prompt=args.prompt,
+            connections=args.connections, timeout=args.timeout, arrival=args.arrival, seed=args.seed,
+        ))
+        report["config"]["mock"] = args.mock
+    finally:
+        if mock:
+            mock.terminate()
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print_comparison(json.load(f), report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
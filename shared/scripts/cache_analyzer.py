@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+LiteLLM Cache Analyzer
+
+Estimates what LiteLLM's Redis response cache could achieve on real traffic,
+to size REDIS_MAXMEMORY. Request history comes from the LLM generations
+Langfuse stores in ClickHouse:
+
+- Exact duplicates: requests are keyed like LiteLLM's cache key (model,
+  messages and parameters), hashed inside ClickHouse so only 8-byte keys,
+  entry sizes and costs cross the wire. Aggregate duplicate counts, cost and
+  the memory needed to cache everything are computed server-side.
+- Cache policies: LRU, LFU and LRU with a TTL are replayed at each memory size
+  over a spatially sampled key stream (a fixed hash range of keys, with cache
+  sizes scaled by the same rate), so tens of millions of requests are
+  simulated with bounded memory. This is the SHARDS approach to miss-ratio
+  curves; hit rates stay accurate as long as the sampled caches hold
+  thousands of entries.
+- Near duplicates: prompts that differ only slightly (timestamps, ids,
+  whitespace) miss an exact cache but could be served by a semantic cache.
+  Word-shingle MinHash signatures are computed in NumPy batches and matched
+  with LSH banding against a bounded window of recent prompts.
+
+The report is a hit-rate-vs-memory table per policy with the provider cost
+each size would have saved over the window and per 30 days.
+
+Usage:
+    pip install clickhouse-connect numpy
+    export CLICKHOUSE_HOST=... CLICKHOUSE_USER=... CLICKHOUSE_PASSWORD=...
+
+    python cache_analyzer.py --from "2026-01-01" --days 7
+    python cache_analyzer.py --from "2026-01-01" --days 30 --sizes 64mb,256mb,1gb,4gb \\
+        --policies lru,ttl --ttl 86400 --near-rows 500000 --json cache.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import zlib
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from replay import clickhouse_client
+
+# LiteLLM's Redis entry is the serialized response under a 64-character hash
+# key; this covers the key, the response envelope around the output text and
+# Redis's own per-key overhead
+ENTRY_OVERHEAD_BYTES = 600
+
+# Mirrors LiteLLM's cache key: same model, messages and parameters
+KEY_EXPR = "cityHash64(provided_model_name, ifNull(input, ''), ifNull(model_parameters, ''))"
+SIZE_EXPR = f"length(ifNull(output, '')) + {ENTRY_OVERHEAD_BYTES}"
+COST_EXPR = "toFloat64(ifNull(total_cost, 0))"
+WINDOW = """type = 'GENERATION' AND is_deleted = 0
+  AND start_time >= {start:DateTime64(3)} AND start_time < {end:DateTime64(3)}
+  AND ({project:String} = '' OR project_id = {project:String})"""
+
+# Spatial sampling keeps keys whose hash falls in the first `rate` of this range
+SAMPLE_MODULUS = 1_000_000
+
+TOTALS_QUERY = f"""
+SELECT
+    sum(n) AS requests,
+    count() AS unique_requests,
+    countIf(n > 1) AS repeated_keys,
+    sum(cost) AS cost,
+    sum(cost) - sum(first_cost) AS repeat_cost,
+    sum(size) AS unique_bytes
+FROM (
+    SELECT {KEY_EXPR} AS key, count() AS n, sum({COST_EXPR}) AS cost,
+           argMin({COST_EXPR}, start_time) AS first_cost, max({SIZE_EXPR}) AS size
+    FROM observations FINAL
+    WHERE {WINDOW}
+    GROUP BY key
+)
+"""
+
+STREAM_QUERY = f"""
+SELECT toUnixTimestamp64Milli(start_time) AS ts, {KEY_EXPR} AS key, {SIZE_EXPR} AS size, {COST_EXPR} AS cost
+FROM observations FINAL
+WHERE {WINDOW} AND key % {SAMPLE_MODULUS} < {{threshold:UInt64}}
+ORDER BY start_time
+"""
+
+NEAR_QUERY = f"""
+SELECT {KEY_EXPR} AS key, ifNull(input, '') AS input, {COST_EXPR} AS cost
+FROM observations FINAL
+WHERE {WINDOW}
+ORDER BY start_time
+LIMIT {{limit:UInt64}}
+"""
+
+# Let large GROUP BYs spill to disk instead of failing on server memory
+QUERY_SETTINGS = {"max_bytes_before_external_group_by": 2_000_000_000,
+                  "max_bytes_before_external_sort": 2_000_000_000}
+
+SIZE_UNITS = {"kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Redis-style memory size ('256mb', '1gb') to bytes"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(kb|mb|gb)?\s*", value.lower())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS.get(match.group(2), 1))
+
+
+def format_size(size: int) -> str:
+    for unit in ("gb", "mb", "kb"):
+        if size >= SIZE_UNITS[unit]:
+            return f"{size / SIZE_UNITS[unit]:g}{unit}"
+    return f"{size}b"
+
+
+# ============================================================================
+# Cache Simulation
+# ============================================================================
+
+class SimulatedCache:
+    """Byte-bounded cache; subclasses decide what to evict"""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.used = 0
+        self.requests = 0
+        self.hits = 0
+        self.evictions = 0
+        self.cost_saved = 0.0
+
+    def access(self, key: int, size: int, cost: float, now: float):
+        self.requests += 1
+        if self._lookup(key, now):
+            self.hits += 1
+            self.cost_saved += cost
+        elif size <= self.capacity:
+            while self.used + size > self.capacity:
+                self.used -= self._evict()
+                self.evictions += 1
+            self._insert(key, size, now)
+            self.used += size
+
+
+class LRUCache(SimulatedCache):
+    """Least recently used, optionally with a TTL (Redis allkeys-lru with expiring keys)"""
+
+    def __init__(self, capacity: float, ttl: Optional[float] = None):
+        super().__init__(capacity)
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (size, stored_at)
+
+    def _lookup(self, key, now) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if self.ttl is not None and now - entry[1] >= self.ttl:
+            del self.entries[key]
+            self.used -= entry[0]
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    def _evict(self) -> int:
+        return self.entries.popitem(last=False)[1][0]
+
+    def _insert(self, key, size, now):
+        self.entries[key] = (size, now)
+
+
+class LFUCache(SimulatedCache):
+    """
+    Least frequently used, ties broken by age.
+
+    Frequencies don't decay, so when popularity shifts old favourites stay
+    longer than under Redis allkeys-lfu. The heap is lazily invalidated and
+    rebuilt when stale entries outnumber live ones.
+    """
+
+    def __init__(self, capacity: float):
+        super().__init__(capacity)
+        self.entries: Dict[int, list] = {}  # key -> [frequency, size, tick]
+        self.heap: List[tuple] = []
+        self.tick = 0
+
+    def _push(self, key, entry):
+        self.tick += 1
+        entry[2] = self.tick
+        heapq.heappush(self.heap, (entry[0], self.tick, key))
+        if len(self.heap) > 2 * len(self.entries) + 1024:
+            self.heap = [(f, t, k) for k, (f, _, t) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def _lookup(self, key, now) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        entry[0] += 1
+        self._push(key, entry)
+        return True
+
+    def _evict(self) -> int:
+        while True:
+            frequency, tick, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] == tick:
+                del self.entries[key]
+                return entry[1]
+
+    def _insert(self, key, size, now):
+        entry = [1, size, 0]
+        self.entries[key] = entry
+        self._push(key, entry)
+
+
+def make_cache(policy: str, capacity: float, ttl: float) -> SimulatedCache:
+    if policy == "lru":
+        return LRUCache(capacity)
+    if policy == "ttl":
+        return LRUCache(capacity, ttl=ttl)
+    if policy == "lfu":
+        return LFUCache(capacity)
+    raise ValueError(f"Unknown policy: {policy}")
+
+
+def simulate(client, params: dict, rate: float, sizes: List[int], policies: List[str], ttl: float) -> dict:
+    """Replay the sampled key stream through every (policy, size) cache in one pass"""
+    caches = {(policy, size): make_cache(policy, size * rate, ttl) for policy in policies for size in sizes}
+    active = list(caches.values())
+    rows = 0
+    with client.query_column_block_stream(
+        STREAM_QUERY, parameters=dict(params, threshold=int(rate * SAMPLE_MODULUS)), settings=QUERY_SETTINGS
+    ) as stream:
+        for ts_column, key_column, size_column, cost_column in stream:
+            for ts, key, size, cost in zip(ts_column, key_column, size_column, cost_column):
+                now = ts / 1000
+                for cache in active:
+                    cache.access(key, size, cost, now)
+            rows += len(ts_column)
+
+    curves = {policy: [] for policy in policies}
+    for (policy, size), cache in caches.items():
+        curves[policy].append({
+            "size": size,
+            "hit_rate": round(cache.hits / cache.requests, 4) if cache.requests else 0,
+            "evictions": round(cache.evictions / rate),
+            "cost_saved": round(cache.cost_saved / rate, 2),
+        })
+    return {"sampled_requests": rows, "curves": curves}
+
+
+# ============================================================================
+# Near-Duplicate Detection
+# ============================================================================
+
+MAX_WORDS = 2000          # Shingle at most this much of each prompt
+BATCH_SHINGLES = 50_000   # Shingles per vectorised signature batch (~25MB of scratch)
+
+
+def prompt_text(raw: str) -> str:
+    """Text content of a stored prompt: string leaves of the messages JSON, without roles"""
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return raw
+    parts = []
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+        elif isinstance(item, dict):
+            stack.extend(v for k, v in reversed(list(item.items())) if k != "role")
+    return " ".join(parts)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH over word shingles, bounded to the most recent `window` prompts.
+
+    A prompt is a near duplicate when an LSH band collides with a prompt still
+    in the window and the signatures agree on at least `threshold` of their
+    positions (the MinHash estimate of Jaccard similarity). With 8 bands of 8
+    rows, pairs above ~0.8 similarity almost always collide.
+    """
+
+    def __init__(self, window: int = 200_000, num_perm: int = 64, bands: int = 8,
+                 threshold: float = 0.8, shingle: int = 3, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self.window = window
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle = shingle
+        self.signatures = np.zeros((window, num_perm), dtype=np.uint32)  # Ring buffer by item id
+        self.buckets: Dict[bytes, int] = {}  # Band number + band values -> newest item id
+        self.count = 0
+
+    def signatures_for(self, texts: List[str]) -> "np.ndarray":
+        """One signature row per text, computed as a single matrix operation"""
+        hashes = []
+        offsets = []
+        k = self.shingle
+        for text in texts:
+            words = text.lower().split()[:MAX_WORDS]
+            offsets.append(len(hashes))
+            hashes.extend(zlib.crc32(" ".join(words[i:i + k]).encode())
+                          for i in range(max(1, len(words) - k + 1)))
+        shingles = np.array(hashes, dtype=np.uint64)
+        # Multiply-shift hashing: one independent permutation per column
+        permuted = ((shingles[:, None] * self.a + self.b) >> np.uint64(32)).astype(np.uint32)
+        return np.minimum.reduceat(permuted, offsets, axis=0)
+
+    def add(self, signature: "np.ndarray") -> bool:
+        """Index a signature; True if it nearly matches one already in the window"""
+        oldest = self.count - self.window
+        found = False
+        for band, values in enumerate(signature.reshape(self.bands, self.rows)):
+            bucket = bytes([band]) + values.tobytes()
+            other = self.buckets.get(bucket)
+            if not found and other is not None and other > oldest:
+                found = np.mean(self.signatures[other % self.window] == signature) >= self.threshold
+            self.buckets[bucket] = self.count
+        self.signatures[self.count % self.window] = signature
+        self.count += 1
+        if len(self.buckets) > 2 * self.bands * self.window:
+            self.buckets = {b: i for b, i in self.buckets.items() if i > self.count - self.window}
+        return found
+
+
+def near_duplicates(client, params: dict, limit: int, window: int, threshold: float) -> dict:
+    """Classify the first `limit` requests as exact repeats, near duplicates or unique"""
+    index = NearDuplicateIndex(window=window, threshold=threshold)
+    recent: Dict[int, int] = {}  # Cache key -> request number, bounded to the same window
+    counts = {"requests": 0, "exact": 0, "near": 0}
+    near_cost = 0.0
+    pending = []  # (key, text, cost) awaiting a signature batch
+    pending_words = 0
+
+    def flush():
+        nonlocal near_cost
+        signatures = index.signatures_for([text for _, text, _ in pending])
+        for (key, _, cost), signature in zip(pending, signatures):
+            number = counts["requests"]
+            counts["requests"] += 1
+            near = index.add(signature)
+            if recent.get(key, -window - 1) > number - window:
+                counts["exact"] += 1
+            elif near:
+                counts["near"] += 1
+                near_cost += cost
+            recent[key] = number
+        if len(recent) > 2 * window:
+            cutoff = counts["requests"] - window
+            for key in [k for k, n in recent.items() if n <= cutoff]:
+                del recent[key]
+        pending.clear()
+
+    with client.query_column_block_stream(
+        NEAR_QUERY, parameters=dict(params, limit=limit), settings=QUERY_SETTINGS
+    ) as stream:
+        for key_column, input_column, cost_column in stream:
+            for key, raw, cost in zip(key_column, input_column, cost_column):
+                text = prompt_text(raw)
+                pending.append((key, text, cost))
+                pending_words += min(MAX_WORDS, text.count(" ") + 1)
+                if pending_words >= BATCH_SHINGLES:
+                    flush()
+                    pending_words = 0
+    if pending:
+        flush()
+
+    requests = counts["requests"]
+    return {
+        "requests": requests,
+        "window": window,
+        "threshold": threshold,
+        "exact_share": round(counts["exact"] / requests, 4) if requests else 0,
+        # What a semantic cache could add on top of exact matching
+        "near_share": round(counts["near"] / requests, 4) if requests else 0,
+        "near_cost": round(near_cost, 2),
+    }
+
+
+# ============================================================================
+# Report
+# ============================================================================
+
+def analyze(start: datetime, end: datetime, sizes: List[int], policies: List[str], ttl: float,
+            max_rows: int, near_rows: int, near_window: int, near_threshold: float,
+            project: str = "") -> dict:
+    client = clickhouse_client()
+    params = {"start": start, "end": end, "project": project}
+    days = (end - start).total_seconds() / 86400
+
+    started = time.time()
+    requests, unique, repeated_keys, cost, repeat_cost, unique_bytes = client.query(
+        TOTALS_QUERY, parameters=params, settings=QUERY_SETTINGS
+    ).result_rows[0]
+    report = {
+        "window": {"start": start.isoformat(), "end": end.isoformat(), "days": round(days, 2)},
+        "totals": {
+            "requests": requests,
+            "unique_requests": unique,
+            "repeated_keys": repeated_keys,
+            "duplicate_share": round(1 - unique / requests, 4) if requests else 0,
+            "cost": round(cost or 0, 2),
+            # Savings of an unbounded cache that never expires: the ceiling for every policy
+            "repeat_cost": round(repeat_cost or 0, 2),
+            "unique_bytes": unique_bytes,
+        },
+    }
+    if not requests:
+        return report
+
+    rate = min(1.0, max_rows / requests)
+    print(f"{requests} requests ({unique} unique); simulating a {rate:.2%} key sample...", file=sys.stderr)
+    report["simulation"] = simulate(client, params, rate, sizes, policies, ttl)
+    report["simulation"].update(rate=rate, ttl=ttl)
+    for curve in report["simulation"]["curves"].values():
+        for point in curve:
+            point["cost_saved_30d"] = round(point["cost_saved"] / days * 30, 2) if days else None
+
+    if near_rows:
+        print(f"Checking the first {near_rows} prompts for near duplicates...", file=sys.stderr)
+        report["near_duplicates"] = near_duplicates(client, params, near_rows, near_window, near_threshold)
+    report["elapsed_seconds"] = round(time.time() - started, 1)
+    return report
+
+
+def print_report(report: dict, current: int):
+    totals = report["totals"]
+    window = report["window"]
+    print(f"\nWindow: {window['start']} to {window['end']} ({window['days']} days)")
+    print(f"Requests: {totals['requests']}, unique: {totals['unique_requests']} "
+          f"({totals['duplicate_share']:.1%} exact duplicates), cost {totals['cost']}")
+    print(f"Unbounded cache: saves {totals['repeat_cost']} and needs "
+          f"{format_size(totals['unique_bytes'])} to hold every unique response")
+    if "simulation" not in report:
+        return
+
+    simulation = report["simulation"]
+    print(f"\nSimulated on {simulation['sampled_requests']} sampled requests "
+          f"({simulation['rate']:.2%} of keys); TTL policy uses {simulation['ttl']:g}s")
+    policies = list(simulation["curves"])
+    header = f"{'maxmemory':<12}" + "".join(f"{p + ' hit':>11}{p + ' saved/30d':>16}" for p in policies)
+    print(header)
+    for i, point in enumerate(simulation["curves"][policies[0]]):
+        marker = " *" if point["size"] == current else ""
+        line = f"{format_size(point['size']) + marker:<12}"
+        for policy in policies:
+            p = simulation["curves"][policy][i]
+            line += f"{p['hit_rate']:>11.1%}{p['cost_saved_30d']:>16}"
+        print(line)
+    print("(* current REDIS_MAXMEMORY)")
+
+    near = report.get("near_duplicates")
+    if near:
+        print(f"\nNear duplicates in the first {near['requests']} requests (Jaccard >= {near['threshold']}, "
+              f"last {near['window']} prompts): {near['exact_share']:.1%} exact, "
+              f"{near['near_share']:.1%} near-only, worth {near['near_cost']} to a semantic cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate LiteLLM response cache hit rates from Langfuse history")
+    parser.add_argument("--from", dest="start", required=True, help="Window start, UTC (e.g. '2026-01-01')")
+    parser.add_argument("--days", type=float, default=7, help="Window length in days")
+    parser.add_argument("--project", default="", help="Langfuse project id (default: all projects)")
+    parser.add_argument("--sizes", default="32mb,64mb,128mb,256mb,512mb,1gb,2gb,4gb",
+                        help="Comma-separated cache sizes to simulate")
+    parser.add_argument("--policies", default="lru,lfu,ttl", help="Any of lru, lfu, ttl (LRU plus expiry)")
+    parser.add_argument("--ttl", type=float, default=3600, help="Entry lifetime in seconds for the ttl policy")
+    parser.add_argument("--max-rows", type=int, default=2_000_000,
+                        help="Sample keys so the simulation replays at most about this many requests")
+    parser.add_argument("--near-rows", type=int, default=200_000,
+                        help="Requests to check for near duplicates (0 to skip)")
+    parser.add_argument("--near-window", type=int, default=100_000,
+                        help="Recent prompts kept in the near-duplicate index")
+    parser.add_argument("--near-threshold", type=float, default=0.8, help="MinHash Jaccard similarity threshold")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this file")
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("numpy is required: pip install numpy")
+        sys.exit(1)
+
+    start = datetime.fromisoformat(args.start)
+    sizes = sorted(parse_size(s) for s in args.sizes.split(","))
+    policies = [p.strip() for p in args.policies.split(",") if p.strip()]
+    for policy in policies:
+        if policy not in ("lru", "lfu", "ttl"):
+            parser.error(f"unknown policy {policy!r}")
+
+    report = analyze(start, start + timedelta(days=args.days), sizes, policies, args.ttl,
+                     args.max_rows, args.near_rows, args.near_window, args.near_threshold, args.project)
+    print_report(report, parse_size(os.getenv("REDIS_MAXMEMORY", "256mb")))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
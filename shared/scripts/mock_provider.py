@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI-Compatible Provider
+
+A local stand-in for a paid LLM provider, for load tests and offline checks.
+Serves /v1/chat/completions (streaming SSE and non-streaming) and
+/v1/embeddings with configurable latency distributions, token rate and
+injected failures (429s, 500s and hung requests), and can log every request.
+
+Usage:
+    pip install aiohttp
+    python mock_provider.py --port 8090 --latency-dist lognormal --latency-ms 300 \\
+        --tokens-per-second 60 --error-rate-429 0.02 --log-requests requests.jsonl
+
+    # More throughput: one event loop per core sharing the port
+    python mock_provider.py --workers 4
+
+    # Point LiteLLM at it
+    #   - model_name: mock
+    #     litellm_params:
+    #       model: openai/mock
+    #       api_base: http://localhost:8090/v1
+    #       api_key: mock
+
+Counters for requests, injected failures and tokens served are at /mock/stats.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import base64
+import random
+import signal
+import struct
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from collections import Counter
+
+try:
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+
+MOCK_CONFIG = {
+    # Time to first token: fixed, uniform, normal, lognormal or exponential
+    "latency_dist": os.getenv("MOCK_LATENCY_DIST", "fixed"),
+    "latency_ms": float(os.getenv("MOCK_LATENCY_MS", "200")),  # Mean (median for lognormal)
+    "latency_spread_ms": float(os.getenv("MOCK_LATENCY_SPREAD_MS", "50")),  # uniform half-width, normal stddev
+    "latency_sigma": float(os.getenv("MOCK_LATENCY_SIGMA", "0.5")),  # lognormal shape; higher = longer tail
+    "tokens_per_second": float(os.getenv("MOCK_TOKENS_PER_SECOND", "50")),
+    "completion_tokens": int(os.getenv("MOCK_COMPLETION_TOKENS", "32")),
+    "embedding_dim": int(os.getenv("MOCK_EMBEDDING_DIM", "1536")),
+    "embedding_latency_ms": float(os.getenv("MOCK_EMBEDDING_LATENCY_MS", "20")),
+    "models": os.getenv("MOCK_MODELS", "mock,mock-embedding").split(","),
+    # Failure injection, as fractions of requests
+    "error_rate_429": float(os.getenv("MOCK_ERROR_RATE_429", "0")),
+    "error_rate_500": float(os.getenv("MOCK_ERROR_RATE_500", "0")),
+    "timeout_rate": float(os.getenv("MOCK_TIMEOUT_RATE", "0")),
+    "timeout_seconds": float(os.getenv("MOCK_TIMEOUT_SECONDS", "600")),  # How long a hung request hangs
+    "retry_after_seconds": float(os.getenv("MOCK_RETRY_AFTER_SECONDS", "1")),
+    "log_requests": os.getenv("MOCK_LOG_REQUESTS", ""),  # JSONL path, or "-" for stdout
+}
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+WORDS = "the quick brown fox jumps over the lazy dog while the gateway routes requests".split()
+
+
+def completion_words(count: int) -> list:
+    """Deterministic filler text, one word per token"""
+    return [WORDS[i % len(WORDS)] for i in range(count)]
+
+
+def prompt_tokens(messages: list) -> int:
+    """Rough token count: four characters per token"""
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4 + 1
+
+
+def sample_latency(config: dict, rng: random.Random) -> float:
+    """Draw one time-to-first-token, in seconds"""
+    mean = config["latency_ms"]
+    dist = config["latency_dist"]
+    if dist == "uniform":
+        ms = rng.uniform(mean - config["latency_spread_ms"], mean + config["latency_spread_ms"])
+    elif dist == "normal":
+        ms = rng.gauss(mean, config["latency_spread_ms"])
+    elif dist == "lognormal":
+        ms = rng.lognormvariate(math.log(max(mean, 0.001)), config["latency_sigma"])
+    elif dist == "exponential":
+        ms = rng.expovariate(1 / mean) if mean > 0 else 0
+    else:
+        ms = mean
+    return max(ms, 0) / 1000
+
+
+def embedding_vector(model: str, text: str, dim: int) -> list:
+    """Deterministic unit vector for a text, so identical inputs embed identically"""
+    seed = int.from_bytes(hashlib.sha256(f"{model}\0{text}".encode()).digest()[:8], "little")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1
+    return [v / norm for v in vector]
+
+
+class MockState:
+    """Per-process counters and the request log"""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.rng = random.Random()
+        self.counters = Counter()
+        self.started = time.time()
+        self.log = None
+        if config["log_requests"] == "-":
+            self.log = sys.stdout
+        elif config["log_requests"]:
+            self.log = open(config["log_requests"], "a", buffering=1024 * 1024)
+
+    def record(self, entry: dict):
+        self.counters["requests"] += 1
+        self.counters[f"status_{entry['status']}"] += 1
+        if entry.get("injected"):
+            self.counters[f"injected_{entry['injected']}"] += 1
+        self.counters["completion_tokens"] += entry.get("completion_tokens", 0)
+        if self.log:
+            self.log.write(json.dumps(entry) + "\n")
+
+    def close(self):
+        if self.log and self.log is not sys.stdout:
+            self.log.close()
+
+
+def _error(status: int, message: str, error_type: str, headers: dict = None) -> "web.Response":
+    return web.json_response(
+        {"error": {"message": message, "type": error_type, "code": str(status)}},
+        status=status, headers=headers
+    )
+
+
+async def inject_failure(state: MockState):
+    """Return (response, kind) for an injected failure, or (None, None)"""
+    config = state.config
+    roll = state.rng.random()
+    if roll < config["error_rate_429"]:
+        retry_after = config["retry_after_seconds"]
+        return _error(429, "Rate limit reached (injected by mock provider)", "rate_limit_error", {
+            "Retry-After": f"{retry_after:g}",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": f"{retry_after:g}s",
+        }), "429"
+    roll -= config["error_rate_429"]
+    if roll < config["error_rate_500"]:
+        return _error(500, "Internal server error (injected by mock provider)", "server_error"), "500"
+    roll -= config["error_rate_500"]
+    if roll < config["timeout_rate"]:
+        # Hold the connection open without answering, like a stuck upstream
+        await asyncio.sleep(config["timeout_seconds"])
+        return _error(504, "Request timed out (injected by mock provider)", "timeout"), "timeout"
+    return None, None
+
+
+async def models(request):
+    return web.json_response({
+        "object": "list",
+        "data": [{"id": name, "object": "model", "owned_by": "mock"} for name in request.app["state"].config["models"]],
+    })
+
+
+async def health(request):
+    return web.json_response({"status": "healthy"})
+
+
+async def stats(request):
+    state = request.app["state"]
+    uptime = time.time() - state.started
+    return web.json_response({
+        "pid": os.getpid(),
+        "uptime_seconds": round(uptime, 1),
+        "requests_per_second": round(state.counters["requests"] / uptime, 1) if uptime else 0,
+        "counters": dict(state.counters),
+    })
+
+
+async def chat_completions(request):
+    state = request.app["state"]
+    config = state.config
+    received = time.time()
+    body = await request.json()
+    model = body.get("model", "mock")
+    stream = bool(body.get("stream"))
+    entry = {"ts": received, "path": request.path, "model": model, "stream": stream}
+
+    failure, injected = await inject_failure(state)
+    if failure is not None:
+        state.record(dict(entry, status=failure.status, injected=injected,
+                          latency_ms=round((time.time() - received) * 1000, 1)))
+        return failure
+
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or config["completion_tokens"]
+    words = completion_words(min(max_tokens, config["completion_tokens"]))
+    usage = {
+        "prompt_tokens": prompt_tokens(body.get("messages", [])),
+        "completion_tokens": len(words),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    # Time to first token
+    await asyncio.sleep(sample_latency(config, state.rng))
+    interval = 1 / config["tokens_per_second"] if config["tokens_per_second"] > 0 else 0
+
+    if not stream:
+        # Non-streaming responses take as long as generating every token would
+        await asyncio.sleep(len(words) * interval)
+        state.record(dict(entry, status=200, completion_tokens=len(words),
+                          latency_ms=round((time.time() - received) * 1000, 1)))
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+
+    def event(delta: dict, finish_reason=None, **extra) -> bytes:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    await response.write(event({"role": "assistant", "content": ""}))
+    first_token_ms = round((time.time() - received) * 1000, 1)
+    for i, word in enumerate(words):
+        if i and interval:
+            await asyncio.sleep(interval)
+        await response.write(event({"content": word if i == 0 else f" {word}"}))
+    await response.write(event({}, "stop"))
+    if (body.get("stream_options") or {}).get("include_usage"):
+        # As OpenAI does: usage arrives in a last chunk with no choices
+        usage_chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                       "model": model, "choices": [], "usage": usage}
+        await response.write(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    state.record(dict(entry, status=200, completion_tokens=len(words), first_token_ms=first_token_ms,
+                      latency_ms=round((time.time() - received) * 1000, 1)))
+    return response
+
+
+async def embeddings(request):
+    state = request.app["state"]
+    config = state.config
+    received = time.time()
+    body = await request.json()
+    model = body.get("model", "mock-embedding")
+    inputs = body.get("input", "")
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    entry = {"ts": received, "path": request.path, "model": model, "inputs": len(inputs)}
+
+    failure, injected = await inject_failure(state)
+    if failure is not None:
+        state.record(dict(entry, status=failure.status, injected=injected,
+                          latency_ms=round((time.time() - received) * 1000, 1)))
+        return failure
+
+    dim = int(body.get("dimensions") or config["embedding_dim"])
+    as_base64 = body.get("encoding_format") == "base64"
+    data = []
+    tokens = 0
+    for index, text in enumerate(inputs):
+        # Token-id inputs are embedded by their ids
+        text = text if isinstance(text, str) else " ".join(map(str, text))
+        tokens += len(text) // 4 + 1
+        vector = embedding_vector(model, text, dim)
+        if as_base64:
+            # What the OpenAI SDK requests by default: little-endian float32
+            vector = base64.b64encode(struct.pack(f"<{dim}f", *vector)).decode()
+        data.append({"object": "embedding", "index": index, "embedding": vector})
+
+    await asyncio.sleep(config["embedding_latency_ms"] / 1000)
+    state.record(dict(entry, status=200, latency_ms=round((time.time() - received) * 1000, 1)))
+    return web.json_response({
+        "object": "list",
+        "data": data,
+        "model": model,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+def create_app(config: dict = None) -> "web.Application":
+    """Build the mock provider application"""
+    app = web.Application()
+    state = MockState(dict(MOCK_CONFIG, **(config or {})))
+    app["state"] = state
+    app.router.add_get("/health", health)
+    app.router.add_get("/mock/stats", stats)
+    for prefix in ("/v1", ""):
+        # Also answer without the /v1 prefix, as OpenAI-compatible servers do
+        app.router.add_get(f"{prefix}/models", models)
+        app.router.add_post(f"{prefix}/chat/completions", chat_completions)
+        app.router.add_post(f"{prefix}/embeddings", embeddings)
+
+    async def close_log(app):
+        state.close()
+
+    app.on_cleanup.append(close_log)
+    return app
+
+
+def serve(config: dict, host: str, port: int, reuse_port: bool = False):
+    """Run one server process"""
+    if reuse_port and config["log_requests"] not in ("", "-"):
+        # One log per worker, so buffered writes from different processes don't interleave
+        config = dict(config, log_requests=f"{config['log_requests']}.{os.getpid()}")
+    web.run_app(create_app(config), host=host, port=port, reuse_port=reuse_port,
+                access_log=None, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible provider")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8090")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MOCK_WORKERS", "1")),
+                        help="Server processes sharing the port (Linux SO_REUSEPORT)")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default=MOCK_CONFIG["latency_dist"],
+                        help="Distribution of the delay before the first token")
+    parser.add_argument("--latency-ms", type=float, default=MOCK_CONFIG["latency_ms"],
+                        help="Mean delay before the first token (median for lognormal)")
+    parser.add_argument("--latency-spread-ms", type=float, default=MOCK_CONFIG["latency_spread_ms"],
+                        help="Half-width for uniform, standard deviation for normal")
+    parser.add_argument("--latency-sigma", type=float, default=MOCK_CONFIG["latency_sigma"],
+                        help="Shape of the lognormal distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=MOCK_CONFIG["tokens_per_second"],
+                        help="Generation speed (0 = instant)")
+    parser.add_argument("--completion-tokens", type=int, default=MOCK_CONFIG["completion_tokens"],
+                        help="Tokens per completion (capped by max_tokens)")
+    parser.add_argument("--embedding-dim", type=int, default=MOCK_CONFIG["embedding_dim"])
+    parser.add_argument("--embedding-latency-ms", type=float, default=MOCK_CONFIG["embedding_latency_ms"])
+    parser.add_argument("--error-rate-429", type=float, default=MOCK_CONFIG["error_rate_429"],
+                        help="Fraction of requests answered with 429 and Retry-After")
+    parser.add_argument("--error-rate-500", type=float, default=MOCK_CONFIG["error_rate_500"],
+                        help="Fraction of requests answered with 500")
+    parser.add_argument("--timeout-rate", type=float, default=MOCK_CONFIG["timeout_rate"],
+                        help="Fraction of requests that hang for --timeout-seconds")
+    parser.add_argument("--timeout-seconds", type=float, default=MOCK_CONFIG["timeout_seconds"])
+    parser.add_argument("--retry-after-seconds", type=float, default=MOCK_CONFIG["retry_after_seconds"])
+    parser.add_argument("--log-requests", default=MOCK_CONFIG["log_requests"],
+                        help="Append one JSON line per request to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    if not AIOHTTP_AVAILABLE:
+        print("aiohttp is required: pip install aiohttp")
+        sys.exit(1)
+
+    config = {
+        "latency_dist": args.latency_dist,
+        "latency_ms": args.latency_ms,
+        "latency_spread_ms": args.latency_spread_ms,
+        "latency_sigma": args.latency_sigma,
+        "tokens_per_second": args.tokens_per_second,
+        "completion_tokens": args.completion_tokens,
+        "embedding_dim": args.embedding_dim,
+        "embedding_latency_ms": args.embedding_latency_ms,
+        "error_rate_429": args.error_rate_429,
+        "error_rate_500": args.error_rate_500,
+        "timeout_rate": args.timeout_rate,
+        "timeout_seconds": args.timeout_seconds,
+        "retry_after_seconds": args.retry_after_seconds,
+        "log_requests": args.log_requests,
+    }
+    print(f"Mock provider listening on http://{args.host}:{args.port}/v1 ({args.workers} worker(s))",
+          file=sys.stderr)
+
+    if args.workers <= 1:
+        serve(config, args.host, args.port)
+        return
+
+    # Each worker has its own event loop and counters; /mock/stats reports
+    # whichever process answered it
+    workers = [
+        multiprocessing.Process(target=serve, args=(config, args.host, args.port, True), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    # Installed after the fork so workers keep aiohttp's own handling. Daemon
+    # workers are only cleaned up on a normal exit, which SIGTERM would skip
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+LiteLLM Traffic Replay
+
+Replays real request shapes recorded by Langfuse to compare gateway
+configurations. `export` pulls a time window of LLM generations from
+Langfuse's ClickHouse into a JSONL trace: arrival offset, model, input and
+output tokens, streaming, recorded latency and cost. Shapes only, no prompt
+or response content. `run` replays the trace with its original arrival timing
+(so the original concurrency), or sped up, against each variant and prints
+latency, error and cost outcomes side by side.
+
+A variant is NAME=URL for a gateway that is already running, or NAME=CONFIG
+for a LiteLLM config file. Config variants are started locally with
+`litellm --config` after every deployment is pointed at the bundled mock
+provider, so router_settings and litellm_settings (routing strategy, retries,
+timeouts, fallbacks) can be compared without provider costs. Use the --mock-*
+failure rates to give retries and fallbacks something to do.
+
+Usage:
+    pip install aiohttp requests clickhouse-connect pyyaml "litellm[proxy]"
+    export CLICKHOUSE_HOST=... CLICKHOUSE_USER=... CLICKHOUSE_PASSWORD=...
+
+    python replay.py export --from "2026-01-05 14:00" --minutes 30 -o peak.jsonl
+    python replay.py run peak.jsonl --speedup 2 --mock-error-rate-429 0.05 \\
+        --variant current=../litellm/config.yaml --variant more-retries=retries.yaml
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import requests
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from benchmark import percentiles, send_request, summarise
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Langfuse v3 stores LiteLLM calls as GENERATION observations
+EXPORT_QUERY = """
+SELECT
+    toUnixTimestamp64Milli(start_time) AS start_ms,
+    provided_model_name,
+    usage_details['input'] AS input_tokens,
+    usage_details['output'] AS output_tokens,
+    JSONExtractBool(ifNull(model_parameters, ''), 'stream') AS stream,
+    dateDiff('millisecond', start_time, end_time) AS latency_ms,
+    if(completion_start_time IS NULL, NULL,
+       dateDiff('millisecond', start_time, completion_start_time)) AS ttft_ms,
+    toFloat64(ifNull(total_cost, 0)) AS cost
+FROM observations FINAL
+WHERE type = 'GENERATION' AND is_deleted = 0
+  AND start_time >= {start:DateTime64(3)} AND start_time < {end:DateTime64(3)}
+  AND ({project:String} = '' OR project_id = {project:String})
+ORDER BY start_time
+"""
+
+
+# ============================================================================
+# Export
+# ============================================================================
+
+def clickhouse_client():
+    """Client for Langfuse's ClickHouse, from the same env vars as the backup service"""
+    import clickhouse_connect
+
+    return clickhouse_connect.get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+        username=os.getenv("CLICKHOUSE_USER", "clickhouse"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        database=os.getenv("CLICKHOUSE_DB", "default"),
+    )
+
+
+def export_trace(start: datetime, end: datetime, out_path: str, project: str = "") -> int:
+    """Stream one window of generations from ClickHouse to a JSONL trace"""
+    client = clickhouse_client()
+    count = 0
+    first = None
+    with open(out_path, "w") as f, client.query_rows_stream(
+        EXPORT_QUERY, parameters={"start": start, "end": end, "project": project}
+    ) as rows:
+        for start_ms, model, input_tokens, output_tokens, stream, latency_ms, ttft_ms, cost in rows:
+            first = start_ms if first is None else first
+            f.write(json.dumps({
+                "offset": (start_ms - first) / 1000,
+                "model": model,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "stream": bool(stream),
+                "latency_ms": latency_ms,
+                "ttft_ms": ttft_ms,
+                "cost": cost,
+            }) + "\n")
+            count += 1
+    return count
+
+
+def load_trace(path: str, limit: Optional[int] = None) -> List[dict]:
+    with open(path) as f:
+        trace = [json.loads(line) for line in f if line.strip()]
+    return trace[:limit] if limit else trace
+
+
+def trace_summary(trace: List[dict]) -> dict:
+    """What the recorded traffic looked like, for comparison with the replays"""
+    duration = trace[-1]["offset"] if trace else 0
+    return {
+        "requests": len(trace),
+        "duration_seconds": round(duration, 1),
+        "rps": round(len(trace) / duration, 2) if duration else None,
+        "stream_ratio": round(sum(r["stream"] for r in trace) / len(trace), 3) if trace else 0,
+        "models": dict(Counter(r["model"] for r in trace).most_common()),
+        "e2e_ms": percentiles([r["latency_ms"] / 1000 for r in trace if r["latency_ms"] is not None]),
+        "cost": round(sum(r["cost"] or 0 for r in trace), 4),
+    }
+
+
+# ============================================================================
+# Variants
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, process: subprocess.Popen, timeout: float, what: str):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{what} exited with code {process.returncode}")
+        try:
+            if requests.get(url, timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    process.kill()
+    raise RuntimeError(f"{what} did not become ready within {timeout:.0f}s")
+
+
+def start_mock(args, trace: List[dict]) -> tuple:
+    """Mock provider whose default latency and decode speed follow the recorded medians"""
+    ttfts = sorted(r["ttft_ms"] for r in trace if r.get("ttft_ms"))
+    rates = sorted(
+        r["output_tokens"] / ((r["latency_ms"] - r["ttft_ms"]) / 1000) for r in trace
+        if r.get("ttft_ms") and r["output_tokens"] and r["latency_ms"] > r["ttft_ms"]
+    )
+    latency_ms = args.mock_latency_ms if args.mock_latency_ms is not None else (ttfts[len(ttfts) // 2] if ttfts else 300)
+    tokens_per_second = args.mock_tokens_per_second or (rates[len(rates) // 2] if rates else 50)
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(SCRIPTS_DIR, "mock_provider.py"),
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.mock_workers),
+        "--latency-dist", "lognormal", "--latency-ms", str(latency_ms),
+        "--tokens-per-second", str(round(tokens_per_second, 1)), "--completion-tokens", "100000",
+        "--error-rate-429", str(args.mock_error_rate_429), "--error-rate-500", str(args.mock_error_rate_500),
+        "--timeout-rate", str(args.mock_timeout_rate),
+    ], stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    _wait_for(f"{url}/health", process, 15, "Mock provider")
+    return process, url
+
+
+def mock_counters(url: str, workers: int, timeout: float = 10) -> Counter:
+    """
+    /mock/stats counters summed over every mock worker.
+
+    Each worker counts only what it served and the kernel picks which one
+    answers, so ask on fresh connections until every PID has reported.
+    """
+    seen = {}
+    deadline = time.time() + timeout
+    while len(seen) < workers:
+        if time.time() > deadline:
+            raise RuntimeError(f"Only {len(seen)} of {workers} mock workers answered /mock/stats")
+        stats = requests.get(f"{url}/mock/stats", headers={"Connection": "close"}, timeout=5).json()
+        seen[stats["pid"]] = stats["counters"]
+    return sum((Counter(counters) for counters in seen.values()), Counter())
+
+
+def mock_config(path: str, mock_url: str, models: List[str], master_key: str) -> dict:
+    """
+    The variant's config with every deployment sent to the mock provider.
+
+    router_settings and litellm_settings are kept as written (they are what is
+    being compared); callbacks, the Redis cache and the database are dropped so
+    the replay needs nothing but the mock.
+    """
+    import yaml
+
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    deployments = []
+    for entry in config.get("model_list") or []:
+        params = dict(entry.get("litellm_params") or {})
+        params.update(model=f"openai/{entry['model_name']}", api_base=f"{mock_url}/v1", api_key="mock")
+        deployments.append(dict(entry, litellm_params=params))
+    # Models stored in the database (STORE_MODEL_IN_DB) aren't in the file
+    known = {d["model_name"] for d in deployments}
+    for model in models:
+        if model not in known:
+            deployments.append({"model_name": model, "litellm_params": {
+                "model": f"openai/{model}", "api_base": f"{mock_url}/v1", "api_key": "mock"}})
+    config["model_list"] = deployments
+
+    settings = dict(config.get("litellm_settings") or {})
+    for key in ("success_callback", "failure_callback", "callbacks", "cache", "cache_params"):
+        settings.pop(key, None)
+    config["litellm_settings"] = settings
+    general = dict(config.get("general_settings") or {})
+    for key in ("database_url", "store_model_in_db", "background_health_checks", "alerting"):
+        general.pop(key, None)
+    general["master_key"] = master_key
+    config["general_settings"] = general
+    return config
+
+
+def start_gateway(config: dict) -> tuple:
+    """Run LiteLLM on a config; returns (process, url, config file)"""
+    import yaml
+
+    handle, config_path = tempfile.mkstemp(prefix="replay-", suffix=".yaml")
+    with os.fdopen(handle, "w") as f:
+        yaml.safe_dump(config, f)
+    port = _free_port()
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "REDIS_HOST")}
+    process = subprocess.Popen(
+        ["litellm", "--config", config_path, "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    _wait_for(f"{url}/health/liveliness", process, 90, "LiteLLM")
+    return process, url, config_path
+
+
+# ============================================================================
+# Replay
+# ============================================================================
+
+def _prompt(tokens: int, cache: Dict[int, str]) -> str:
+    """About `tokens` prompt tokens (one per repeated short word)"""
+    tokens = max(1, int(tokens or 1))
+    if tokens not in cache:
+        cache[tokens] = " ".join(["hello"] * tokens)
+    return cache[tokens]
+
+
+async def replay(url: str, api_key: str, trace: List[dict], speedup: float,
+                 connections: int, timeout: float) -> dict:
+    """Send the trace open-loop on its recorded schedule (divided by speedup)"""
+    loop = asyncio.get_running_loop()
+    prompts = {}
+    lags = []
+    tasks = []
+    connector = aiohttp.TCPConnector(limit=connections, limit_per_host=connections, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = loop.time()
+        for record in trace:
+            scheduled = started + record["offset"] / speedup
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, loop.time() - scheduled))
+            tasks.append(asyncio.create_task(send_request(
+                session, url, api_key, record["model"], _prompt(record["input_tokens"], prompts),
+                max(1, int(record["output_tokens"] or 1)), record["stream"], scheduled
+            )))
+        results = await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+
+    report = summarise(results, elapsed, lags, {"url": url, "speedup": speedup, "connections": connections})
+    # Langfuse's recorded cost of the requests this variant answered. It isn't
+    # repriced: a fallback to another model or a retry costs the same here
+    report["recorded_cost_served"] = round(sum((rec["cost"] or 0) for rec, r in zip(trace, results) if r["ok"]), 4)
+    return report
+
+
+def run_variant(name: str, target: str, trace: List[dict], args) -> dict:
+    """Replay against one variant, starting the mock and LiteLLM for config variants"""
+    mock = gateway = None
+    config_path = None
+    try:
+        if target.startswith(("http://", "https://")):
+            url, api_key = target.rstrip("/"), os.getenv("LITELLM_API_KEY", "")
+        else:
+            mock, mock_url = start_mock(args, trace)
+            api_key = "sk-replay"
+            models = sorted({r["model"] for r in trace})
+            gateway, url, config_path = start_gateway(mock_config(target, mock_url, models, api_key))
+        print(f"Replaying {len(trace)} requests against {name} ({target}) at {args.speedup}x...")
+        report = asyncio.run(replay(url, api_key, trace, args.speedup, args.connections, args.timeout))
+        report["variant"] = {"name": name, "target": target}
+        if mock:
+            # Every call LiteLLM made upstream, including its own retries and fallbacks
+            counters = mock_counters(mock_url, args.mock_workers)
+            report["upstream_requests"] = counters["requests"]
+            report["upstream_amplification"] = round(report["upstream_requests"] / len(trace), 3)
+        return report
+    finally:
+        for process in (gateway, mock):
+            if process:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        if config_path:
+            os.remove(config_path)
+
+
+def print_side_by_side(recorded: dict, reports: List[dict]):
+    """One column per variant"""
+    rows = [
+        ("requests", lambda r: r["requests"]),
+        ("error_rate", lambda r: r["error_rate"]),
+        ("throughput_rps", lambda r: r["throughput_rps"]),
+        ("ttft p50 ms", lambda r: r["latency"]["stream"]["ttft_ms"]["p50"]),
+        ("ttft p95 ms", lambda r: r["latency"]["stream"]["ttft_ms"]["p95"]),
+        ("e2e p50 ms", lambda r: r["latency"]["all"]["e2e_ms"]["p50"]),
+        ("e2e p95 ms", lambda r: r["latency"]["all"]["e2e_ms"]["p95"]),
+        ("e2e p99 ms", lambda r: r["latency"]["all"]["e2e_ms"]["p99"]),
+        ("send lag p99 ms", lambda r: r["send_lag_ms"]["p99"]),
+        ("upstream calls", lambda r: r.get("upstream_requests", "-")),
+        ("amplification", lambda r: r.get("upstream_amplification", "-")),
+        ("recorded cost", lambda r: r["recorded_cost_served"]),
+    ]
+    names = [r["variant"]["name"] for r in reports]
+    width = max(12, *(len(n) + 2 for n in names))
+    print(f"\nRecorded: {recorded['requests']} requests over {recorded['duration_seconds']}s, "
+          f"e2e p50/p95 {recorded['e2e_ms']['p50']}/{recorded['e2e_ms']['p95']} ms, cost {recorded['cost']}")
+    print(f"{'metric':<18}" + "".join(f"{n:>{width}}" for n in names))
+    for label, value in rows:
+        print(f"{label:<18}" + "".join(f"{str(value(r)):>{width}}" for r in reports))
+    for report in reports:
+        if report["errors"]:
+            errors = ", ".join(f"{k}={v}" for k, v in sorted(report["errors"].items()))
+            print(f"errors {report['variant']['name']}: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and replay recorded LiteLLM traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export request shapes from Langfuse's ClickHouse")
+    export.add_argument("--from", dest="start", required=True, help="Window start, UTC (e.g. '2026-01-05 14:00')")
+    export.add_argument("--minutes", type=float, default=15, help="Window length")
+    export.add_argument("--project", default="", help="Langfuse project id (default: all projects)")
+    export.add_argument("-o", "--output", required=True, help="JSONL trace to write")
+
+    run = commands.add_parser("run", help="Replay a trace against config variants")
+    run.add_argument("trace", help="JSONL trace from 'export'")
+    run.add_argument("--variant", action="append", required=True, metavar="NAME=CONFIG_OR_URL",
+                     help="LiteLLM config file (run against the mock) or gateway URL; repeat to compare")
+    run.add_argument("--speedup", type=float, default=1.0, help="Replay this many times faster than recorded")
+    run.add_argument("--limit", type=int, help="Replay only the first N requests")
+    run.add_argument("--connections", type=int, default=500, help="Client connection pool size")
+    run.add_argument("--timeout", type=float, default=600, help="Per-request client timeout in seconds")
+    run.add_argument("--mock-latency-ms", type=float, help="Mock time to first token (default: recorded median)")
+    run.add_argument("--mock-tokens-per-second", type=float, help="Mock decode speed (default: recorded median)")
+    run.add_argument("--mock-error-rate-429", type=float, default=0.0)
+    run.add_argument("--mock-error-rate-500", type=float, default=0.0)
+    run.add_argument("--mock-timeout-rate", type=float, default=0.0)
+    run.add_argument("--mock-workers", type=int, default=2)
+    run.add_argument("--json", dest="json_path", help="Write all reports to this file")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        start = datetime.fromisoformat(args.start)
+        count = export_trace(start, start + timedelta(minutes=args.minutes), args.output, args.project)
+        print(f"Exported {count} requests to {args.output}")
+        return
+
+    if not AIOHTTP_AVAILABLE:
+        print("aiohttp is required: pip install aiohttp")
+        sys.exit(1)
+
+    trace = load_trace(args.trace, args.limit)
+    if not trace:
+        print("Trace is empty")
+        sys.exit(1)
+    recorded = trace_summary(trace)
+    reports = []
+    for variant in args.variant:
+        name, _, target = variant.partition("=")
+        if not target:
+            parser.error(f"--variant must be NAME=CONFIG_OR_URL, got {variant!r}")
+        reports.append(run_variant(name, target, trace, args))
+
+    print_side_by_side(recorded, reports)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"recorded": recorded, "variants": reports}, f, indent=2)
+        print(f"\nReports written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
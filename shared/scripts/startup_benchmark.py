@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Cold-Start Benchmark for the Backup Service and Health Monitor
+
+Railway holds a rollout (and a restart after a crash) until the deploy
+healthcheck answers, so how fast the services come up is on the recovery
+path. For each service this measures:
+
+- Import time: `python -X importtime` of the service module, i.e. everything
+  loaded before main() runs, with the heaviest direct imports listed.
+- Ready time: from spawning the process to the first 200 from /ready (the
+  deploy healthcheck), and to the first answer of any kind from /health.
+
+Backends are pointed at a closed local port, so the numbers don't depend on
+(or wait for) a running stack. One untimed run byte-compiles the sources
+first, as the Docker build does. Budgets apply to the median over --runs; a
+breach exits 1, so this can gate CI.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --service monitor --runs 10 --json startup.json
+    python startup_benchmark.py --max-import-ms 150 --max-ready-ms 400
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PRODUCTION_DIR = Path(__file__).resolve().parents[2] / "production"
+
+SERVICES = {
+    "backup": {"dir": "backup-service", "module": "backup"},
+    "monitor": {"dir": "health-monitor", "module": "monitor"},
+}
+
+# Everything the services could connect to at startup points at a closed port
+DEAD = "127.0.0.1:1"
+DEAD_ENV = {
+    "DATABASE_URL": f"postgresql://benchmark@{DEAD}/benchmark",
+    "REDIS_HOST": "127.0.0.1",
+    "REDIS_PORT": "1",
+    "CLICKHOUSE_HOST": "127.0.0.1",
+    "CLICKHOUSE_PORT": "1",
+    "CLICKHOUSE_URL": f"http://{DEAD}",
+    "MINIO_ENDPOINT": DEAD,
+    "LITELLM_URL": f"http://{DEAD}",
+    "LANGFUSE_URL": f"http://{DEAD}",
+    "LANGFUSE_WORKER_URL": f"http://{DEAD}",
+    "BACKUP_ON_STARTUP": "false",
+    "ALERT_WEBHOOK_URL": "",
+    "PAGERDUTY_ROUTING_KEY": "",
+}
+
+
+def service_env(extra: Dict[str, str], port: Optional[int] = None) -> Dict[str, str]:
+    env = dict(os.environ, **DEAD_ENV, **extra)
+    env["PYTHONUNBUFFERED"] = "1"
+    if port is not None:
+        env["PORT"] = str(port)
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_importtime(stderr: str, module: str) -> dict:
+    """Cumulative import time of `module` and of its heaviest direct imports"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative_us)))
+
+    # -X importtime prints children before their parent
+    total_us, children, pending = None, [], []
+    for depth, name, cumulative_us in entries:
+        if depth == 0 and name == module:
+            total_us = cumulative_us
+            children = [(n, us) for d, n, us in pending if d == 1]
+            break
+        pending = [] if depth == 0 else pending + [(depth, name, cumulative_us)]
+    if total_us is None:
+        raise RuntimeError(f"{module} not found in -X importtime output")
+    children.sort(key=lambda c: c[1], reverse=True)
+    return {
+        "import_ms": total_us / 1000,
+        "heaviest": [{"module": n, "ms": round(us / 1000, 1)} for n, us in children[:5]],
+    }
+
+
+def measure_import(service: dict, env: Dict[str, str], python: str) -> dict:
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {service['module']}"],
+        cwd=PRODUCTION_DIR / service["dir"], env=env, capture_output=True, text=True, timeout=60,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {service['module']} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr, service["module"])
+
+
+def _status(url: str) -> Optional[int]:
+    """HTTP status of a GET, or None if nothing is listening yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def measure_ready(service: dict, extra_env: Dict[str, str], python: str, timeout: float) -> dict:
+    """Spawn the service; time the first 200 from /ready and first answer from /health"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [python, f"{service['module']}.py"],
+        cwd=PRODUCTION_DIR / service["dir"], env=service_env(extra_env, port),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        ready_ms = health_ms = health_status = None
+        deadline = started + timeout
+        while ready_ms is None and time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{service['module']}.py exited with {process.returncode}:\n"
+                                   f"{process.stderr.read().decode(errors='replace')[-2000:]}")
+            if _status(f"{base}/ready") == 200:
+                ready_ms = (time.perf_counter() - started) * 1000
+            else:
+                time.sleep(0.005)
+        while ready_ms is not None and health_ms is None and time.perf_counter() < deadline:
+            health_status = _status(f"{base}/health")
+            if health_status is not None:
+                health_ms = (time.perf_counter() - started) * 1000
+            else:
+                time.sleep(0.005)
+        if ready_ms is None:
+            raise RuntimeError(f"{service['module']}.py did not answer /ready within {timeout:.0f}s")
+        return {"ready_ms": ready_ms, "health_ms": health_ms, "health_status": health_status}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def benchmark(name: str, runs: int, extra_env: Dict[str, str], python: str, timeout: float) -> dict:
+    service = SERVICES[name]
+    env = service_env(extra_env)
+    measure_import(service, env, python)  # Byte-compile, untimed
+
+    imports, ready = [], []
+    for _ in range(runs):
+        imports.append(measure_import(service, env, python))
+        ready.append(measure_ready(service, extra_env, python, timeout))
+
+    def summary(values: List[float]) -> dict:
+        return {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+
+    health = [r["health_ms"] for r in ready if r["health_ms"] is not None]
+    return {
+        "service": name,
+        "runs": runs,
+        "import_ms": summary([i["import_ms"] for i in imports]),
+        "ready_ms": summary([r["ready_ms"] for r in ready]),
+        "health_ms": summary(health) if health else None,
+        "health_status": ready[-1]["health_status"],
+        # Heaviest direct imports from the median run
+        "heaviest_imports": sorted(imports, key=lambda i: i["import_ms"])[len(imports) // 2]["heaviest"],
+    }
+
+
+def apply_budgets(result: dict, max_import_ms: Optional[float], max_ready_ms: Optional[float]) -> List[str]:
+    breaches = []
+    if max_import_ms is not None and result["import_ms"]["median"] > max_import_ms:
+        breaches.append(f"import {result['import_ms']['median']:.0f} ms > {max_import_ms:.0f} ms")
+    if max_ready_ms is not None and result["ready_ms"]["median"] > max_ready_ms:
+        breaches.append(f"ready {result['ready_ms']['median']:.0f} ms > {max_ready_ms:.0f} ms")
+    result["breaches"] = breaches
+    return breaches
+
+
+def print_report(results: List[dict]):
+    print(f"{'service':<10} {'import ms':>14} {'/ready ms':>14} {'/health ms':>14}   (median / max)")
+    for r in results:
+        health = f"{r['health_ms']['median']:.0f} / {r['health_ms']['max']:.0f}" if r["health_ms"] else "-"
+        print(f"{r['service']:<10} "
+              f"{r['import_ms']['median']:>7.0f} / {r['import_ms']['max']:<4.0f} "
+              f"{r['ready_ms']['median']:>7.0f} / {r['ready_ms']['max']:<4.0f} "
+              f"{health:>14}   (/health answered {r['health_status']})")
+    for r in results:
+        heaviest = ", ".join(f"{i['module']} {i['ms']:.0f}" for i in r["heaviest_imports"])
+        print(f"  {r['service']} heaviest imports (ms): {heaviest}")
+        for breach in r["breaches"]:
+            print(f"  ❌ {r['service']}: {breach}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the backup service and health monitor")
+    parser.add_argument("--service", choices=[*SERVICES, "all"], default="all")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per service")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time is higher")
+    parser.add_argument("--max-ready-ms", type=float, help="Fail if the median spawn-to-/ready time is higher")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the services (repeatable)")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to run the services with")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for /ready")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    extra_env = dict(value.split("=", 1) for value in args.env)
+    names = list(SERVICES) if args.service == "all" else [args.service]
+    results = []
+    failed = False
+    for name in names:
+        result = benchmark(name, args.runs, extra_env, args.python, args.timeout)
+        failed |= bool(apply_budgets(result, args.max_import_ms, args.max_ready_ms))
+        results.append(result)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"passed": not failed, "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
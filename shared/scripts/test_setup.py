@@ -10,12 +10,20 @@ Usage:
     export LANGFUSE_URL=https://your-langfuse.up.railway.app
     
     python test_setup.py
+    
+    # Machine-readable report; fail if a check is slower than its budget
+    python test_setup.py --json --max-ms litellm_completion=5000 --max-total-ms 8000
 """
 
 import os
 import sys
+import json
+import time
+import argparse
 import requests
-from typing import Tuple, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Optional
 
 
 def check_env_vars() -> Tuple[bool, list]:
@@ -41,40 +49,43 @@ def check_litellm_health(url: str) -> Tuple[bool, str]:
         return False, f"Cannot reach LiteLLM: {e}"
 
 
-def check_litellm_models(url: str, api_key: str) -> Tuple[bool, str]:
-    """Check if LiteLLM has models configured."""
+def list_models(url: str, api_key: str) -> list:
+    """Fetch the models LiteLLM serves (raises requests.RequestException on failure)."""
+    response = requests.get(
+        f"{url}/v1/models",
+        headers={"Authorization": f"Bearer {api_key}"},
+        timeout=10
+    )
+    response.raise_for_status()
+    return response.json().get("data", [])
+
+
+def check_litellm_models(url: str, api_key: str, models: Optional[list] = None) -> Tuple[bool, str]:
+    """Check if LiteLLM has models configured (pass models to skip fetching them)."""
     try:
-        response = requests.get(
-            f"{url}/v1/models",
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=10
-        )
-        if response.ok:
-            data = response.json()
-            models = data.get("data", [])
-            if models:
-                model_names = [m.get("id", "unknown") for m in models[:5]]
-                return True, f"Found {len(models)} models: {', '.join(model_names)}"
-            return False, "No models configured in LiteLLM"
-        return False, f"Models endpoint returned {response.status_code}"
+        if models is None:
+            models = list_models(url, api_key)
+    except requests.HTTPError as e:
+        return False, f"Models endpoint returned {e.response.status_code}"
     except requests.RequestException as e:
         return False, f"Cannot fetch models: {e}"
+    
+    if models:
+        model_names = [m.get("id", "unknown") for m in models[:5]]
+        return True, f"Found {len(models)} models: {', '.join(model_names)}"
+    return False, "No models configured in LiteLLM"
 
 
-def check_litellm_completion(url: str, api_key: str) -> Tuple[bool, str]:
+def check_litellm_completion(url: str, api_key: str, models: Optional[list] = None) -> Tuple[bool, str]:
     """Test a simple completion (requires at least one model configured)."""
     try:
-        # First get available models
-        models_resp = requests.get(
-            f"{url}/v1/models",
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=10
-        )
+        # Use the model list from the models check when there is one
+        if models is None:
+            try:
+                models = list_models(url, api_key)
+            except requests.HTTPError:
+                return False, "Cannot fetch models to test"
         
-        if not models_resp.ok:
-            return False, "Cannot fetch models to test"
-        
-        models = models_resp.json().get("data", [])
         if not models:
             return False, "No models available for testing"
         
@@ -128,15 +139,148 @@ def print_result(name: str, success: bool, message: str):
     print()
 
 
+@dataclass
+class Check:
+    """One node of the check graph"""
+    name: str  # Key in the JSON report and for --max-ms
+    title: str
+    run: Callable[[dict], Tuple[bool, str]]
+    deps: Tuple[str, ...] = ()  # Checks that must pass first
+    required: bool = True  # Counts towards the overall result
+
+
+def run_checks(checks: List[Check], context: dict, max_workers: int = 4) -> Dict[str, dict]:
+    """
+    Run checks concurrently as soon as their dependencies have passed.
+    
+    Checks share results (such as the model list) through context. A check
+    whose dependency failed is skipped rather than run.
+    """
+    results = {}
+    pending = {check.name: check for check in checks}
+    running = {}
+    
+    def timed(check: Check) -> dict:
+        started = time.perf_counter()
+        try:
+            ok, message = check.run(context)
+        except Exception as e:
+            ok, message = False, f"{type(e).__name__}: {e}"
+        return {
+            "ok": ok,
+            "skipped": False,
+            "message": message,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for check in list(pending.values()):
+                failed = [d for d in check.deps if d in results and not results[d]["ok"]]
+                if failed:
+                    results[check.name] = {
+                        "ok": False,
+                        "skipped": True,
+                        "message": f"Skipped: {', '.join(failed)} failed",
+                        "duration_ms": 0.0,
+                    }
+                    del pending[check.name]
+                elif all(d in results for d in check.deps):
+                    running[pool.submit(timed, check)] = check
+                    del pending[check.name]
+            
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future).name] = future.result()
+    
+    return results
+
+
+def models_check(context: dict) -> Tuple[bool, str]:
+    """Fetch the model list once and share it with the completion check."""
+    try:
+        context["models"] = list_models(context["litellm_url"], context["litellm_key"])
+    except requests.RequestException:
+        context["models"] = None
+    return check_litellm_models(context["litellm_url"], context["litellm_key"], context["models"])
+
+
+def build_checks(langfuse_url: str) -> List[Check]:
+    """The setup check graph"""
+    return [
+        Check("litellm_health", "LiteLLM Health",
+              lambda c: check_litellm_health(c["litellm_url"])),
+        Check("litellm_models", "LiteLLM Models", models_check),
+        Check("litellm_completion", "LiteLLM Completion",
+              lambda c: check_litellm_completion(c["litellm_url"], c["litellm_key"], c["models"]),
+              deps=("litellm_models",)),
+        Check("langfuse_health", "Langfuse Health",
+              lambda c: check_langfuse_health(c["langfuse_url"]),
+              required=bool(langfuse_url)),
+    ]
+
+
+def build_report(checks: List[Check], results: Dict[str, dict], total_ms: float,
+                 max_ms: Dict[str, float], max_total_ms: Optional[float]) -> dict:
+    """Results in graph order, with latency budgets applied"""
+    report_checks = []
+    for check in checks:
+        result = dict(results[check.name], name=check.name, required=check.required)
+        result["max_ms"] = max_ms.get(check.name)
+        result["too_slow"] = bool(
+            result["max_ms"] is not None and not result["skipped"]
+            and result["duration_ms"] > result["max_ms"]
+        )
+        report_checks.append(result)
+    
+    total_too_slow = max_total_ms is not None and total_ms > max_total_ms
+    passed = not total_too_slow and all(
+        (c["ok"] or not c["required"]) and not c["too_slow"] for c in report_checks
+    )
+    return {
+        "passed": passed,
+        "total_ms": round(total_ms, 1),
+        "max_total_ms": max_total_ms,
+        "checks": report_checks,
+    }
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    """Parse repeated --max-ms name=milliseconds options."""
+    budgets = {}
+    for value in values:
+        name, _, ms = value.partition("=")
+        budgets[name.strip()] = float(ms)
+    return budgets
+
+
 def main():
-    print("=" * 60)
-    print("🔍 LiteLLM + Langfuse Stack Health Check")
-    print("=" * 60)
-    print()
+    parser = argparse.ArgumentParser(description="Check a LiteLLM + Langfuse deployment")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report instead of text")
+    parser.add_argument("--max-ms", action="append", default=[], metavar="CHECK=MS",
+                        help="Fail if a check takes longer than this (repeatable)")
+    parser.add_argument("--max-total-ms", type=float, help="Fail if all checks together take longer than this")
+    args = parser.parse_args()
+    
+    max_ms = parse_budgets(args.max_ms)
+    unknown = set(max_ms) - {check.name for check in build_checks("")}
+    if unknown:
+        parser.error(f"unknown check in --max-ms: {', '.join(sorted(unknown))}")
+    
+    if not args.json:
+        print("=" * 60)
+        print("🔍 LiteLLM + Langfuse Stack Health Check")
+        print("=" * 60)
+        print()
     
     # Check environment variables
     env_ok, missing = check_env_vars()
     if not env_ok:
+        if args.json:
+            print(json.dumps({"passed": False, "error": f"Missing required variables: {', '.join(missing)}"}))
+            sys.exit(1)
         print_result(
             "Environment Variables",
             False,
@@ -148,44 +292,44 @@ def main():
         print("  export LANGFUSE_URL=https://your-langfuse.up.railway.app  # optional")
         sys.exit(1)
     
-    print_result("Environment Variables", True, "All required variables set")
+    if not args.json:
+        print_result("Environment Variables", True, "All required variables set")
     
     # Get URLs
-    litellm_url = os.getenv("LITELLM_URL").rstrip("/")
-    litellm_key = os.getenv("LITELLM_API_KEY")
-    langfuse_url = os.getenv("LANGFUSE_URL", "").rstrip("/")
-    
-    all_passed = True
-    
-    # Check LiteLLM health
-    ok, msg = check_litellm_health(litellm_url)
-    print_result("LiteLLM Health", ok, msg)
-    all_passed = all_passed and ok
-    
-    # Check LiteLLM models
-    ok, msg = check_litellm_models(litellm_url, litellm_key)
-    print_result("LiteLLM Models", ok, msg)
-    if not ok:
-        print("   💡 Add models via LiteLLM UI or API:")
-        print(f"      {litellm_url}/ui")
-        print()
-    all_passed = all_passed and ok
+    context = {
+        "litellm_url": os.getenv("LITELLM_URL").rstrip("/"),
+        "litellm_key": os.getenv("LITELLM_API_KEY"),
+        "langfuse_url": os.getenv("LANGFUSE_URL", "").rstrip("/"),
+    }
+    litellm_url = context["litellm_url"]
+    langfuse_url = context["langfuse_url"]
+    
+    checks = build_checks(langfuse_url)
+    started = time.perf_counter()
+    results = run_checks(checks, context)
+    report = build_report(
+        checks, results, (time.perf_counter() - started) * 1000,
+        max_ms, args.max_total_ms
+    )
     
-    # Check completion (only if models exist)
-    if "Found" in msg:  # Models were found
-        ok, msg = check_litellm_completion(litellm_url, litellm_key)
-        print_result("LiteLLM Completion", ok, msg)
-        all_passed = all_passed and ok
+    if args.json:
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["passed"] else 1)
     
-    # Check Langfuse
-    ok, msg = check_langfuse_health(langfuse_url)
-    print_result("Langfuse Health", ok, msg)
-    if langfuse_url:
-        all_passed = all_passed and ok
+    for result, check in zip(report["checks"], checks):
+        message = f"{result['message']} ({result['duration_ms']:.0f} ms)"
+        if result["too_slow"]:
+            message += f" - over the {result['max_ms']:.0f} ms budget"
+        print_result(check.title, result["ok"] and not result["too_slow"], message)
+        if check.name == "litellm_models" and not result["ok"]:
+            print("   💡 Add models via LiteLLM UI or API:")
+            print(f"      {litellm_url}/ui")
+            print()
     
     # Summary
     print("=" * 60)
-    if all_passed:
+    print(f"Checks took {report['total_ms']:.0f} ms")
+    if report["passed"]:
         print("🎉 All checks passed! Your stack is ready.")
         print()
         print("Next steps:")
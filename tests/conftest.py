@@ -0,0 +1,21 @@
+"""
+Unit tests for the pure-logic parts of the services and examples.
+
+The services and examples aren't packages; each runs from its own directory,
+so put those directories on the import path the same way.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in (
+    "production/backup-service",
+    "production/health-monitor",
+    "shared/examples",
+    "shared/scripts",
+):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
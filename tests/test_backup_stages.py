@@ -0,0 +1,115 @@
+"""Tests for the backup stage scheduler."""
+
+import threading
+import time
+
+from backup import Stage, run_stages
+
+
+class Recorder:
+    """Stage bodies that log start/end and track how many run at once"""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def stage(self, name, seconds=0.02, error=None):
+        def run():
+            with self._lock:
+                self.events.append(("start", name))
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(seconds)
+            with self._lock:
+                self.running -= 1
+                self.events.append(("end", name))
+            if error:
+                raise RuntimeError(error)
+        return run
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+
+def test_dependencies_run_first():
+    rec = Recorder()
+    stages = [
+        Stage("upload", "Upload", rec.stage("upload"), deps=("dump_a", "dump_b")),
+        Stage("dump_a", "A", rec.stage("dump_a")),
+        Stage("dump_b", "B", rec.stage("dump_b")),
+    ]
+    assert run_stages(stages, 4, 1000) == {"dump_a": None, "dump_b": None, "upload": None}
+    assert rec.index("start", "upload") > rec.index("end", "dump_a")
+    assert rec.index("start", "upload") > rec.index("end", "dump_b")
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [Stage(name, name, barrier.wait) for name in ("a", "b")]
+    # Each waits for the other, so this only finishes if both run at once
+    assert run_stages(stages, 2, 1000) == {"a": None, "b": None}
+
+
+def test_concurrency_limit():
+    rec = Recorder()
+    stages = [Stage(name, name, rec.stage(name)) for name in "abcdef"]
+    run_stages(stages, 2, 1000)
+    assert rec.peak == 2
+
+
+def test_memory_budget_serialises_large_stages():
+    rec = Recorder()
+    stages = [
+        Stage("a", "A", rec.stage("a"), memory_mb=60),
+        Stage("b", "B", rec.stage("b"), memory_mb=60),
+        Stage("c", "C", rec.stage("c"), memory_mb=30),
+    ]
+    assert run_stages(stages, 3, 100) == {"a": None, "b": None, "c": None}
+    starts = {name: rec.index("start", name) for name in "ab"}
+    first, second = sorted(starts, key=starts.get)
+    assert rec.index("start", second) > rec.index("end", first)
+    assert rec.peak == 2  # the small stage fits beside either
+
+
+def test_stage_over_budget_runs_alone():
+    rec = Recorder()
+    stages = [
+        Stage("big", "Big", rec.stage("big"), memory_mb=500),
+        Stage("small", "Small", rec.stage("small"), memory_mb=10),
+    ]
+    assert run_stages(stages, 2, 100) == {"big": None, "small": None}
+    assert rec.peak == 1
+
+
+def test_failure_skips_dependents():
+    rec = Recorder()
+    stages = [
+        Stage("dump", "Dump", rec.stage("dump", error="disk full")),
+        Stage("upload", "Upload", rec.stage("upload"), deps=("dump",)),
+        Stage("verify", "Verify", rec.stage("verify"), deps=("upload",)),
+        Stage("cleanup", "Cleanup", rec.stage("cleanup"), deps=("dump",), always_run=True),
+    ]
+    results = run_stages(stages, 4, 1000)
+    assert results["dump"] == "disk full"
+    assert results["upload"] == "skipped (dump failed)"
+    assert results["verify"] == "skipped (upload failed)"
+    assert results["cleanup"] is None
+    assert ("start", "upload") not in rec.events
+    assert ("start", "verify") not in rec.events
+
+
+def test_unknown_dependency_is_skipped():
+    rec = Recorder()
+    stages = [
+        Stage("a", "A", rec.stage("a")),
+        Stage("b", "B", rec.stage("b"), deps=("missing",)),
+    ]
+    assert run_stages(stages, 2, 1000) == {"a": None, "b": "skipped (unmet dependencies)"}
+
+
+def test_results_are_filled_in_place():
+    results = {}
+    returned = run_stages([Stage("a", "A", lambda: None)], 1, 100, results)
+    assert returned is results and results == {"a": None}
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("openai")
+
+from batch_embeddings import EmbeddingCache
+
+
+def key(n: int) -> bytes:
+    return bytes([n]) * 16
+
+
+def test_reopen_returns_cached_vectors(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path))
+    cache.put_many([key(1), key(2)], np.array([[1, 1], [2, 2]], dtype=np.float32))
+
+    reopened = EmbeddingCache("m", str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.get(key(2)).tolist() == [2, 2]
+    assert reopened.get(key(3)) is None
+
+
+def test_put_skips_keys_already_cached(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path))
+    cache.put_many([key(1)], np.array([[1, 1]], dtype=np.float32))
+    cache.put_many([key(1), key(2)], np.array([[7, 7], [2, 2]], dtype=np.float32))
+    assert cache.get(key(1)).tolist() == [1, 1]
+    assert cache.get(key(2)).tolist() == [2, 2]
+
+
+def test_orphan_vectors_from_a_crashed_append_are_dropped(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path))
+    cache.put_many([key(1)], np.array([[1, 1]], dtype=np.float32))
+    # Crash after the vectors were appended, before their keys
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.array([[9, 9]], dtype=np.float32).tobytes())
+
+    reopened = EmbeddingCache("m", str(tmp_path))
+    assert len(reopened) == 1
+    reopened.put_many([key(2)], np.array([[2, 2]], dtype=np.float32))
+
+    again = EmbeddingCache("m", str(tmp_path))
+    assert again.get(key(1)).tolist() == [1, 1]
+    assert again.get(key(2)).tolist() == [2, 2]
+
+
+def test_partial_rows_are_truncated(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path))
+    cache.put_many([key(1)], np.array([[1, 1]], dtype=np.float32))
+    # Torn writes: half a vector and half a key
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\x00" * 4)
+    with open(cache.keys_path, "ab") as f:
+        f.write(key(2)[:8])
+
+    reopened = EmbeddingCache("m", str(tmp_path))
+    reopened.put_many([key(3)], np.array([[3, 3]], dtype=np.float32))
+    assert EmbeddingCache("m", str(tmp_path)).get(key(3)).tolist() == [3, 3]
@@ -0,0 +1,43 @@
+"""Tests for the streaming index merge in the bucket sync."""
+
+import pytest
+
+import bucket_sync
+
+
+def test_replay_applies_deltas_in_order():
+    base = iter([["a", "e1", 1], ["b", "e2", 2], ["c", "e3", 3]])
+    deltas = [
+        iter([["+", "b", "e2x", 20], ["-", "c"]]),
+        iter([["+", "c", "e3y", 30], ["+", "d", "e4", 4]]),
+        iter([["-", "a"]]),
+    ]
+    assert list(bucket_sync.replay(base, deltas)) == [
+        ["b", "e2x", 20],
+        ["c", "e3y", 30],
+        ["d", "e4", 4],
+    ]
+
+
+def test_replay_without_deltas_is_the_base():
+    rows = [["a", "e1", 1], ["b", "e2", 2]]
+    assert list(bucket_sync.replay(iter(rows), [])) == rows
+
+
+def test_side_by_side_pairs_keys():
+    listed = iter([["a", "e1", 1], ["b", "e2", 2], ["d", "e4", 4]])
+    indexed = iter([["b", "old", 2], ["c", "e3", 3], ["d", "e4", 4]])
+    assert [
+        (key, bool(new), bool(old))
+        for key, new, old in bucket_sync._side_by_side(listed, indexed)
+    ] == [
+        ("a", True, False),
+        ("b", True, True),
+        ("c", False, True),
+        ("d", True, True),
+    ]
+
+
+def test_ordered_rejects_unsorted_rows():
+    with pytest.raises(RuntimeError, match="not in key order"):
+        list(bucket_sync._ordered(iter([["b"], ["a"]]), "index"))
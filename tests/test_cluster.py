@@ -0,0 +1,120 @@
+"""Tests for the health monitor's cluster mode."""
+
+import json
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+import requests
+
+import cluster
+import monitor
+from monitor import ServiceHealth, ServiceStatus
+
+
+@pytest.fixture
+def leader(monkeypatch):
+    monkeypatch.setitem(monitor.CONFIG, "alert_webhook_url", "https://hooks.example/slack")
+    monkeypatch.setitem(monitor.CONFIG, "pagerduty_routing_key", "")
+    monkeypatch.setitem(monitor.CONFIG, "alert_cooldown_minutes", 15)
+    node = cluster.Cluster(client=fakeredis.FakeRedis())
+    assert node.heartbeat()
+    return node
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    sent = []
+    monkeypatch.setattr(requests, "post", lambda url, json=None, timeout=None: sent.append(json))
+    return sent
+
+
+def publish_down(node, name="postgres"):
+    node.publish({name: ServiceHealth(
+        name=name, status=ServiceStatus.UNHEALTHY, last_check=datetime.utcnow().isoformat(),
+        error="connection refused", consecutive_failures=monitor.CONFIG["consecutive_failures_threshold"],
+    )})
+
+
+def incident(node, name="postgres"):
+    return json.loads(node.redis.hget(node.key("alerts"), name))
+
+
+def test_ring_is_empty_without_members():
+    assert cluster.HashRing([]).owner("postgres") is None
+
+
+def test_ring_owner_is_stable_and_order_independent():
+    names = [f"check-{i}" for i in range(200)]
+    a = cluster.HashRing(["r1", "r2", "r3"])
+    b = cluster.HashRing(["r3", "r1", "r2"])
+    assert [a.owner(n) for n in names] == [b.owner(n) for n in names]
+
+
+def test_ring_spreads_checks_across_members():
+    ring = cluster.HashRing(["r1", "r2", "r3"])
+    owners = [ring.owner(f"check-{i}") for i in range(3000)]
+    for member in ("r1", "r2", "r3"):
+        assert 600 < owners.count(member) < 1400
+
+
+def test_ring_moves_only_the_leaving_members_checks():
+    names = [f"check-{i}" for i in range(1000)]
+    before = cluster.HashRing(["r1", "r2", "r3"])
+    after = cluster.HashRing(["r1", "r2"])
+    for name in names:
+        if before.owner(name) != "r3":
+            assert after.owner(name) == before.owner(name)
+        else:
+            assert after.owner(name) in ("r1", "r2")
+
+
+def test_ring_joining_member_only_takes_checks():
+    names = [f"check-{i}" for i in range(1000)]
+    before = cluster.HashRing(["r1", "r2"])
+    after = cluster.HashRing(["r1", "r2", "r3"])
+    moved = [n for n in names if after.owner(n) != before.owner(n)]
+    assert moved and all(after.owner(n) == "r3" for n in moved)
+
+
+def test_owned_splits_checks_between_replicas(leader, monkeypatch):
+    names = [f"check-{i}" for i in range(100)]
+    monkeypatch.setitem(cluster.cluster_state, "members", [leader.replica, "other"])
+    mine = leader.owned(names)
+    ring = cluster.HashRing([leader.replica, "other"])
+    assert mine == [n for n in names if ring.owner(n) == leader.replica]
+    assert 0 < len(mine) < len(names)
+
+
+def test_open_incident_alerts_once_within_cooldown(leader, posts):
+    publish_down(leader)
+    leader.evaluate_alerts(["postgres"])
+    leader.evaluate_alerts(["postgres"])
+    assert len(posts) == 1
+    assert incident(leader)["last_alert_time"]
+
+
+def test_open_incident_alerts_again_after_cooldown(leader, posts):
+    publish_down(leader)
+    leader.evaluate_alerts(["postgres"])
+    stale = (datetime.utcnow() - timedelta(minutes=20)).isoformat()
+    leader.redis.hset(leader.key("alerts"), "postgres", json.dumps({**incident(leader), "last_alert_time": stale}))
+
+    leader.evaluate_alerts(["postgres"])
+    assert len(posts) == 2
+    assert incident(leader)["last_alert_time"] > stale
+
+    # The refreshed time starts a new cooldown
+    leader.evaluate_alerts(["postgres"])
+    assert len(posts) == 2
+
+
+def test_recovery_closes_incident(leader, posts):
+    publish_down(leader)
+    leader.evaluate_alerts(["postgres"])
+    leader.publish({"postgres": ServiceHealth(
+        name="postgres", status=ServiceStatus.HEALTHY, last_check=datetime.utcnow().isoformat(),
+    )})
+    leader.evaluate_alerts(["postgres"])
+    assert leader.redis.hget(leader.key("alerts"), "postgres") is None
+    assert len(posts) == 2
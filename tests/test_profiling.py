@@ -0,0 +1,58 @@
+import io
+import json
+
+import pytest
+
+import profiling
+
+
+class FakeHandler:
+    """The parts of BaseHTTPRequestHandler that profiling.handle() uses"""
+
+    def __init__(self, path: str, token: str = "secret"):
+        self.path = path
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.wfile = io.BytesIO()
+        self.status = None
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, name, value):
+        pass
+
+    def end_headers(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def debug_token(monkeypatch):
+    monkeypatch.setattr(profiling, "DEBUG_TOKEN", "secret")
+
+
+def test_wrong_token_is_not_found():
+    handler = FakeHandler("/debug/profile?seconds=0.05", token="wrong")
+    profiling.handle(handler)
+    assert handler.status == 404
+
+
+def test_query_string_token_is_ignored():
+    handler = FakeHandler("/debug/memory?token=secret", token="")
+    profiling.handle(handler)
+    assert handler.status == 404
+
+
+@pytest.mark.parametrize("query", [
+    "seconds=nan", "seconds=inf", "hz=nan", "hz=-inf", "seconds=0", "hz=-1", "seconds=abc",
+])
+def test_bad_profile_parameters_are_rejected(query):
+    handler = FakeHandler(f"/debug/profile?{query}")
+    profiling.handle(handler)
+    assert handler.status == 400
+    assert "error" in json.loads(handler.wfile.getvalue())
+
+
+def test_short_profile_returns_collapsed_stacks():
+    handler = FakeHandler("/debug/profile?seconds=0.05&hz=200")
+    profiling.handle(handler)
+    assert handler.status == 200
@@ -0,0 +1,59 @@
+"""Tests for the precompiled prompt templates in the Python integration example."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from python_integration import CachedPrompt, CompiledTemplate
+
+
+@pytest.mark.parametrize("template, values, expected", [
+    ("Hello {{name}}!", {"name": "Ada"}, "Hello Ada!"),
+    ("a {{ x }} b {{y}} c", {"x": 1, "y": 2.5}, "a 1 b 2.5 c"),
+    ("{{x}}{{x}}", {"x": "ab"}, "abab"),
+    ("no variables", {"x": 1}, "no variables"),
+    ("", {}, ""),
+    ("{{x}}", {"x": None}, ""),
+    # Missing variables are left exactly as written
+    ("Hi {{name}} and {{ other }}", {"name": "Ada"}, "Hi Ada and {{ other }}"),
+    # Values aren't rescanned for variables
+    ("{{x}}", {"x": "{{y}}", "y": 2}, "{{y}}"),
+    ("{{a\nb}}", {"a\nb": "multi"}, "multi"),
+    ("{single} {{x}}", {"x": 1}, "{single} 1"),
+])
+def test_render(template, values, expected):
+    assert CompiledTemplate(template).render(values) == expected
+
+
+def test_render_is_repeatable():
+    template = CompiledTemplate("{{greeting}}, {{name}}")
+    assert template.render({"greeting": "Hi", "name": "a"}) == "Hi, a"
+    assert template.render({"greeting": "Bye", "name": "b"}) == "Bye, b"
+    assert template.variables == ["greeting", "name"]
+
+
+def test_cached_text_prompt():
+    prompt = SimpleNamespace(version=3, config={}, prompt="Summarise {{text}}")
+    cached = CachedPrompt(prompt, fetched_at=0.0)
+    assert cached.compile(text="this") == "Summarise this"
+
+
+def test_cached_chat_prompt():
+    prompt = SimpleNamespace(version=1, config={"model": "gpt-4o"}, prompt=[
+        {"role": "system", "content": "You are {{persona}}."},
+        {"role": "user", "content": "{{question}}"},
+    ])
+    cached = CachedPrompt(prompt, fetched_at=0.0)
+    assert cached.compile(persona="terse", question="Why?") == [
+        {"role": "system", "content": "You are terse."},
+        {"role": "user", "content": "Why?"},
+    ]
+
+
+def test_chat_prompt_with_placeholder_uses_the_sdk():
+    calls = []
+    prompt = SimpleNamespace(version=1, config={}, prompt=[
+        {"type": "placeholder", "name": "history"},
+    ], compile=lambda **kw: calls.append(kw) or "compiled")
+    assert CachedPrompt(prompt, fetched_at=0.0).compile(history=[]) == "compiled"
+    assert calls == [{"history": []}]
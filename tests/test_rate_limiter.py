@@ -0,0 +1,102 @@
+"""Tests for the upload rate limiter."""
+
+import io
+import threading
+
+import pytest
+
+import backup
+from backup import RateLimiter, ThrottledReader
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.slept.append(seconds)
+            self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(backup, "time", fake)
+    return fake
+
+
+def test_zero_rate_is_unlimited(clock):
+    limiter = RateLimiter(0)
+    assert not limiter.active
+    assert limiter.acquire(100 * MB) == 0.0
+    assert clock.slept == []
+
+
+def test_paces_to_the_rate(clock):
+    limiter = RateLimiter(2)
+    assert limiter.active
+    waits = [limiter.acquire(MB) for _ in range(4)]
+    # The first MB goes straight away, each after it waits half a second
+    assert waits == pytest.approx([0.0, 0.5, 0.5, 0.5])
+    assert clock.now == pytest.approx(1001.5)
+
+
+def test_idle_time_is_not_banked(clock):
+    limiter = RateLimiter(1)
+    limiter.acquire(MB)
+    clock.now += 10
+    assert limiter.acquire(MB) == 0.0
+    assert limiter.acquire(MB) == pytest.approx(1.0)
+
+
+def test_scale_slows_the_rate(clock):
+    limiter = RateLimiter(4)
+    limiter.scale(0.25)
+    limiter.acquire(MB)
+    assert limiter.acquire(MB) == pytest.approx(1.0)
+    limiter.scale(1.0)
+    limiter.acquire(MB)
+    assert limiter.acquire(MB) == pytest.approx(0.25)
+
+
+def test_scale_to_zero_stops_pacing(clock):
+    limiter = RateLimiter(1)
+    limiter.scale(0)
+    assert limiter.acquire(MB) == 0.0
+    assert limiter.acquire(MB) == 0.0
+
+
+def test_shared_between_threads():
+    # Real clock: 4 threads x 4 x 64 KiB at 4 MB/s takes about a quarter second
+    limiter = RateLimiter(4)
+    waited = []
+
+    def send():
+        waited.append(sum(limiter.acquire(64 * 1024) for _ in range(4)))
+
+    threads = [threading.Thread(target=send) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(waited) == pytest.approx(15 * 64 * 1024 / (4 * MB), abs=0.05)
+
+
+def test_throttled_reader_paces_reads(clock):
+    data = b"x" * (3 * MB)
+    reader = ThrottledReader(io.BytesIO(data), RateLimiter(1))
+    chunk = bytearray(MB)
+    sizes = [reader.readinto(chunk) for _ in range(4)]
+    assert sizes == [MB, MB, MB, 0]
+    # Three 1 MB reads at 1 MB/s: the second and third wait a second each
+    assert reader.waited == pytest.approx(2.0)
@@ -0,0 +1,25 @@
+"""
+Modules copied into more than one service.
+
+Railway builds each service from its own directory, so a module both need is
+copied into each one. The copies must stay byte-identical.
+"""
+
+import os
+
+import pytest
+
+from conftest import ROOT
+
+SERVICES = ("production/backup-service", "production/health-monitor")
+
+
+@pytest.mark.parametrize("module", ["profiling.py", "tracing.py"])
+def test_copies_are_identical(module):
+    copies = {}
+    for service in SERVICES:
+        with open(os.path.join(ROOT, service, module), "rb") as f:
+            copies[service] = f.read()
+    first, *rest = SERVICES
+    for service in rest:
+        assert copies[service] == copies[first], f"{service}/{module} differs from {first}/{module}"